@@ -1,13 +1,23 @@
 """
 API路由模块
 """
+import asyncio
+import json
 import logging
 from datetime import datetime, timezone
 
-from quart import Blueprint, request, jsonify
-from core.auth import validate_request_auth
-from utils.exceptions import APIError, ValidationError
-from utils.helpers import serialize_mcp_content, serialize_tool, log_request_response
+from quart import Blueprint, Response, g, request, jsonify, stream_with_context
+from config import BATCH_CONCURRENCY, BATCH_MAX_ITEMS, PASSTHROUGH_TOOLS, METRICS_ENABLED, parse_server_entry
+from core.auth import validate_request_auth, validate_admin_auth, token_cache
+from core.broker import BrokerClient
+from core.deadline import Deadline
+from core.rate_limit import rate_limiter
+from utils.exceptions import APIError, ValidationError, RateLimitExceededError
+from utils import json_codec
+from utils.metrics import registry as metrics_registry
+from utils.helpers import (
+    serialize_mcp_content, serialize_tool, get_passthrough_body, log_request_response, access_log_writer
+)
 
 logger = logging.getLogger(__name__)
 
@@ -22,13 +32,176 @@ def set_mcp_client_manager(manager):
     global mcp_client_manager
     mcp_client_manager = manager
 
+def _check_rate_limit(user_payload, tool_name=None):
+    """按用户限流，限流响应头在after_request中写入；超出额度时抛出RateLimitExceededError"""
+    result = rate_limiter.check(user_payload, request.url_rule.rule, tool_name)
+    if result is None:
+        return
+    g.rate_limit_headers = result.headers()
+    if not result.allowed:
+        retry_after = int(g.rate_limit_headers["Retry-After"])
+        raise RateLimitExceededError(f"请求过于频繁，请在 {retry_after} 秒后重试", retry_after)
+
+@api_bp.after_request
+async def add_rate_limit_headers(response):
+    """为经过限流检查的请求添加RateLimit-*响应头"""
+    headers = g.get('rate_limit_headers')
+    if headers:
+        response.headers.update(headers)
+    return response
+
+def _get_request_timeout():
+    """读取X-Request-Timeout请求头中调用方的时间预算（秒），未提供时返回None"""
+    value = request.headers.get('X-Request-Timeout')
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise ValidationError("X-Request-Timeout 请求头必须是秒数")
+    if timeout <= 0:
+        raise ValidationError("X-Request-Timeout 请求头必须大于0")
+    return timeout
+
+def _get_cache_flags():
+    """根据Cache-Control请求头决定是否读取/写入结果缓存"""
+    cache_control = request.headers.get('Cache-Control', '').lower()
+    read_cache = 'no-cache' not in cache_control and 'no-store' not in cache_control
+    write_cache = 'no-store' not in cache_control
+    return read_cache, write_cache
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+STREAM_MIMETYPES = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson'
+}
+
+def _get_stream_format(request_data):
+    """根据请求体的stream字段或Accept请求头决定流式返回格式，不流式时返回None"""
+    stream = request_data.get('stream')
+    if stream in STREAM_MIMETYPES:
+        return stream
+    if stream not in (None, False, True):
+        raise ValidationError("'stream' 字段必须是 'sse'、'ndjson' 或布尔值")
+    if stream is False:
+        return None
+    
+    accept = request.headers.get('Accept', '')
+    if STREAM_MIMETYPES['sse'] in accept:
+        return 'sse'
+    if any(mimetype in accept for mimetype in NDJSON_MIMETYPES):
+        return 'ndjson'
+    return 'ndjson' if stream else None
+
+def _format_stream_event(stream_format: str, event: str, data) -> bytes:
+    """将一个事件编码为SSE帧或NDJSON行"""
+    if stream_format == 'sse':
+        return b'event: ' + event.encode('utf-8') + b'\ndata: ' + json_codec.dumps(data) + b'\n\n'
+    return json_codec.dumps({"type": event, **data}) + b'\n'
+
+def _json_response(data, status_code: int, headers=None) -> Response:
+    """使用快速JSON编码器构造响应"""
+    return Response(json_codec.dumps(data), status=status_code, mimetype='application/json', headers=headers)
+
+def _error_body(e: APIError):
+    """错误响应体，过载错误附带retry_after"""
+    error = {"message": e.message, "code": e.status_code}
+    retry_after = getattr(e, 'retry_after', None)
+    if retry_after is not None:
+        error["retry_after"] = retry_after
+    return {"error": error}
+
+def _error_headers(e: APIError):
+    """过载错误的Retry-After响应头"""
+    retry_after = getattr(e, 'retry_after', None)
+    return {"Retry-After": str(retry_after)} if retry_after is not None else None
+
+def _use_passthrough(request_data, method: str) -> bool:
+    """判断本次调用是否原样透传上游文本，请求中的passthrough字段优先于PASSTHROUGH_TOOLS配置"""
+    passthrough = request_data.get('passthrough')
+    if passthrough is not None:
+        if not isinstance(passthrough, bool):
+            raise ValidationError("'passthrough' 字段必须是布尔值")
+        return passthrough
+    return '*' in PASSTHROUGH_TOOLS or method in PASSTHROUGH_TOOLS
+
+def _stream_tool_call(stream_format: str, method: str, args, preferred_server, read_cache: bool, write_cache: bool,
+                      timeout, request_data, start_time: datetime):
+    """流式调用MCP工具
+
+    先立即输出start事件，随后实时转发上游的进度通知，
+    调用完成后逐个输出内容项并以done事件结束；调用失败时输出error事件。
+    """
+    remote_addr = request.headers.get('X-Forwarded-For', request.remote_addr)
+    user_agent = request.headers.get('User-Agent')
+    
+    @stream_with_context
+    async def generate():
+        events: asyncio.Queue = asyncio.Queue()
+        summary = {"stream": stream_format, "progress_events": 0, "items": 0}
+        status_code = 200
+        
+        async def on_progress(progress, total, message=None):
+            events.put_nowait(("progress", {"progress": progress, "total": total, "message": message}))
+        
+        async def run():
+            try:
+                result = await mcp_client_manager.call_tool(method, args, preferred_server, read_cache, write_cache,
+                                                            progress_callback=on_progress, timeout=timeout)
+                events.put_nowait(("result", result))
+            except APIError as e:
+                events.put_nowait(("error", _error_body(e)))
+            except Exception as e:
+                logger.error(f"未预期的错误: {str(e)}", exc_info=True)
+                events.put_nowait(("error", {"error": {"message": "内部服务器错误", "code": 500}}))
+        
+        task = asyncio.create_task(run())
+        try:
+            yield _format_stream_event(stream_format, "start", {"method": method})
+            while True:
+                kind, payload = await events.get()
+                if kind == "progress":
+                    summary["progress_events"] += 1
+                    yield _format_stream_event(stream_format, "progress", payload)
+                    continue
+                if kind == "error":
+                    status_code = payload["error"]["code"]
+                    summary.update(payload)
+                    yield _format_stream_event(stream_format, "error", payload)
+                    break
+                
+                # 逐个输出内容项，不再整体序列化整个结果
+                for index, item in enumerate(payload.content):
+                    summary["items"] += 1
+                    yield _format_stream_event(stream_format, "content",
+                                               {"index": index, "content": serialize_mcp_content(item)})
+                summary["isError"] = bool(getattr(payload, 'isError', False))
+                yield _format_stream_event(stream_format, "done", {"isError": summary["isError"], "items": summary["items"]})
+                break
+        finally:
+            # 客户端断开时取消尚未完成的上游调用
+            task.cancel()
+            execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+            log_request_response(request_data, summary, status_code, execution_time, remote_addr, user_agent)
+    
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(generate(), status=200, mimetype=STREAM_MIMETYPES[stream_format], headers=headers)
+
 @api_bp.route('/tools', methods=['POST'])
 async def call_tool():
-    """调用MCP工具的API端点"""
+    """调用MCP工具的API端点
+
+    请求体中 "stream": "sse"|"ndjson"（或Accept: text/event-stream / application/x-ndjson）
+    时以流式返回进度通知和内容项；"passthrough": true（或工具在PASSTHROUGH_TOOLS中）时
+    单个文本内容项的结果原样写入响应。
+    """
     start_time = datetime.now(timezone.utc)
     request_data = {}
     response_data = {}
     status_code = 200
+    response_headers = None
+    streaming_response = None
     
     try:
         # 获取请求数据
@@ -50,20 +223,37 @@ async def call_tool():
         if not isinstance(args, dict):
             raise ValidationError("'args' 字段必须是对象类型")
         
+        _check_rate_limit(user_payload, method)
+        
+        # 客户端可通过Cache-Control绕过结果缓存
+        read_cache, write_cache = _get_cache_flags()
+        passthrough = _use_passthrough(request_data, method)
+        timeout = _get_request_timeout()
+        
+        stream_format = _get_stream_format(request_data)
+        if stream_format:
+            streaming_response = _stream_tool_call(stream_format, method, args, preferred_server,
+                                                   read_cache, write_cache, timeout, request_data, start_time)
+            return streaming_response
+        
         # 调用MCP工具
-        result = await mcp_client_manager.call_tool(method, args, preferred_server)
+        result = await mcp_client_manager.call_tool(method, args, preferred_server, read_cache, write_cache,
+                                                    timeout=timeout)
+        
+        passthrough_body = get_passthrough_body(result) if passthrough else None
+        if passthrough_body is not None:
+            # 原样透传上游文本，不解析也不重新编码
+            text, mimetype = passthrough_body
+            response_data = {"passthrough": True, "mimetype": mimetype, "chars": len(text)}
+            return Response(text, status=status_code, mimetype=mimetype)
         
         # 序列化响应数据
         response_data = serialize_mcp_content(result)
         
     except APIError as e:
         status_code = e.status_code
-        response_data = {
-            "error": {
-                "message": e.message,
-                "code": e.status_code
-            }
-        }
+        response_data = _error_body(e)
+        response_headers = _error_headers(e)
     except Exception as e:
         status_code = 500
         response_data = {
@@ -75,14 +265,168 @@ async def call_tool():
         logger.error(f"未预期的错误: {str(e)}", exc_info=True)
     
     finally:
-        # 记录日志
-        end_time = datetime.now(timezone.utc)
-        execution_time = (end_time - start_time).total_seconds()
-        remote_addr = request.headers.get('X-Forwarded-For', request.remote_addr)
-        user_agent = request.headers.get('User-Agent')
-        log_request_response(request_data, response_data, status_code, execution_time, remote_addr, user_agent)
+        # 记录日志（流式响应在输出结束时自行记录）
+        if streaming_response is None:
+            end_time = datetime.now(timezone.utc)
+            execution_time = (end_time - start_time).total_seconds()
+            remote_addr = request.headers.get('X-Forwarded-For', request.remote_addr)
+            user_agent = request.headers.get('User-Agent')
+            log_request_response(request_data, response_data, status_code, execution_time, remote_addr, user_agent)
     
-    return jsonify(response_data), status_code
+    return _json_response(response_data, status_code, response_headers)
+
+async def _iter_json_items(items):
+    """逐个产出JSON数组中的批量调用项"""
+    for index, item in enumerate(items):
+        yield index, item
+
+async def _iter_ndjson_items(body):
+    """边接收边解析NDJSON请求体，每行一个调用项"""
+    buffer = b''
+    index = 0
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield index, _parse_ndjson_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_ndjson_line(buffer)
+
+def _parse_ndjson_line(line: bytes):
+    """解析单行NDJSON，解析失败时返回异常对象由调用方输出错误"""
+    try:
+        return json_codec.loads(line)
+    except (json.JSONDecodeError, ValueError) as e:
+        return ValidationError(f"无效的JSON行: {str(e)}")
+
+async def _run_batch_item(index: int, item, read_cache: bool, write_cache: bool, deadline, user_payload):
+    """执行单个批量调用项，返回带序号的结果行；deadline为整个批次的截止时间"""
+    try:
+        if isinstance(item, Exception):
+            raise item
+        if not isinstance(item, dict):
+            raise ValidationError("调用项必须是对象类型")
+        
+        method = item.get('method')
+        args = item.get('args', {})
+        preferred_server = item.get('server')
+        
+        if not method:
+            raise ValidationError("缺少必需的 'method' 字段")
+        
+        if not isinstance(args, dict):
+            raise ValidationError("'args' 字段必须是对象类型")
+        
+        # 调用项和单次调用共用同一个用户的/tools额度
+        limit = rate_limiter.check(user_payload, '/tools', method)
+        if limit is not None and not limit.allowed:
+            retry_after = int(limit.headers()["Retry-After"])
+            raise RateLimitExceededError(f"请求过于频繁，请在 {retry_after} 秒后重试", retry_after)
+        
+        timeout = deadline.remaining() if deadline is not None else None
+        result = await mcp_client_manager.call_tool(method, args, preferred_server, read_cache, write_cache,
+                                                    timeout=timeout)
+        return {"index": index, "status": 200, "result": serialize_mcp_content(result)}
+    
+    except APIError as e:
+        return {"index": index, "status": e.status_code, **_error_body(e)}
+    except Exception as e:
+        logger.error(f"批量调用项 {index} 发生未预期的错误: {str(e)}", exc_info=True)
+        return {"index": index, "status": 500, "error": {"message": "内部服务器错误", "code": 500}}
+
+@api_bp.route('/tools/batch', methods=['POST'])
+async def call_tools_batch():
+    """批量调用MCP工具
+
+    请求体可以是调用项的JSON数组，也可以是NDJSON流（每行一个调用项）。
+    调用项在并发上限内同时执行，结果按完成顺序以NDJSON流式返回，每行带有调用项序号。
+    """
+    start_time = datetime.now(timezone.utc)
+    remote_addr = request.headers.get('X-Forwarded-For', request.remote_addr)
+    user_agent = request.headers.get('User-Agent')
+    
+    try:
+        # 整个批次只验证一次JWT令牌，批次本身按路由限流，每个调用项再按/tools和工具限流
+        user_payload = validate_request_auth()
+        _check_rate_limit(user_payload)
+        
+        if request.mimetype in NDJSON_MIMETYPES:
+            items = _iter_ndjson_items(request.body)
+        else:
+            request_data = await request.get_json()
+            if isinstance(request_data, dict):
+                request_data = request_data.get('items')
+            if not isinstance(request_data, list) or not request_data:
+                raise ValidationError("请求体必须是非空的调用项数组")
+            if len(request_data) > BATCH_MAX_ITEMS:
+                raise ValidationError(f"单个批次最多 {BATCH_MAX_ITEMS} 个调用项")
+            items = _iter_json_items(request_data)
+        
+        read_cache, write_cache = _get_cache_flags()
+        # X-Request-Timeout对批量调用表示整个批次的时间预算
+        timeout = _get_request_timeout()
+        deadline = Deadline(timeout) if timeout is not None else None
+    
+    except APIError as e:
+        response_data = {"error": {"message": e.message, "code": e.status_code}}
+        execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+        log_request_response({}, response_data, e.status_code, execution_time, remote_addr, user_agent)
+        return jsonify(response_data), e.status_code
+    
+    @stream_with_context
+    async def generate():
+        results: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+        running = set()
+        summary = {"items": 0, "succeeded": 0, "failed": 0}
+        
+        async def run(index, item):
+            try:
+                await results.put(await _run_batch_item(index, item, read_cache, write_cache, deadline, user_payload))
+            finally:
+                semaphore.release()
+        
+        async def feed():
+            try:
+                async for index, item in items:
+                    if index >= BATCH_MAX_ITEMS:
+                        error = ValidationError(f"单个批次最多 {BATCH_MAX_ITEMS} 个调用项")
+                        await results.put({"index": index, "status": error.status_code,
+                                           "error": {"message": error.message, "code": error.status_code}})
+                        break
+                    # 达到并发上限时暂停读取后续调用项
+                    await semaphore.acquire()
+                    task = asyncio.create_task(run(index, item))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                if running:
+                    await asyncio.gather(*running, return_exceptions=True)
+            except Exception as e:
+                logger.error(f"读取批量调用请求体失败: {str(e)}")
+                await results.put({"index": None, "status": 400, "error": {"message": f"读取请求体失败: {str(e)}", "code": 400}})
+            finally:
+                await results.put(None)
+        
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                line = await results.get()
+                if line is None:
+                    break
+                summary["items"] += 1
+                summary["succeeded" if line["status"] == 200 else "failed"] += 1
+                yield json_codec.dumps(line) + b'\n'
+        finally:
+            # 客户端断开时取消尚未完成的调用
+            feeder.cancel()
+            for task in list(running):
+                task.cancel()
+            execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+            log_request_response({"batch": True}, summary, 200, execution_time, remote_addr, user_agent)
+    
+    return Response(generate(), status=200, mimetype='application/x-ndjson')
 
 @api_bp.route('/tools/list', methods=['GET'])
 async def list_tools():
@@ -96,10 +440,24 @@ async def list_tools():
         # 验证JWT令牌
         user_payload = validate_request_auth()
         logger.info(f"用户 {user_payload.get('user_id', 'unknown')} 请求工具列表")
+        _check_rate_limit(user_payload)
         
         # 获取查询参数
         server_url = request.args.get('server')  # 可选的服务器筛选
         
+        if not server_url:
+            # 直接返回预先序列化的合并工具目录快照
+            catalog = await mcp_client_manager.list_tools()
+            headers = {"ETag": catalog.etag, "X-Catalog-Version": str(catalog.version)}
+            response_data = {"tools_count": catalog.tools_count, "version": catalog.version}
+            if catalog.matches(request.headers.get('If-None-Match')):
+                status_code = 304
+                catalog_response = Response(b'', status=304, headers=headers)
+            else:
+                catalog_response = Response(catalog.body, status=200, mimetype='application/json', headers=headers)
+                logger.info(f"成功返回 {catalog.tools_count} 个工具的信息（目录版本 {catalog.version}）")
+            return catalog_response
+        
         # 获取工具列表
         response = await mcp_client_manager.list_tools(server_url)
         logger.info(f"从MCP服务器获取到 {len(response.tools)} 个工具")
@@ -109,10 +467,6 @@ async def list_tools():
         for i, tool in enumerate(response.tools):
             try:
                 serialized_tool = serialize_tool(tool)
-                # 添加服务器信息（如果有）
-                if hasattr(tool, 'available_servers'):
-                    serialized_tool['available_servers'] = tool.available_servers
-                    serialized_tool['server_count'] = tool.server_count
                 tools_data.append(serialized_tool)
                 logger.debug(f"成功序列化工具 {i+1}: {serialized_tool.get('name', 'unknown')}")
             except Exception as e:
@@ -169,6 +523,7 @@ async def list_servers():
         # 验证JWT令牌
         user_payload = validate_request_auth()
         logger.info(f"用户 {user_payload.get('user_id', 'unknown')} 请求服务器列表")
+        _check_rate_limit(user_payload)
         
         # 获取服务器状态
         server_status = await mcp_client_manager.get_server_status()
@@ -178,8 +533,15 @@ async def list_servers():
             "summary": {
                 "total_servers": len(server_status),
                 "connected_servers": len([s for s in server_status.values() if s.get('connected', False)]),
+                "open_breakers": len([s for s in server_status.values() if s.get('breaker', {}).get('state') != 'closed']),
                 "total_tools": mcp_client_manager.total_tools_count
-            }
+            },
+            **mcp_client_manager.get_stats(),
+            "rate_limit": rate_limiter.stats,
+            "auth": {
+                "token_cache": token_cache.stats
+            },
+            "access_log": access_log_writer.stats
         }
         
     except APIError as e:
@@ -212,14 +574,23 @@ async def list_servers():
 
 @api_bp.route('/health', methods=['GET'])
 async def health_check():
-    """健康检查端点"""
+    """健康检查端点
+
+    默认直接返回保活循环维护的缓存状态；携带 ?deep=true 时实时检查所有上游服务器。
+    """
     server_status = {}
+    breakers = {}
     total_tools = 0
     connected_servers = 0
+    deep = request.args.get('deep', '').lower() in ('1', 'true', 'yes')
     
     if mcp_client_manager:
         try:
-            server_status = await mcp_client_manager.get_server_status()
+            if deep:
+                server_status = await mcp_client_manager.get_server_status()
+            else:
+                server_status = mcp_client_manager.get_cached_status()
+            breakers = mcp_client_manager.breaker_states
             total_tools = mcp_client_manager.total_tools_count
             connected_servers = mcp_client_manager.connected_servers_count
         except Exception as e:
@@ -227,9 +598,11 @@ async def health_check():
     
     return jsonify({
         "status": "healthy",
+        "deep": deep,
         "servers": {
             "total": len(server_status),
             "connected": connected_servers,
+            "breakers": breakers,
             "status": server_status
         },
         "tools": {
@@ -237,6 +610,115 @@ async def health_check():
         }
     })
 
+@api_bp.route('/livez', methods=['GET'])
+async def liveness_check():
+    """存活检查端点：进程能处理请求即视为存活"""
+    return jsonify({"status": "alive"})
+
+@api_bp.route('/metrics', methods=['GET'])
+async def metrics():
+    """指标端点：以Prometheus文本格式导出进程内指标"""
+    if not METRICS_ENABLED:
+        raise APIError("指标端点未启用", 404)
+    body = metrics_registry.render()
+    if isinstance(mcp_client_manager, BrokerClient):
+        # broker模式下上游调用相关的指标在broker进程中
+        try:
+            body += await mcp_client_manager.render_remote_metrics()
+        except APIError as e:
+            logger.warning(f"获取broker指标失败: {e.message}")
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_bp.route('/readyz', methods=['GET'])
+async def readiness_check():
+    """就绪检查端点：根据缓存状态判断是否可以接收流量"""
+    if mcp_client_manager and mcp_client_manager.is_ready:
+        return jsonify({
+            "status": "ready",
+            "connected_servers": mcp_client_manager.connected_servers_count,
+            "tools": mcp_client_manager.total_tools_count
+        })
+    return jsonify({"status": "not_ready"}), 503
+
+async def _admin_response(action: str, handler):
+    """执行管理操作：验证管理员令牌后调用handler(request_data)，统一处理错误和请求日志"""
+    start_time = datetime.now(timezone.utc)
+    request_data = {}
+    response_data = {}
+    status_code = 200
+
+    try:
+        user_payload = validate_admin_auth()
+        request_data = await request.get_json(silent=True) or {}
+        logger.info(f"管理员 {user_payload.get('user_id', 'unknown')} {action}")
+        response_data = await handler(request_data)
+
+    except APIError as e:
+        status_code = e.status_code
+        response_data = {
+            "error": {
+                "message": e.message,
+                "code": e.status_code
+            }
+        }
+    except Exception as e:
+        status_code = 500
+        response_data = {
+            "error": {
+                "message": f"{action}失败",
+                "code": 500
+            }
+        }
+        logger.error(f"{action}时发生未预期错误: {str(e)}", exc_info=True)
+
+    finally:
+        end_time = datetime.now(timezone.utc)
+        execution_time = (end_time - start_time).total_seconds()
+        remote_addr = request.headers.get('X-Forwarded-For', request.remote_addr)
+        user_agent = request.headers.get('User-Agent')
+        log_request_response(request_data, response_data, status_code, execution_time, remote_addr, user_agent)
+
+    return jsonify(response_data), status_code
+
+def _get_server_param(request_data):
+    """读取管理请求中的服务器标识（请求体的server字段或server查询参数）"""
+    server = request_data.get('server') or request.args.get('server')
+    if not server or not isinstance(server, str):
+        raise ValidationError("缺少server参数")
+    return server
+
+@api_bp.route('/admin/servers', methods=['GET'])
+async def admin_list_servers():
+    """列出服务器成员及其状态（active/connecting/draining/removing）"""
+    async def handler(_):
+        return {"servers": mcp_client_manager.get_membership()}
+    return await _admin_response("查看服务器成员", handler)
+
+@api_bp.route('/admin/servers', methods=['POST'])
+async def admin_add_server():
+    """运行时增加服务器，请求体格式与服务器列表文件中的一项相同；对已摘除的服务器表示恢复"""
+    async def handler(request_data):
+        try:
+            url, options = parse_server_entry(request_data)
+        except ValueError as e:
+            raise ValidationError(str(e))
+        return await mcp_client_manager.add_server(url, options)
+    return await _admin_response("增加服务器", handler)
+
+@api_bp.route('/admin/servers/drain', methods=['POST'])
+async def admin_drain_server():
+    """摘除服务器：不再接收新调用，在途调用继续完成"""
+    async def handler(request_data):
+        return await mcp_client_manager.drain_server(_get_server_param(request_data))
+    return await _admin_response("摘除服务器", handler)
+
+@api_bp.route('/admin/servers', methods=['DELETE'])
+async def admin_remove_server():
+    """移除服务器：等待在途调用完成（最多DRAIN_TIMEOUT秒）后断开连接"""
+    async def handler(request_data):
+        return await mcp_client_manager.remove_server(_get_server_param(request_data))
+    return await _admin_response("移除服务器", handler)
+
 # 保持向后兼容的别名
 def set_mcp_client(client):
     """保持向后兼容的函数别名"""
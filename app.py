@@ -3,11 +3,15 @@ MCP Proxy API 主应用
 """
 import asyncio
 import logging
+import time
 
-from quart import Quart, jsonify
-from config import PORT, DEBUG, LOG_LEVEL, MCP_URLS, KEEPALIVE_INTERVAL
+from quart import Quart, g, jsonify, request
+from config import PORT, DEBUG, LOG_LEVEL, MCP_URLS, METRICS_ENABLED, BROKER_ENABLED, BROKER_SOCKET
 from utils.exceptions import APIError
+from utils.helpers import access_log_writer
+from utils.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
 from core.mcp_client_manager import MCPClientManager
+from core.broker import BrokerClient
 from api.routes import api_bp, set_mcp_client_manager
 
 # 配置日志
@@ -16,8 +20,6 @@ logger = logging.getLogger(__name__)
 
 # 全局MCP客户端管理器
 mcp_client_manager = None
-# 保活任务
-keepalive_task = None
 
 def create_app():
     """创建Quart应用"""
@@ -26,6 +28,9 @@ def create_app():
     # 注册蓝图
     app.register_blueprint(api_bp)
     
+    if METRICS_ENABLED:
+        register_metrics_hooks(app)
+    
     # 注册错误处理器
     @app.errorhandler(APIError)
     def handle_api_error(error):
@@ -36,6 +41,9 @@ def create_app():
                 "code": error.status_code
             }
         }
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return jsonify(response), error.status_code, {"Retry-After": str(retry_after)}
         return jsonify(response), error.status_code
 
     @app.errorhandler(Exception)
@@ -60,62 +68,59 @@ def create_app():
     async def shutdown():
         """应用关闭时的清理"""
         await cleanup_mcp_client_manager()
+        # 写完队列中剩余的访问日志
+        await asyncio.to_thread(access_log_writer.stop)
     
     return app
 
+def register_metrics_hooks(app: Quart):
+    """注册记录HTTP请求指标的钩子，按路由模板（而不是实际路径）打标签以限制标签基数"""
+    @app.before_request
+    async def start_request_timer():
+        g.request_started_at = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    async def record_request_duration(response):
+        started_at = g.get('request_started_at')
+        if started_at is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started_at, route, request.method,
+                                          str(response.status_code))
+        return response
+
+    @app.teardown_request
+    async def finish_request(exc):
+        if g.get('request_started_at') is not None:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
 async def init_mcp_client_manager():
     """初始化MCP客户端管理器"""
-    global mcp_client_manager, keepalive_task
+    global mcp_client_manager
+    if BROKER_ENABLED:
+        # broker模式：上游连接和保活由broker进程负责
+        logger.info(f"broker模式，通过 {BROKER_SOCKET} 转发调用")
+        mcp_client_manager = BrokerClient(BROKER_SOCKET)
+        await mcp_client_manager.connect()
+        set_mcp_client_manager(mcp_client_manager)
+        return
     try:
         logger.info(f"初始化MCP客户端管理器，配置的服务器: {MCP_URLS}")
         mcp_client_manager = MCPClientManager(MCP_URLS)
-        await mcp_client_manager.connect_all()
+        # 在后台连接各服务器，不阻塞服务启动；就绪状态由 /readyz 反映，
+        # 连上的服务器由管理器按服务器独立调度保活检查
+        await mcp_client_manager.start()
         
         # 设置路由模块中的客户端管理器引用
         set_mcp_client_manager(mcp_client_manager)
-        
-        # 启动保活任务
-        keepalive_task = asyncio.create_task(keepalive_loop())
-        logger.info(f"MCP客户端管理器初始化成功，已连接 {mcp_client_manager.connected_servers_count} 个服务器，保活任务已启动")
+        logger.info(f"MCP客户端管理器初始化成功，工具目录中有 {mcp_client_manager.total_tools_count} 个工具")
     except Exception as e:
         logger.error(f"MCP客户端管理器初始化失败: {str(e)}")
         raise
 
-async def keepalive_loop():
-    """MCP连接保活循环"""
-    global mcp_client_manager
-    while True:
-        try:
-            # 根据配置的间隔检查连接状态
-            await asyncio.sleep(KEEPALIVE_INTERVAL)
-            
-            if mcp_client_manager:
-                logger.debug("执行MCP连接保活检查...")
-                try:
-                    # 确保所有连接都健康
-                    await mcp_client_manager._ensure_all_connected()
-                    logger.debug(f"MCP连接保活检查完成，当前连接服务器数: {mcp_client_manager.connected_servers_count}")
-                except Exception as e:
-                    logger.warning(f"保活检查失败: {str(e)}")
-            
-        except asyncio.CancelledError:
-            logger.info("保活任务被取消")
-            break
-        except Exception as e:
-            logger.error(f"保活循环出错: {str(e)}")
-
 async def cleanup_mcp_client_manager():
     """清理MCP客户端管理器"""
-    global mcp_client_manager, keepalive_task
-    
-    # 停止保活任务
-    if keepalive_task and not keepalive_task.done():
-        keepalive_task.cancel()
-        try:
-            await keepalive_task
-        except asyncio.CancelledError:
-            pass
-        logger.info("保活任务已停止")
+    global mcp_client_manager
     
     if mcp_client_manager:
         try:
@@ -1,8 +1,10 @@
 """
 配置管理模块
 """
+import json
 import os
-from typing import List
+import tomllib
+from typing import Any, List, Dict, Tuple
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -11,6 +13,9 @@ load_dotenv()
 # JWT配置
 JWT_SECRET = os.getenv('JWT_SECRET', 'default-secret-key')
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+JWT_JWKS_FILE = os.getenv('JWT_JWKS_FILE', '')  # 非对称算法（RS256/ES256等）使用的本地JWKS公钥文件
+JWT_JWKS_REFRESH_INTERVAL = int(os.getenv('JWT_JWKS_REFRESH_INTERVAL', 30))  # 检查JWKS文件是否轮换的间隔（秒）
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 10000))  # 已验证令牌缓存的最大条目数，0表示禁用
 
 # MCP服务器配置
 MCP_URL = os.getenv('MCP_URL', 'http://localhost:3000/sse')  # 保持向后兼容
@@ -24,13 +29,236 @@ else:
     # 否则使用单个URL作为列表（向后兼容）
     MCP_URLS = [MCP_URL]
 
+def parse_server_entry(entry: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """解析单个服务器配置项，返回 (服务器标识, 单服务器选项)
+
+    - 网络服务器: url，可选 transport（sse 或 streamable_http，默认为 MCP_DEFAULT_TRANSPORT）、headers、sse_read_timeout
+    - 本地子进程服务器: transport = "stdio"、name、command，可选 args、env、cwd，标识为 stdio://name
+    - 通用选项: weight、timeout、concurrency_limit，与 SERVER_WEIGHTS 等环境变量含义相同
+    """
+    if not isinstance(entry, dict):
+        raise ValueError(f"服务器配置必须是对象: {entry}")
+    if entry.get('transport') == 'stdio':
+        if not entry.get('name') or not entry.get('command'):
+            raise ValueError(f"stdio服务器必须配置name和command: {entry}")
+        return f"stdio://{entry['name']}", dict(entry)
+    if not entry.get('url'):
+        raise ValueError(f"服务器配置缺少url: {entry}")
+    return entry['url'], dict(entry)
+
+def load_server_file(path: str) -> Dict[str, Dict[str, Any]]:
+    """读取JSON或TOML（.toml扩展名）格式的服务器列表文件，返回 服务器标识 -> 单服务器选项
+
+    文件内容为 {"servers": [...]}（TOML中为 [[servers]]）或直接是服务器列表，每一项的格式见parse_server_entry
+    """
+    with open(path, 'rb') as f:
+        data = tomllib.load(f) if path.endswith('.toml') else json.load(f)
+    entries = data.get('servers', []) if isinstance(data, dict) else data
+    servers: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        try:
+            key, options = parse_server_entry(entry)
+        except ValueError as e:
+            raise ValueError(f"服务器列表文件 {path} 无效: {str(e)}")
+        if key in servers:
+            raise ValueError(f"服务器列表文件 {path} 中的服务器重复: {key}")
+        servers[key] = options
+    return servers
+
+# 未配置transport的网络服务器使用的传输方式：sse（默认）或 streamable_http
+MCP_DEFAULT_TRANSPORT = os.getenv('MCP_DEFAULT_TRANSPORT', 'sse').lower()
+
+# 服务器列表文件，设置后代替MCP_URLS，可为每个服务器选择传输方式并配置单服务器选项
+MCP_SERVERS_FILE = os.getenv('MCP_SERVERS_FILE', '')
+MCP_SERVERS: Dict[str, Dict[str, Any]] = load_server_file(MCP_SERVERS_FILE) if MCP_SERVERS_FILE else {}
+if MCP_SERVERS:
+    MCP_URLS = list(MCP_SERVERS)
+MCP_SERVERS_FILE_WATCH_INTERVAL = float(os.getenv('MCP_SERVERS_FILE_WATCH_INTERVAL', 5))  # 检查文件是否修改的间隔（秒），0表示不监视
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', 30))  # 移除服务器时等待其在途调用完成的最长时间（秒）
+
 # 连接管理配置
-KEEPALIVE_INTERVAL = int(os.getenv('KEEPALIVE_INTERVAL', 300))  # 保活检查间隔（秒）
+KEEPALIVE_INTERVAL = int(os.getenv('KEEPALIVE_INTERVAL', 300))  # 保活检查间隔（秒），每个服务器独立调度
+KEEPALIVE_JITTER = float(os.getenv('KEEPALIVE_JITTER', 0.1))      # 保活检查间隔的随机抖动比例（±）
 CONNECTION_TIMEOUT = int(os.getenv('CONNECTION_TIMEOUT', 5))   # 连接超时时间（秒）
+IDLE_PING_THRESHOLD = int(os.getenv('IDLE_PING_THRESHOLD', 30))  # 会话空闲超过该时间（秒）才发送ping探测
+FANOUT_TIMEOUT = float(os.getenv('FANOUT_TIMEOUT', CONNECTION_TIMEOUT))  # 并发查询所有服务器时每个服务器的截止时间（秒）
+RECONNECT_TIMEOUT = float(os.getenv('RECONNECT_TIMEOUT', 30))          # 保活检查中单个服务器重连的截止时间（秒）
+
+# 启动配置：服务启动时不等待上游连接，各服务器在后台连接，连接失败按指数退避重试
+CONNECT_RETRY_INITIAL_DELAY = float(os.getenv('CONNECT_RETRY_INITIAL_DELAY', 1))  # 首次重试间隔（秒）
+CONNECT_RETRY_MAX_DELAY = float(os.getenv('CONNECT_RETRY_MAX_DELAY', 60))         # 最大重试间隔（秒）
+# 尚未连上的服务器在该时间内保留快照中的工具并参与就绪判断，超时后不再阻塞就绪（后台仍继续重试）
+STARTUP_TIMEOUT = float(os.getenv('STARTUP_TIMEOUT', 60))
+# 合并工具目录的快照文件，重启后在连接建立前即可返回工具列表；默认留空不持久化，启用时建议使用绝对路径
+TOOL_CATALOG_SNAPSHOT_FILE = os.getenv('TOOL_CATALOG_SNAPSHOT_FILE', '')
+
+# 工具调用截止时间配置（秒）
+# 客户端可通过 X-Request-Timeout 请求头缩短（不能延长）本次调用的截止时间
+TOOL_CALL_TIMEOUT = float(os.getenv('TOOL_CALL_TIMEOUT', 60))  # 默认的端到端截止时间，包含所有故障转移
+# 按工具覆盖截止时间，格式：tool_a=10,tool_b=300
+TOOL_TIMEOUTS: Dict[str, float] = {}
+for _item in os.getenv('TOOL_TIMEOUTS', '').split(','):
+    if '=' in _item:
+        _name, _timeout = _item.strip().rsplit('=', 1)
+        TOOL_TIMEOUTS[_name.strip()] = float(_timeout)
+# 调用被取消（超时、客户端断开、对冲落败）时是否向上游发送notifications/cancelled
+# 注意：基于 mcp<1.10 Python SDK 的服务器收到取消通知后会断开会话，默认关闭
+UPSTREAM_CANCEL_NOTIFY = os.getenv('UPSTREAM_CANCEL_NOTIFY', 'false').lower() == 'true'
+# 单个服务器单次尝试的超时，格式：url=5,url=30；超时后故障转移到下一个服务器
+SERVER_TIMEOUTS: Dict[str, float] = {}
+for _item in os.getenv('SERVER_TIMEOUTS', '').split(','):
+    if '=' in _item:
+        _url, _timeout = _item.strip().rsplit('=', 1)
+        SERVER_TIMEOUTS[_url.strip()] = float(_timeout)
+
+# 连接池配置（POOL_MAX_SIZE大于1时启用连接池模式）
+POOL_MIN_SIZE = int(os.getenv('POOL_MIN_SIZE', 1))            # 每个服务器的最小会话数
+POOL_MAX_SIZE = int(os.getenv('POOL_MAX_SIZE', 1))            # 每个服务器的最大会话数
+POOL_IDLE_TIMEOUT = int(os.getenv('POOL_IDLE_TIMEOUT', 300))  # 空闲会话回收时间（秒）
+POOL_PREWARM = int(os.getenv('POOL_PREWARM', 0))              # 预热的备用空闲会话数
+
+# 负载均衡配置
+# 可选策略: ordered, round_robin, weighted, least_outstanding, ewma, p2c
+LOAD_BALANCE_STRATEGY = os.getenv('LOAD_BALANCE_STRATEGY', 'round_robin')
+LATENCY_EWMA_ALPHA = float(os.getenv('LATENCY_EWMA_ALPHA', 0.3))  # EWMA延迟的平滑系数
+
+# 服务器权重，格式: url=权重,url=权重（weighted策略使用，未配置的服务器权重为1）
+SERVER_WEIGHTS: Dict[str, int] = {}
+for _item in os.getenv('SERVER_WEIGHTS', '').split(','):
+    if '=' in _item:
+        _url, _weight = _item.strip().rsplit('=', 1)
+        SERVER_WEIGHTS[_url.strip()] = int(_weight)
+
+# 熔断器配置
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))          # 连续失败次数阈值
+BREAKER_ERROR_RATE_THRESHOLD = float(os.getenv('BREAKER_ERROR_RATE_THRESHOLD', 0.5))  # 窗口内错误率阈值
+BREAKER_WINDOW_SIZE = int(os.getenv('BREAKER_WINDOW_SIZE', 20))                      # 错误率统计窗口（最近N次调用）
+BREAKER_MIN_REQUESTS = int(os.getenv('BREAKER_MIN_REQUESTS', 10))                    # 计算错误率所需的最少调用次数
+BREAKER_OPEN_SECONDS = int(os.getenv('BREAKER_OPEN_SECONDS', 30))                    # 熔断后进入半开探测前的冷却时间（秒）
+
+# 工具结果缓存配置
+# 默认只缓存annotations声明了readOnlyHint/idempotentHint的工具
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+RESULT_CACHE_DEFAULT_TTL = float(os.getenv('RESULT_CACHE_DEFAULT_TTL', 60))                     # 默认TTL（秒）
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))             # 缓存总字节预算
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv('RESULT_CACHE_MAX_ENTRY_BYTES', 1024 * 1024))      # 单条结果上限
+# 按工具覆盖缓存策略（JSON），如 {"search": {"ttl": 30, "max_entries": 500}, "write_file": {"enabled": false}}
+RESULT_CACHE_TOOL_POLICIES: Dict[str, Dict] = json.loads(os.getenv('RESULT_CACHE_TOOL_POLICIES', '') or '{}')
+
+# 请求合并配置：相同工具和参数的并发调用共享一次上游调用
+# 逗号分隔的工具名，*表示所有工具，留空表示不启用
+COALESCE_TOOLS = [name.strip() for name in os.getenv('COALESCE_TOOLS', '').split(',') if name.strip()]
+
+# 透传配置：单个文本内容项的结果不做JSON解析/重新编码，原样写入响应
+# 逗号分隔的工具名，*表示所有工具，留空表示仅在请求中指定 "passthrough": true 时启用
+PASSTHROUGH_TOOLS = [name.strip() for name in os.getenv('PASSTHROUGH_TOOLS', '').split(',') if name.strip()]
+
+# 准入控制配置：限制同时进行的工具调用数，超出上限的调用在有界队列中等待，队列已满或排队超时时快速失败
+ADMISSION_GLOBAL_LIMIT = int(os.getenv('ADMISSION_GLOBAL_LIMIT', 0))      # 整个代理的并发上限，0表示不限制（超出返回429）
+ADMISSION_GLOBAL_QUEUE = int(os.getenv('ADMISSION_GLOBAL_QUEUE', 100))    # 整个代理的等待队列长度
+ADMISSION_SERVER_LIMIT = int(os.getenv('ADMISSION_SERVER_LIMIT', 0))      # 每个服务器的并发上限，0表示不限制（超出返回503）
+ADMISSION_SERVER_QUEUE = int(os.getenv('ADMISSION_SERVER_QUEUE', 50))     # 每个服务器的等待队列长度
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 1))  # 排队等待的最长时间（秒）
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 1))        # 拒绝时Retry-After响应头的秒数
+# 按服务器覆盖并发上限，格式：url=8,url=32
+SERVER_CONCURRENCY_LIMITS: Dict[str, int] = {}
+for _item in os.getenv('SERVER_CONCURRENCY_LIMITS', '').split(','):
+    if '=' in _item:
+        _url, _limit = _item.strip().rsplit('=', 1)
+        SERVER_CONCURRENCY_LIMITS[_url.strip()] = int(_limit)
+# 服务器列表文件或管理接口中的单服务器选项，环境变量中已配置的服务器以环境变量为准
+_SERVER_OPTION_SETTINGS = (
+    ('weight', SERVER_WEIGHTS, int, set(SERVER_WEIGHTS)),
+    ('timeout', SERVER_TIMEOUTS, float, set(SERVER_TIMEOUTS)),
+    ('concurrency_limit', SERVER_CONCURRENCY_LIMITS, int, set(SERVER_CONCURRENCY_LIMITS)),
+)
+
+def apply_server_options(url: str, options: Dict[str, Any]):
+    """把单服务器选项写入SERVER_WEIGHTS等配置（服务器选项变化或移除时也调用，移除时options为空）"""
+    for name, settings, convert, env_urls in _SERVER_OPTION_SETTINGS:
+        if url in env_urls:
+            continue
+        if name in options:
+            settings[url] = convert(options[name])
+        else:
+            settings.pop(url, None)
+
+for _url, _options in MCP_SERVERS.items():
+    apply_server_options(_url, _options)
+# 自适应并发上限（AIMD）：延迟超过目标或调用失败时减小，否则缓慢恢复到配置的上限
+ADMISSION_ADAPTIVE = os.getenv('ADMISSION_ADAPTIVE', 'false').lower() == 'true'
+ADMISSION_LATENCY_TARGET_MS = float(os.getenv('ADMISSION_LATENCY_TARGET_MS', 0))  # 0表示取长期平均延迟的2倍
+
+# 限流配置：按用户的令牌桶限流，限额格式为 速率(个/秒):突发量
+def _parse_rate_limits(value: str) -> Dict[str, tuple]:
+    """解析 name=rate:burst,name=rate:burst 格式的限额配置"""
+    limits = {}
+    for item in value.split(','):
+        if '=' in item:
+            name, limit = item.strip().rsplit('=', 1)
+            rate, _, burst = limit.partition(':')
+            limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+RATE_LIMIT_KEY_CLAIM = os.getenv('RATE_LIMIT_KEY_CLAIM', 'user_id')       # 标识用户的JWT声明
+RATE_LIMIT_CLAIM = os.getenv('RATE_LIMIT_CLAIM', 'rate_limit')             # 携带用户专属限额的JWT声明
+RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', 10))                  # 每个用户每个路由的默认速率（个/秒）
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 20))                # 默认突发量
+RATE_LIMIT_ROUTES = _parse_rate_limits(os.getenv('RATE_LIMIT_ROUTES', ''))  # 按路由配置，如 /tools/batch=1:2
+RATE_LIMIT_TOOLS = _parse_rate_limits(os.getenv('RATE_LIMIT_TOOLS', ''))    # 按工具配置，如 search=2:5
+RATE_LIMIT_IDLE_TTL = float(os.getenv('RATE_LIMIT_IDLE_TTL', 300))         # 空闲桶的淘汰时间（秒）
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv('RATE_LIMIT_MAX_BUCKETS', 100000))  # 桶数量上限
+
+# 对冲请求配置：幂等工具超过对冲延迟仍未返回时，向另一个副本再发一次
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'false').lower() == 'true'
+HEDGE_DELAY_MS = float(os.getenv('HEDGE_DELAY_MS', 0))            # 固定对冲延迟，0表示按延迟分位数推算
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))       # 推算对冲延迟使用的分位数
+HEDGE_MIN_DELAY_MS = float(os.getenv('HEDGE_MIN_DELAY_MS', 5))    # 对冲延迟下限
+HEDGE_BUDGET_RATIO = float(os.getenv('HEDGE_BUDGET_RATIO', 0.1))  # 对冲请求占可对冲调用的最大比例
+# 按工具配置固定对冲延迟，格式：tool_a=50,tool_b=200（毫秒）
+HEDGE_TOOL_DELAYS: Dict[str, float] = {}
+for _item in os.getenv('HEDGE_TOOL_DELAYS', '').split(','):
+    if '=' in _item:
+        _name, _delay = _item.strip().rsplit('=', 1)
+        HEDGE_TOOL_DELAYS[_name.strip()] = float(_delay)
+
+# 批量调用配置
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 16))  # 单个批次内同时执行的调用数
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 10000))   # 单个批次的最大调用项数
+
+# 指标配置：/metrics 端点以Prometheus文本格式导出指标，不需要认证
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# 管理接口配置：/admin/servers 运行时增加、摘除和移除上游服务器，要求令牌的ADMIN_CLAIM声明为（或包含）ADMIN_ROLE
+ADMIN_CLAIM = os.getenv('ADMIN_CLAIM', 'role')
+ADMIN_ROLE = os.getenv('ADMIN_ROLE', 'admin')
 
 # 服务器配置
 PORT = int(os.getenv('PORT', 5000))
 DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
 
+# 生产服务配置（python server.py，基于Hypercorn）
+WORKERS = int(os.getenv('WORKERS', 1))                    # worker进程数
+WORKER_CLASS = os.getenv('WORKER_CLASS', 'asyncio')       # 事件循环实现：asyncio 或 uvloop（需要安装uvloop）
+GRACEFUL_TIMEOUT = float(os.getenv('GRACEFUL_TIMEOUT', 30))  # 关闭时等待在途请求完成的时间（秒）
+# broker模式：由单独的broker进程持有所有上游连接，worker通过Unix socket转发调用，
+# 上游连接数不随worker数增加；未启用时每个worker各自连接所有MCP服务器
+BROKER_ENABLED = os.getenv('BROKER_ENABLED', 'false').lower() == 'true'
+BROKER_SOCKET = os.getenv('BROKER_SOCKET', '/tmp/mcp_proxy_broker.sock')
+BROKER_CONNECT_TIMEOUT = float(os.getenv('BROKER_CONNECT_TIMEOUT', 60))      # worker等待broker就绪的时间（秒）
+BROKER_SNAPSHOT_INTERVAL = float(os.getenv('BROKER_SNAPSHOT_INTERVAL', 1))  # worker刷新broker状态快照的间隔（秒）
+
 # 日志配置
-LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO') 
\ No newline at end of file
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+# 访问日志配置
+ACCESS_LOG_QUEUE_SIZE = int(os.getenv('ACCESS_LOG_QUEUE_SIZE', 10000))               # 待写出日志队列上限，满时丢弃
+ACCESS_LOG_MAX_PAYLOAD_CHARS = int(os.getenv('ACCESS_LOG_MAX_PAYLOAD_CHARS', 4096))  # 请求/响应体序列化后的最大长度，0表示不截断
+
+# 按状态码类别采样，格式: 2xx=0.1,4xx=1,5xx=1（未配置的类别全部记录）
+ACCESS_LOG_SAMPLE_RATES: Dict[str, float] = {}
+for _item in os.getenv('ACCESS_LOG_SAMPLE_RATES', '').split(','):
+    if '=' in _item:
+        _status_class, _rate = _item.strip().split('=', 1)
+        ACCESS_LOG_SAMPLE_RATES[_status_class.strip().lower()] = float(_rate) 
\ No newline at end of file
@@ -3,10 +3,12 @@
 """
 
 from .mcp_client import MCPClient
+from .mcp_client_pool import MCPClientPool
 from .auth import verify_jwt_token, get_token_from_request, validate_request_auth
 
 __all__ = [
     'MCPClient',
+    'MCPClientPool',
     'verify_jwt_token', 
     'get_token_from_request',
     'validate_request_auth'
@@ -0,0 +1,173 @@
+"""
+准入控制模块
+限制同时进行的调用数，超出并发上限的调用在有界队列中等待，队列已满或等待超时时快速失败
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from utils.exceptions import OverloadedError
+
+logger = logging.getLogger(__name__)
+
+class ConcurrencyLimiter:
+    """带有界等待队列的并发限制器
+
+    - limit为0表示不限制
+    - 空闲名额按排队顺序（FIFO）分配
+    - adaptive为True时按AIMD调整并发上限：调用成功且延迟未超过目标时缓慢增加（每轮约+1），
+      失败或延迟超过目标时乘以decrease_factor；同一轮在途调用只触发一次减小。
+      未配置latency_target时以长期平均延迟（慢速EWMA）的tolerance倍作为目标。
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float,
+                 retry_after: int = 1, status_code: int = 503, adaptive: bool = False,
+                 latency_target: float = 0.0, tolerance: float = 2.0, min_limit: int = 1,
+                 decrease_factor: float = 0.9, baseline_alpha: float = 0.05):
+        """初始化限制器，latency_target单位为秒"""
+        self.name = name
+        self.max_limit = limit
+        self._limit = float(limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.status_code = status_code
+        self.adaptive = adaptive and limit > 0
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.min_limit = min(min_limit, limit) if limit > 0 else min_limit
+        self.decrease_factor = decrease_factor
+        self.baseline_alpha = baseline_alpha
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用了并发限制"""
+        return self.max_limit > 0
+
+    @property
+    def limit(self) -> int:
+        """当前生效的并发上限"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def queue_depth(self) -> int:
+        """正在排队等待的调用数"""
+        return len(self._waiters)
+
+    @property
+    def saturated(self) -> bool:
+        """是否已没有空闲名额"""
+        return self.enabled and (self.in_flight >= self.limit or bool(self._waiters))
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """获取一个名额，返回获取时间（用于release时计算延迟）
+
+        Raises:
+            OverloadedError: 等待队列已满或排队超时
+        """
+        if not self.enabled:
+            return time.monotonic()
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return time.monotonic()
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(f"{self.name} 并发已满且等待队列已满", self.retry_after, self.status_code)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        wait_timeout = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), wait_timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                self.timed_out += 1
+                raise OverloadedError(f"{self.name} 排队等待超过 {wait_timeout:.3g} 秒", self.retry_after,
+                                      self.status_code)
+        except BaseException:
+            if self._abandon(waiter):
+                self.release()
+            raise
+        self.admitted += 1
+        return time.monotonic()
+
+    def _abandon(self, waiter: asyncio.Future) -> bool:
+        """放弃排队，返回放弃前是否恰好已分到名额"""
+        if waiter.done() and not waiter.cancelled():
+            return True
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        return False
+
+    def release(self, started_at: Optional[float] = None, success: bool = True):
+        """归还名额；传入started_at时用于自适应调整并发上限"""
+        if not self.enabled:
+            return
+        self.in_flight -= 1
+        if self.adaptive and started_at is not None:
+            self._adapt(started_at, success)
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        """按顺序把空闲名额分配给等待者"""
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(True)
+
+    def _adapt(self, started_at: float, success: bool):
+        """AIMD调整并发上限"""
+        now = time.monotonic()
+        latency = now - started_at
+        target = self.latency_target
+        if target <= 0 and self._baseline_latency is not None:
+            target = self._baseline_latency * self.tolerance
+        if success:
+            if self._baseline_latency is None:
+                self._baseline_latency = latency
+            else:
+                self._baseline_latency += self.baseline_alpha * (latency - self._baseline_latency)
+
+        if not success or (target > 0 and latency > target):
+            # 在上一次减小之前发出的调用不再触发减小
+            if started_at >= self._last_decrease:
+                self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+                self._last_decrease = now
+                logger.debug(f"{self.name} 并发上限减小为 {self.limit}")
+        elif self._limit < self.max_limit:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """限制器统计信息"""
+        return {
+            "enabled": self.enabled,
+            "limit": self.limit if self.enabled else None,
+            "max_limit": self.max_limit if self.enabled else None,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "adaptive": self.adaptive,
+            "baseline_latency_ms": round(self._baseline_latency * 1000, 2) if self._baseline_latency is not None else None
+        }
@@ -1,23 +1,201 @@
 """
 JWT认证模块
 """
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional, Tuple
 
 import jwt
 
 from quart import request
-from config import JWT_SECRET, JWT_ALGORITHM
-from utils.exceptions import AuthenticationError, JWTValidationError
+from config import (
+    JWT_SECRET, JWT_ALGORITHM, JWT_JWKS_FILE, JWT_JWKS_REFRESH_INTERVAL, JWT_CACHE_SIZE, ADMIN_CLAIM, ADMIN_ROLE
+)
+from utils.exceptions import AuthenticationError, JWTValidationError, PermissionDeniedError
+from utils.metrics import JWT_VERIFICATION_DURATION
 
 logger = logging.getLogger(__name__)
 
+# 使用公钥验证的非对称算法
+ASYMMETRIC_ALGORITHM_PREFIXES = ('RS', 'PS', 'ES', 'Ed')
+
+class TokenCache:
+    """已验证令牌的LRU缓存
+
+    以令牌的SHA-256摘要为键，缓存解码后的payload直到令牌的exp，
+    避免同一个长期令牌在每次请求时都重复验签。
+    """
+
+    def __init__(self, max_size: int = JWT_CACHE_SIZE):
+        """初始化缓存"""
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的payload，过期或不存在时返回None"""
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, exp = entry
+            if exp <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        """缓存已验证的payload，直到令牌过期"""
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, float(payload['exp']))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存（如密钥轮换后）"""
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+class JWKSKeyStore:
+    """从本地JWKS文件加载公钥，文件更新（密钥轮换）后自动重新加载"""
+
+    def __init__(self, path: str, refresh_interval: float = JWT_JWKS_REFRESH_INTERVAL,
+                 on_keys_changed: Optional[Callable[[], None]] = None):
+        """初始化密钥存储，on_keys_changed在重新加载后密钥集合发生变化时调用（如清空已验证令牌缓存）"""
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.on_keys_changed = on_keys_changed
+        self._keys: Dict[Optional[str], Any] = {}
+        self._fingerprint: Optional[str] = None
+        self._mtime: Optional[float] = None
+        self._last_stat = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """读取并解析JWKS文件"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        jwks = jwt.PyJWKSet.from_dict(data)
+        keys = {}
+        for key in jwks.keys:
+            keys[key.key_id] = key.key
+        fingerprint = json.dumps(data.get('keys'), sort_keys=True)
+        changed = self._fingerprint is not None and fingerprint != self._fingerprint
+        self._keys = keys
+        self._fingerprint = fingerprint
+        logger.info(f"已从 {self.path} 加载 {len(keys)} 个JWKS公钥")
+        if changed and self.on_keys_changed is not None:
+            # 用已移除（被吊销或轮换掉）的密钥签名的令牌不能继续从缓存通过验证
+            self.on_keys_changed()
+
+    def refresh(self, force: bool = False) -> bool:
+        """文件修改时间变化时重新加载（按refresh_interval节流），返回是否发生了重新加载"""
+        now = time.monotonic()
+        if not force and self._mtime is not None and now - self._last_stat < self.refresh_interval:
+            return False
+        with self._lock:
+            self._last_stat = now
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return False
+            self._load()
+            self._mtime = mtime
+            return True
+
+    def get_key(self, kid: Optional[str]):
+        """根据kid获取公钥，未知kid时检查文件是否已轮换"""
+        reloaded = self.refresh()
+        if kid not in self._keys and not reloaded:
+            self.refresh(force=True)
+        if kid in self._keys:
+            return self._keys[kid]
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        raise JWTValidationError(f"JWT令牌使用了未知的密钥: {kid}")
+
+token_cache = TokenCache()
+jwks_key_store = JWKSKeyStore(JWT_JWKS_FILE, on_keys_changed=token_cache.clear) if JWT_JWKS_FILE else None
+
+def _get_verification_key(token: str):
+    """获取验证令牌所用的密钥"""
+    if not JWT_ALGORITHM.startswith(ASYMMETRIC_ALGORITHM_PREFIXES):
+        return JWT_SECRET
+    if jwks_key_store is None:
+        raise JWTValidationError(f"算法 {JWT_ALGORITHM} 需要配置 JWT_JWKS_FILE")
+    header = jwt.get_unverified_header(token)
+    return jwks_key_store.get_key(header.get('kid'))
+
+def _check_key_rotation():
+    """缓存命中时不会取密钥，在查缓存前检查JWKS文件是否轮换，轮换后已验证令牌缓存被清空"""
+    if jwks_key_store is None:
+        return
+    try:
+        jwks_key_store.refresh()
+    except Exception as e:
+        logger.error(f"重新加载JWKS文件失败: {str(e)}")
+        raise JWTValidationError("JWT令牌验证失败")
+
 def verify_jwt_token(token: str) -> Dict[str, Any]:
-    """验证JWT令牌"""
+    """验证JWT令牌，已验证且未过期的令牌直接从缓存返回"""
+    started_at = time.perf_counter()
+    result = "failed"
+    try:
+        _check_key_rotation()
+        cached = token_cache.get(token)
+        if cached is not None:
+            result = "cache_hit"
+            return cached
+        
+        payload = _decode_jwt_token(token)
+        token_cache.put(token, payload)
+        result = "verified"
+        return payload
+    finally:
+        JWT_VERIFICATION_DURATION.observe(time.perf_counter() - started_at, result)
+
+def _decode_jwt_token(token: str) -> Dict[str, Any]:
+    """解码并校验JWT令牌（签名和过期时间）"""
     try:
         # 解码令牌
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, _get_verification_key(token), algorithms=[JWT_ALGORITHM])
         
         # 验证必须的字段
         if 'exp' not in payload:
@@ -32,6 +210,8 @@ def verify_jwt_token(token: str) -> Dict[str, Any]:
         
         return payload
         
+    except JWTValidationError:
+        raise
     except jwt.ExpiredSignatureError:
         raise JWTValidationError("JWT令牌已过期")
     except jwt.InvalidTokenError as e:
@@ -58,4 +238,13 @@ def validate_request_auth():
     """验证请求的认证信息"""
     token = get_token_from_request()
     payload = verify_jwt_token(token)
+    return payload
+
+def validate_admin_auth():
+    """验证请求的认证信息，并要求令牌的ADMIN_CLAIM声明为（或包含）ADMIN_ROLE"""
+    payload = validate_request_auth()
+    value = payload.get(ADMIN_CLAIM)
+    roles = value if isinstance(value, list) else [value]
+    if ADMIN_ROLE not in roles:
+        raise PermissionDeniedError("需要管理员权限")
     return payload 
\ No newline at end of file
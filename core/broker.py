@@ -0,0 +1,413 @@
+"""
+Broker模块
+多worker部署时由单独的broker进程持有MCPClientManager（所有上游连接），
+worker通过Unix socket把调用转发给broker，上游连接数不随worker数增加
+
+协议：每帧为4字节大端长度 + JSON
+- 请求：{"id": 1, "op": "call_tool", "params": {...}}，取消：{"id": 1, "op": "cancel"}
+- 响应：{"id": 1, "result": ...} 或 {"id": 1, "error": {...}}
+- 进度通知：{"id": 1, "progress": [progress, total, message]}
+"""
+import asyncio
+import itertools
+import logging
+import os
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from mcp import types
+
+from config import BROKER_SOCKET, BROKER_CONNECT_TIMEOUT, BROKER_SNAPSHOT_INTERVAL
+from core.tool_catalog import ToolCatalog
+from utils import exceptions, json_codec
+from utils.exceptions import APIError, MCPConnectionError
+from utils.metrics import registry as metrics_registry
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """编码一帧"""
+    body = json_codec.dumps(message)
+    return _HEADER.pack(len(body)) + body
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    """读取一帧，连接关闭时抛出asyncio.IncompleteReadError"""
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"帧长度 {size} 超过上限")
+    return json_codec.loads(await reader.readexactly(size))
+
+def error_to_dict(error: Exception) -> Dict[str, Any]:
+    """把异常编码为可跨进程传递的字典"""
+    if isinstance(error, APIError):
+        return {
+            "type": type(error).__name__,
+            "message": error.message,
+            "status_code": error.status_code,
+            "retry_after": getattr(error, 'retry_after', None)
+        }
+    return {"type": "APIError", "message": f"broker内部错误: {str(error)}", "status_code": 500, "retry_after": None}
+
+def error_from_dict(data: Dict[str, Any]) -> APIError:
+    """还原broker返回的异常，保留异常类型、状态码和retry_after"""
+    cls = getattr(exceptions, data.get("type", ""), None)
+    if not (isinstance(cls, type) and issubclass(cls, APIError)):
+        cls = APIError
+    error = cls.__new__(cls)
+    APIError.__init__(error, data["message"], data["status_code"])
+    if data.get("retry_after") is not None:
+        error.retry_after = data["retry_after"]
+    return error
+
+class BrokerServer:
+    """broker端：在Unix socket上为worker提供MCPClientManager的调用接口
+
+    socket文件权限为0600，只有同一用户的进程可以连接。
+    worker断开时取消它发起的所有在途调用。
+    """
+
+    def __init__(self, manager, socket_path: str = BROKER_SOCKET):
+        """初始化broker"""
+        self.manager = manager
+        self.socket_path = socket_path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.connections = 0
+
+    async def start(self):
+        """开始监听Unix socket"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        old_umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+        logger.info(f"broker已在 {self.socket_path} 上监听")
+
+    async def close(self):
+        """停止监听并删除socket文件"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个worker连接，每个请求在独立任务中执行"""
+        self.connections += 1
+        tasks: Dict[int, asyncio.Task] = {}
+        write_lock = asyncio.Lock()
+
+        async def send(message: Dict[str, Any]):
+            async with write_lock:
+                writer.write(encode_frame(message))
+                await writer.drain()
+
+        try:
+            while True:
+                message = await read_frame(reader)
+                request_id = message["id"]
+                if message["op"] == "cancel":
+                    task = tasks.get(request_id)
+                    if task is not None:
+                        task.cancel()
+                    continue
+                task = asyncio.create_task(self._dispatch(message, send))
+                tasks[request_id] = task
+                task.add_done_callback(lambda _, request_id=request_id: tasks.pop(request_id, None))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"broker连接出错: {str(e)}")
+        finally:
+            pending = list(tasks.values())
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+            self.connections -= 1
+
+    async def _dispatch(self, message: Dict[str, Any], send: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """执行一个请求并发送响应"""
+        request_id = message["id"]
+        try:
+            handler = getattr(self, f"_op_{message['op']}", None)
+            if handler is None:
+                raise APIError(f"未知的broker操作: {message['op']}", 400)
+            response = {"id": request_id, "result": await handler(request_id, message.get("params") or {}, send)}
+        except Exception as e:
+            response = {"id": request_id, "error": error_to_dict(e)}
+        try:
+            await send(response)
+        except ConnectionError:
+            pass
+
+    async def _op_call_tool(self, request_id: int, params: Dict[str, Any], send):
+        progress_callback = None
+        if params.get("progress"):
+            async def _forward_progress(progress, total, message=None):
+                await send({"id": request_id, "progress": [progress, total, message]})
+            progress_callback = _forward_progress
+
+        result = await self.manager.call_tool(
+            params["tool_name"], params["tool_args"], params.get("preferred_server"),
+            read_cache=params.get("read_cache", True), write_cache=params.get("write_cache", True),
+            progress_callback=progress_callback, timeout=params.get("timeout")
+        )
+        return result.model_dump(mode='json', by_alias=True, exclude_none=True)
+
+    async def _op_list_tools(self, request_id: int, params: Dict[str, Any], send):
+        server_url = params.get("server_url")
+        if server_url:
+            result = await self.manager.list_tools(server_url)
+            return result.model_dump(mode='json', by_alias=True, exclude_none=True)
+        catalog = self.manager.tool_catalog
+        data = {"version": catalog.version, "etag": catalog.etag}
+        if params.get("etag") != catalog.etag:
+            data["body"] = catalog.body.decode('utf-8')
+        return data
+
+    async def _op_server_status(self, request_id: int, params: Dict[str, Any], send):
+        return await self.manager.get_server_status()
+
+    async def _op_snapshot(self, request_id: int, params: Dict[str, Any], send):
+        manager = self.manager
+        return {
+            "is_ready": manager.is_ready,
+            "total_tools_count": manager.total_tools_count,
+            "connected_servers_count": manager.connected_servers_count,
+            "cached_status": manager.get_cached_status(),
+            "breaker_states": manager.breaker_states,
+            "stats": manager.get_stats(),
+            "membership": manager.get_membership(),
+            "catalog_etag": manager.tool_catalog.etag
+        }
+
+    async def _op_add_server(self, request_id: int, params: Dict[str, Any], send):
+        return await self.manager.add_server(params["url"], params.get("options"))
+
+    async def _op_drain_server(self, request_id: int, params: Dict[str, Any], send):
+        return await self.manager.drain_server(params["url"])
+
+    async def _op_remove_server(self, request_id: int, params: Dict[str, Any], send):
+        return await self.manager.remove_server(params["url"])
+
+    async def _op_metrics(self, request_id: int, params: Dict[str, Any], send):
+        return metrics_registry.render()
+
+class BrokerClient:
+    """worker端：通过Unix socket把调用转发给broker
+
+    对路由层提供与MCPClientManager相同的接口；就绪状态、缓存的服务器状态和统计信息
+    来自每BROKER_SNAPSHOT_INTERVAL秒刷新一次的快照，工具调用和实时状态检查直接转发。
+    """
+
+    def __init__(self, socket_path: str = BROKER_SOCKET):
+        """初始化broker客户端"""
+        self.socket_path = socket_path
+        self.tool_catalog = ToolCatalog()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._progress_callbacks: Dict[int, Callable] = {}
+        self._ids = itertools.count(1)
+        self._snapshot: Dict[str, Any] = {}
+        self._connection_lock = asyncio.Lock()
+
+    async def connect(self, timeout: float = BROKER_CONNECT_TIMEOUT):
+        """连接broker，broker尚未就绪时在timeout秒内重试"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                await self._open()
+                break
+            except OSError as e:
+                if time.monotonic() >= deadline:
+                    raise MCPConnectionError(f"无法连接broker {self.socket_path}: {str(e)}")
+                await asyncio.sleep(0.2)
+        logger.info(f"已连接broker: {self.socket_path}")
+        await self.refresh_snapshot()
+        self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+
+    async def _open(self):
+        reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        self._reader_task = asyncio.create_task(self._read_loop(reader, self._writer))
+
+    async def _reconnect(self):
+        """连接已断开时重连一次（并发调用只重连一次）"""
+        async with self._connection_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            try:
+                await self._open()
+                logger.info(f"已重新连接broker: {self.socket_path}")
+            except OSError as e:
+                raise MCPConnectionError(f"无法连接broker {self.socket_path}: {str(e)}")
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """读取broker的响应和进度通知并分发给对应的请求"""
+        try:
+            while True:
+                message = await read_frame(reader)
+                request_id = message["id"]
+                if "progress" in message:
+                    callback = self._progress_callbacks.get(request_id)
+                    if callback is not None:
+                        try:
+                            await callback(*message["progress"])
+                        except Exception as e:
+                            logger.warning(f"处理进度通知失败: {str(e)}")
+                    continue
+                future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(error_from_dict(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logger.error(f"与broker的连接断开: {str(e)}")
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(MCPConnectionError("与broker的连接已断开"))
+                self._pending.clear()
+
+    async def _request(self, op: str, params: Dict[str, Any], progress_callback: Optional[Callable] = None):
+        """发送请求并等待响应；调用方被取消时通知broker取消对应的调用"""
+        if self._writer is None or self._writer.is_closing():
+            await self._reconnect()
+        writer = self._writer
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        if progress_callback is not None:
+            self._progress_callbacks[request_id] = progress_callback
+        try:
+            writer.write(encode_frame({"id": request_id, "op": op, "params": params}))
+            await writer.drain()
+            return await future
+        except ConnectionError as e:
+            raise MCPConnectionError(f"与broker的连接已断开: {str(e)}")
+        except asyncio.CancelledError:
+            if not future.done() and not writer.is_closing():
+                writer.write(encode_frame({"id": request_id, "op": "cancel"}))
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+            self._progress_callbacks.pop(request_id, None)
+
+    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any], preferred_server: Optional[str] = None,
+                        read_cache: bool = True, write_cache: bool = True,
+                        progress_callback: Optional[Callable] = None, timeout: Optional[float] = None):
+        """通过broker调用MCP工具，参数与MCPClientManager.call_tool相同"""
+        result = await self._request("call_tool", {
+            "tool_name": tool_name,
+            "tool_args": tool_args,
+            "preferred_server": preferred_server,
+            "read_cache": read_cache,
+            "write_cache": write_cache,
+            "timeout": timeout,
+            "progress": progress_callback is not None
+        }, progress_callback)
+        return types.CallToolResult.model_validate(result)
+
+    async def list_tools(self, server_url: Optional[str] = None):
+        """获取工具列表；合并工具目录只在快照显示版本变化时才从broker重新拉取"""
+        if server_url:
+            result = await self._request("list_tools", {"server_url": server_url})
+            return types.ListToolsResult.model_validate(result)
+        if self.tool_catalog.etag != self._snapshot.get("catalog_etag"):
+            data = await self._request("list_tools", {"etag": self.tool_catalog.etag})
+            if "body" in data:
+                self.tool_catalog.load(data["version"], data["etag"], data["body"].encode('utf-8'))
+        return self.tool_catalog
+
+    async def get_server_status(self):
+        """实时检查所有服务器状态"""
+        return await self._request("server_status", {})
+
+    async def add_server(self, url: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """在broker中增加（或恢复已摘除的）服务器"""
+        result = await self._request("add_server", {"url": url, "options": options})
+        await self.refresh_snapshot()
+        return result
+
+    async def drain_server(self, url: str) -> Dict[str, Any]:
+        """在broker中摘除服务器"""
+        result = await self._request("drain_server", {"url": url})
+        await self.refresh_snapshot()
+        return result
+
+    async def remove_server(self, url: str) -> Dict[str, Any]:
+        """在broker中移除服务器，等待其在途调用完成"""
+        result = await self._request("remove_server", {"url": url})
+        await self.refresh_snapshot()
+        return result
+
+    async def render_remote_metrics(self) -> str:
+        """broker进程中的指标（上游调用、连接和工具目录）"""
+        return await self._request("metrics", {})
+
+    async def refresh_snapshot(self):
+        """从broker刷新状态快照，连接断开时清空快照（视为未就绪）"""
+        try:
+            self._snapshot = await self._request("snapshot", {})
+        except APIError as e:
+            if self._snapshot:
+                logger.warning(f"刷新broker状态快照失败: {e.message}")
+            self._snapshot = {}
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(BROKER_SNAPSHOT_INTERVAL)
+            await self.refresh_snapshot()
+
+    def get_cached_status(self) -> Dict[str, Dict[str, Any]]:
+        return self._snapshot.get("cached_status", {})
+
+    @property
+    def breaker_states(self) -> Dict[str, str]:
+        return self._snapshot.get("breaker_states", {})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._snapshot.get("stats", {})
+
+    def get_membership(self) -> Dict[str, Dict[str, Any]]:
+        return self._snapshot.get("membership", {})
+
+    @property
+    def is_ready(self) -> bool:
+        return bool(self._snapshot.get("is_ready")) and self._writer is not None
+
+    @property
+    def total_tools_count(self) -> int:
+        return self._snapshot.get("total_tools_count", 0)
+
+    @property
+    def connected_servers_count(self) -> int:
+        return self._snapshot.get("connected_servers_count", 0)
+
+    async def cleanup(self):
+        """断开与broker的连接"""
+        for task in (self._snapshot_task, self._reader_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._snapshot_task = None
+        self._reader_task = None
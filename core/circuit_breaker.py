@@ -0,0 +1,120 @@
+"""
+熔断器模块
+为每个MCP服务器维护 closed/open/half_open 状态，跳过持续失败的服务器
+"""
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from config import (
+    BREAKER_FAILURE_THRESHOLD, BREAKER_ERROR_RATE_THRESHOLD,
+    BREAKER_WINDOW_SIZE, BREAKER_MIN_REQUESTS, BREAKER_OPEN_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """单个服务器的熔断器
+
+    - closed: 正常放行，连续失败次数或窗口内错误率超过阈值时打开
+    - open: 直接跳过，冷却时间结束后进入half_open
+    - half_open: 只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str,
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 error_rate_threshold: float = BREAKER_ERROR_RATE_THRESHOLD,
+                 window_size: int = BREAKER_WINDOW_SIZE,
+                 min_requests: int = BREAKER_MIN_REQUESTS,
+                 open_seconds: float = BREAKER_OPEN_SECONDS):
+        """初始化熔断器"""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self._state = self.CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)  # True表示成功
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        """当前状态，open冷却结束后报告为half_open"""
+        if self._state == self.OPEN and self._cooldown_elapsed():
+            return self.HALF_OPEN
+        return self._state
+
+    def _cooldown_elapsed(self) -> bool:
+        return self._opened_at is not None and time.monotonic() - self._opened_at >= self.open_seconds
+
+    def allow_request(self) -> bool:
+        """判断是否放行请求；half_open状态下放行即占用唯一的探测名额"""
+        if self._state == self.CLOSED:
+            return True
+        if self._state == self.OPEN:
+            if not self._cooldown_elapsed():
+                return False
+            self._transition(self.HALF_OPEN)
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        """记录一次成功调用"""
+        self._outcomes.append(True)
+        self._consecutive_failures = 0
+        if self._state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            self._outcomes.clear()
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        self._outcomes.append(False)
+        self._consecutive_failures += 1
+        if self._state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            self._open()
+        elif self._state == self.CLOSED and self._should_trip():
+            self._open()
+
+    def release_probe(self):
+        """探测请求未产生结果（如被取消）时归还探测名额"""
+        self._probe_in_flight = False
+
+    def _should_trip(self) -> bool:
+        if self._consecutive_failures >= self.failure_threshold:
+            return True
+        if len(self._outcomes) < self.min_requests:
+            return False
+        error_rate = self._outcomes.count(False) / len(self._outcomes)
+        return error_rate >= self.error_rate_threshold
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        self._transition(self.OPEN)
+
+    def _transition(self, state: str):
+        if state != self._state:
+            logger.warning(f"服务器 {self.name} 熔断器状态: {self._state} -> {state}")
+            self._state = state
+
+    def snapshot(self) -> Dict[str, object]:
+        """导出熔断器状态快照"""
+        total = len(self._outcomes)
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "error_rate": round(self._outcomes.count(False) / total, 3) if total else 0.0,
+            "times_opened": self.times_opened
+        }
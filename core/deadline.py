@@ -0,0 +1,32 @@
+"""
+截止时间模块
+一次工具调用的剩余时间预算，在故障转移和对冲的各次尝试之间共享
+"""
+import time
+from typing import Optional
+
+class Deadline:
+    """基于monotonic时钟的绝对截止时间"""
+
+    __slots__ = ("timeout", "expires_at")
+
+    def __init__(self, timeout: float):
+        """初始化，timeout为从现在起的时间预算（秒）"""
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """剩余时间（秒），已过期时为0"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """是否已过期"""
+        return time.monotonic() >= self.expires_at
+
+    def timeout_for(self, attempt_timeout: Optional[float] = None) -> float:
+        """单次尝试可用的超时：剩余时间与尝试超时中的较小者"""
+        remaining = self.remaining()
+        if attempt_timeout is None:
+            return remaining
+        return min(remaining, attempt_timeout)
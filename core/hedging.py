@@ -0,0 +1,116 @@
+"""
+对冲请求模块
+幂等工具的调用在超过对冲延迟仍未返回时，向另一个副本服务器再发一次，取先成功的结果
+"""
+import logging
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from config import (
+    HEDGE_ENABLED, HEDGE_DELAY_MS, HEDGE_PERCENTILE, HEDGE_MIN_DELAY_MS,
+    HEDGE_BUDGET_RATIO, HEDGE_TOOL_DELAYS
+)
+
+logger = logging.getLogger(__name__)
+
+class HedgingPolicy:
+    """对冲策略
+
+    - 只对annotations声明了idempotentHint或readOnlyHint的工具生效
+    - 对冲延迟优先取HEDGE_TOOL_DELAYS中的工具配置，其次取HEDGE_DELAY_MS，
+      都未配置时取该工具最近成功调用延迟的分位数（样本不足时不对冲）
+    - 对冲预算：每次可对冲的调用存入budget_ratio个令牌，每次对冲消耗一个令牌，
+      令牌不足时不对冲，从而把额外负载限制在budget_ratio以内
+    """
+
+    def __init__(self, enabled: bool = HEDGE_ENABLED, delay_ms: float = HEDGE_DELAY_MS,
+                 percentile: float = HEDGE_PERCENTILE, min_delay_ms: float = HEDGE_MIN_DELAY_MS,
+                 budget_ratio: float = HEDGE_BUDGET_RATIO, tool_delays: Optional[Dict[str, float]] = None,
+                 sample_size: int = 200, min_samples: int = 20, budget_burst: float = 10.0):
+        """初始化策略"""
+        self.enabled = enabled
+        self.delay_ms = delay_ms
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.budget_ratio = budget_ratio
+        self.tool_delays = tool_delays if tool_delays is not None else HEDGE_TOOL_DELAYS
+        self.sample_size = sample_size
+        self.min_samples = min_samples
+        self.budget_burst = budget_burst
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._observed: Dict[str, int] = {}
+        self._derived_delays: Dict[str, float] = {}
+        self._tokens = 0.0
+        self.eligible_calls = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def is_hedgeable(self, tool: Any) -> bool:
+        """判断工具是否声明为幂等（只读工具同样视为幂等）"""
+        annotations = getattr(tool, 'annotations', None)
+        if annotations is None:
+            return False
+        return bool(getattr(annotations, 'idempotentHint', False) or getattr(annotations, 'readOnlyHint', False))
+
+    def delay_for(self, tool_name: str, tool: Any) -> Optional[float]:
+        """返回本次调用的对冲延迟（秒），不对冲时返回None；同时为对冲预算存入令牌"""
+        if not self.enabled or not self.is_hedgeable(tool):
+            return None
+        self.eligible_calls += 1
+        self._tokens = min(self.budget_burst, self._tokens + self.budget_ratio)
+
+        if tool_name in self.tool_delays:
+            delay_ms = self.tool_delays[tool_name]
+        elif self.delay_ms > 0:
+            delay_ms = self.delay_ms
+        else:
+            delay_ms = self._derived_delays.get(tool_name)
+            if delay_ms is None:
+                return None
+        return max(delay_ms, self.min_delay_ms) / 1000
+
+    def try_acquire(self) -> bool:
+        """尝试从对冲预算中取出一个令牌"""
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.hedges_sent += 1
+            return True
+        self.budget_exhausted += 1
+        return False
+
+    def release(self):
+        """归还未能发出的对冲请求占用的令牌（如已没有其他可用服务器）"""
+        self._tokens = min(self.budget_burst, self._tokens + 1)
+        self.hedges_sent -= 1
+
+    def observe(self, tool_name: str, latency: float):
+        """记录一次成功调用的延迟（秒），用于推算分位数对冲延迟"""
+        samples = self._latencies.get(tool_name)
+        if samples is None:
+            samples = self._latencies[tool_name] = deque(maxlen=self.sample_size)
+        samples.append(latency * 1000)
+        observed = self._observed[tool_name] = self._observed.get(tool_name, 0) + 1
+        # 每累积10个样本重新计算一次分位数，避免每次调用都排序
+        if len(samples) >= self.min_samples and observed % 10 == 0:
+            ordered = sorted(samples)
+            index = min(len(ordered) - 1, math.ceil(len(ordered) * self.percentile / 100) - 1)
+            self._derived_delays[tool_name] = ordered[index]
+
+    def record_win(self):
+        """记录一次对冲请求先于原请求成功"""
+        self.hedge_wins += 1
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """对冲统计信息"""
+        return {
+            "enabled": self.enabled,
+            "eligible_calls": self.eligible_calls,
+            "hedges_sent": self.hedges_sent,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.budget_exhausted,
+            "budget_tokens": round(self._tokens, 2),
+            "derived_delays_ms": {name: round(delay, 2) for name, delay in self._derived_delays.items()}
+        }
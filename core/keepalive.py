@@ -0,0 +1,131 @@
+"""
+保活调度模块
+每个服务器一个独立的保活任务，检查间隔带随机抖动，检查失败后按指数退避重试，
+一个服务器的检查或重连不会推迟其他服务器的检查
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import KEEPALIVE_INTERVAL, KEEPALIVE_JITTER, CONNECT_RETRY_INITIAL_DELAY, CONNECT_RETRY_MAX_DELAY
+
+logger = logging.getLogger(__name__)
+
+class KeepaliveState:
+    """单个服务器的保活状态"""
+
+    def __init__(self):
+        self.checks = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.next_check_at: Optional[float] = None
+        self.last_check_time: Optional[str] = None
+        self.last_success_time: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def record(self, ok: bool, error: Optional[str] = None):
+        """记录一次检查结果"""
+        now = datetime.now(timezone.utc).isoformat()
+        self.checks += 1
+        self.last_check_time = now
+        if ok:
+            self.consecutive_failures = 0
+            self.last_success_time = now
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+
+    def snapshot(self) -> Dict[str, Any]:
+        """保活状态快照"""
+        return {
+            "checks": self.checks,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "next_check_in": round(max(0.0, self.next_check_at - time.monotonic()), 3)
+            if self.next_check_at is not None else None,
+            "last_check_time": self.last_check_time,
+            "last_success_time": self.last_success_time,
+            "last_error": self.last_error
+        }
+
+class KeepaliveScheduler:
+    """按服务器并行调度保活检查
+
+    - 正常情况下每隔 interval*(1±jitter) 秒检查一次，各服务器的检查时间互相错开
+    - 检查失败（探测和重连都失败）后按 initial_delay*2^(n-1) 退避重试，最长 max_delay 秒，同样带抖动，
+      避免共享的后端重启时所有服务器同时重连
+    """
+
+    def __init__(self, check: Callable[[str], Awaitable[None]], interval: float = KEEPALIVE_INTERVAL,
+                 jitter: float = KEEPALIVE_JITTER, initial_delay: float = CONNECT_RETRY_INITIAL_DELAY,
+                 max_delay: float = CONNECT_RETRY_MAX_DELAY):
+        """初始化调度器，check(url)执行一次检查（必要时重连），失败时抛出异常"""
+        self.check = check
+        self.interval = interval
+        self.jitter = jitter
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.states: Dict[str, KeepaliveState] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _jittered(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def next_delay(self, state: KeepaliveState) -> float:
+        """下一次检查前的等待时间"""
+        if state.consecutive_failures == 0:
+            return self._jittered(self.interval)
+        backoff = self.initial_delay * 2 ** (state.consecutive_failures - 1)
+        return self._jittered(min(backoff, self.max_delay))
+
+    def add(self, url: str):
+        """开始为服务器调度保活检查（已在调度中时忽略）"""
+        task = self._tasks.get(url)
+        if task is not None and not task.done():
+            return
+        state = self.states.setdefault(url, KeepaliveState())
+        self._tasks[url] = asyncio.create_task(self._run(url, state))
+
+    async def remove(self, url: str):
+        """停止服务器的保活检查"""
+        task = self._tasks.pop(url, None)
+        self.states.pop(url, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def stop(self):
+        """停止所有保活检查"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, url: str, state: KeepaliveState):
+        while True:
+            delay = self.next_delay(state)
+            state.next_check_at = time.monotonic() + delay
+            await asyncio.sleep(delay)
+            state.next_check_at = None
+            try:
+                await self.check(url)
+                if state.consecutive_failures:
+                    logger.info(f"服务器 {url} 保活检查恢复正常")
+                state.record(True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                state.record(False, error)
+                logger.warning(f"服务器 {url} 保活检查失败（连续 {state.consecutive_failures} 次），退避后重试: {error}")
+
+    def snapshot(self, url: str) -> Optional[Dict[str, Any]]:
+        """服务器的保活状态，未在调度中时返回None"""
+        state = self.states.get(url)
+        return state.snapshot() if state is not None else None
@@ -0,0 +1,173 @@
+"""
+负载均衡模块
+根据服务器的在途请求数和延迟统计，为工具调用决定服务器尝试顺序
+"""
+import itertools
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ServerStats:
+    """单个服务器的调用统计"""
+
+    def __init__(self, ewma_alpha: float = 0.3):
+        """初始化统计信息"""
+        self.ewma_alpha = ewma_alpha
+        self.in_flight = 0
+        self.ewma_latency: Optional[float] = None  # 秒
+        self.total_requests = 0
+        self.total_errors = 0
+
+    def begin(self) -> float:
+        """记录一次调用开始，返回开始时间"""
+        self.in_flight += 1
+        return time.monotonic()
+
+    def end(self, started_at: float, success: bool):
+        """记录一次调用结束并更新延迟统计"""
+        self.in_flight -= 1
+        self.total_requests += 1
+        if not success:
+            self.total_errors += 1
+            return
+        latency = time.monotonic() - started_at
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma_latency
+
+    def cancel(self):
+        """记录一次被取消的调用（如对冲请求中落败的一方），不计入错误和延迟"""
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, object]:
+        """导出统计快照"""
+        return {
+            "in_flight": self.in_flight,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 2) if self.ewma_latency is not None else None,
+            "total_requests": self.total_requests,
+            "total_errors": self.total_errors
+        }
+
+# 尚无统计信息的服务器（如刚在运行时增加）按没有在途请求、没有延迟数据处理
+_NO_STATS = ServerStats()
+
+def _stats_for(stats: Dict[str, ServerStats], url: str) -> ServerStats:
+    return stats.get(url) or _NO_STATS
+
+class LoadBalancer:
+    """负载均衡策略基类
+
+    order() 返回完整的服务器尝试顺序：第一个是首选服务器，其余依次作为故障转移目标。
+    """
+
+    name = "base"
+
+    def order(self, tool_name: str, servers: List[str], stats: Dict[str, ServerStats]) -> List[str]:
+        """返回服务器尝试顺序"""
+        raise NotImplementedError
+
+class OrderedLoadBalancer(LoadBalancer):
+    """按注册顺序尝试（旧行为），其余服务器只承担故障转移"""
+
+    name = "ordered"
+
+    def order(self, tool_name, servers, stats):
+        return list(servers)
+
+class RoundRobinLoadBalancer(LoadBalancer):
+    """按工具轮询"""
+
+    name = "round_robin"
+
+    def __init__(self):
+        self._counters: Dict[str, itertools.count] = {}
+
+    def order(self, tool_name, servers, stats):
+        counter = self._counters.setdefault(tool_name, itertools.count())
+        offset = next(counter) % len(servers)
+        return servers[offset:] + servers[:offset]
+
+class WeightedLoadBalancer(LoadBalancer):
+    """平滑加权轮询，权重未配置的服务器默认为1"""
+
+    name = "weighted"
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None):
+        self.weights = weights if weights is not None else {}  # 保持引用，运行时增加的服务器权重同样生效
+        self._current: Dict[str, Dict[str, int]] = {}
+
+    def order(self, tool_name, servers, stats):
+        current = self._current.setdefault(tool_name, {})
+        total = 0
+        for url in servers:
+            weight = self.weights.get(url, 1)
+            current[url] = current.get(url, 0) + weight
+            total += weight
+        chosen = max(servers, key=lambda url: current[url])
+        current[chosen] -= total
+        rest = sorted((url for url in servers if url != chosen), key=lambda url: -self.weights.get(url, 1))
+        return [chosen] + rest
+
+class LeastOutstandingLoadBalancer(LoadBalancer):
+    """优先选择在途请求最少的服务器，相同时随机打散"""
+
+    name = "least_outstanding"
+
+    def order(self, tool_name, servers, stats):
+        shuffled = random.sample(servers, len(servers))
+        return sorted(shuffled, key=lambda url: _stats_for(stats, url).in_flight)
+
+class EwmaLatencyLoadBalancer(LoadBalancer):
+    """按EWMA延迟乘以负载排序，尚无延迟数据的服务器优先被探索"""
+
+    name = "ewma"
+
+    def order(self, tool_name, servers, stats):
+        def cost(url: str) -> float:
+            server_stats = _stats_for(stats, url)
+            if server_stats.ewma_latency is None:
+                return 0.0
+            return server_stats.ewma_latency * (server_stats.in_flight + 1)
+
+        shuffled = random.sample(servers, len(servers))
+        return sorted(shuffled, key=cost)
+
+class PowerOfTwoLoadBalancer(LoadBalancer):
+    """随机选取两个服务器，选择在途请求更少的一个"""
+
+    name = "p2c"
+
+    def order(self, tool_name, servers, stats):
+        if len(servers) < 2:
+            return list(servers)
+        first, second = random.sample(servers, 2)
+        a, b = _stats_for(stats, first), _stats_for(stats, second)
+        if (b.in_flight, b.ewma_latency or 0.0) < (a.in_flight, a.ewma_latency or 0.0):
+            first, second = second, first
+        rest = [url for url in servers if url not in (first, second)]
+        return [first, second] + random.sample(rest, len(rest))
+
+LOAD_BALANCERS = {
+    cls.name: cls for cls in (
+        OrderedLoadBalancer,
+        RoundRobinLoadBalancer,
+        WeightedLoadBalancer,
+        LeastOutstandingLoadBalancer,
+        EwmaLatencyLoadBalancer,
+        PowerOfTwoLoadBalancer,
+    )
+}
+
+def create_load_balancer(strategy: str, weights: Optional[Dict[str, int]] = None) -> LoadBalancer:
+    """根据策略名称创建负载均衡器，未知策略回退到轮询"""
+    cls = LOAD_BALANCERS.get(strategy)
+    if cls is None:
+        logger.warning(f"未知的负载均衡策略 '{strategy}'，使用 round_robin")
+        cls = RoundRobinLoadBalancer
+    if cls is WeightedLoadBalancer:
+        return cls(weights)
+    return cls()
@@ -3,70 +3,270 @@ MCP客户端模块
 """
 import asyncio
 import logging
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Set, Callable
 from contextlib import AsyncExitStack
 
-from mcp import ClientSession
-from mcp.client.sse import sse_client
-from utils.exceptions import MCPConnectionError, ToolNotFoundError, APIError
-from config import CONNECTION_TIMEOUT
+import anyio
+import httpx
+from mcp import ClientSession, types
+from mcp.shared.exceptions import McpError
+from core.transports import SharedHTTPTransport, open_transport
+from utils.exceptions import MCPConnectionError, SessionLostError, ToolNotFoundError, APIError
+from utils.metrics import RECONNECTS
+from config import CONNECTION_TIMEOUT, IDLE_PING_THRESHOLD, UPSTREAM_CANCEL_NOTIFY
 
 logger = logging.getLogger(__name__)
 
+# 说明会话本身已经断开（而不是工具执行出错）的异常
+_SESSION_ERRORS = (SessionLostError, anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream,
+                   httpx.TransportError)
+# 请求发出之前就失败的异常，此时上游一定没有收到请求，可以在新会话上安全重试
+_NOT_SENT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError)
+
+def is_session_error(error: BaseException) -> bool:
+    """判断异常是否表示会话已断开"""
+    if isinstance(error, _SESSION_ERRORS):
+        return True
+    if isinstance(error, McpError) and error.error.code == types.CONNECTION_CLOSED:
+        return True
+    text = str(error).lower()
+    return "connection" in text or "sse" in text
+
 class MCPClient:
-    """MCP客户端类"""
+    """MCP客户端类
+
+    每次成功建立会话时会话代数generation加一。会话断开后同一代只重连一次：
+    并发失败的调用方共享同一个重连任务，而不是各自重连、互相拆掉对方刚建立的会话；
+    在旧会话上进行中的调用收到可重试的SessionLostError。
+    """
     
-    def __init__(self, server_url: str):
-        """初始化MCP客户端"""
+    def __init__(self, server_url: str, on_tools_changed: Optional[Callable[[str, List[Any]], None]] = None,
+                 options: Optional[Dict[str, Any]] = None, http_transport: Optional[SharedHTTPTransport] = None):
+        """初始化MCP客户端
+
+        Args:
+            server_url: MCP服务器地址（stdio服务器为 stdio://名称）
+            on_tools_changed: 工具目录发生变化时的回调，参数为服务器地址和完整工具列表
+            options: 服务器列表文件中的单服务器选项（传输方式、请求头、stdio命令等）
+            http_transport: 共享的HTTP连接池，未提供时使用自己的连接池，重连时复用其中的连接
+        """
         self.server_url = server_url
+        self.on_tools_changed = on_tools_changed
+        self.options = options or {}
+        self._owns_http_transport = http_transport is None
+        self.http_transport = http_transport or SharedHTTPTransport()
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
+        self._session_task: Optional[asyncio.Task] = None
+        self._session_closed: Optional[asyncio.Event] = None
+        self._session_lost: Optional[asyncio.Future] = None  # 当前会话结束时完成，用于让进行中的调用立即失败
+        self.tools: List[Any] = []  # 最近一次获取到的完整工具定义
         self.available_tools: List[str] = []
+        self._available_tool_set: Set[str] = set()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._cancel_tasks: Set[asyncio.Task] = set()  # 正在发送的取消通知
+        self._last_activity: float = 0.0  # 最近一次成功通信的时间（monotonic）
+        self._ever_connected = False  # 首次连接之后的连接才计为重连
         self._connection_lock = asyncio.Lock()
+        self.generation = 0  # 会话代数，每次成功建立会话加一
+        self._reconnect_task: Optional[asyncio.Task] = None
 
     async def connect(self):
-        """连接到MCP服务器"""
+        """连接到MCP服务器（已连接时先断开再重新连接）"""
         async with self._connection_lock:
-            try:
-                # 如果已经连接，先清理
-                if self.session:
-                    await self._cleanup_session()
-                
-                logger.info(f"正在连接到MCP服务器: {self.server_url}")
-                read, write = await self.exit_stack.enter_async_context(
-                    sse_client(url=self.server_url)
-                )
-                self.session = await self.exit_stack.enter_async_context(ClientSession(read, write))
-                await self.session.initialize()
-                
-                # 获取可用工具列表
-                response = await self.session.list_tools()
-                self.available_tools = [tool.name for tool in response.tools]
-                logger.info(f"MCP服务器已连接，可用工具: {self.available_tools}")
-                
-            except Exception as e:
-                logger.error(f"MCP服务器连接失败: {str(e)}", exc_info=True)
-                # 清理已分配的资源
+            await self._connect_locked()
+
+    async def _connect_locked(self):
+        """建立新会话，调用方需持有连接锁"""
+        try:
+            # 如果已经连接，先清理
+            if self.session or self._session_task:
                 await self._cleanup_session()
-                raise MCPConnectionError(f"连接失败: {str(e)}")
+            
+            logger.info(f"正在连接到MCP服务器: {self.server_url}")
+            await self._start_session()
+            
+            # 获取可用工具列表
+            response = await self.session.list_tools()
+            self._apply_tool_listing(response.tools)
+            self.generation += 1
+            logger.info(f"MCP服务器已连接（会话第 {self.generation} 代），可用工具: {self.available_tools}")
+            if self._ever_connected:
+                RECONNECTS.inc(self.server_url, "success")
+            self._ever_connected = True
+            
+        except Exception as e:
+            logger.error(f"MCP服务器连接失败: {str(e)}", exc_info=True)
+            if self._ever_connected:
+                RECONNECTS.inc(self.server_url, "failure")
+            # 清理已分配的资源
+            await self._cleanup_session()
+            raise MCPConnectionError(f"连接失败: {str(e)}")
+
+    async def reconnect(self, generation: Optional[int] = None):
+        """重连到MCP服务器，同一代会话只重连一次
+
+        Args:
+            generation: 调用方发现断开的会话代数；该代会话已被新会话替换时直接返回。
+                并发调用方等待同一个重连任务，单个调用方被取消不会中断重连。
+        """
+        task = self._start_reconnect(generation)
+        if task is not None:
+            await asyncio.shield(task)
+
+    def _start_reconnect(self, generation: Optional[int] = None) -> Optional[asyncio.Task]:
+        """启动（或加入已在进行的）重连任务，会话已经是更新的一代时返回None"""
+        task = self._reconnect_task
+        if task is not None and not task.done():
+            return task
+        if self._is_replaced(generation):
+            return None
+        task = asyncio.create_task(self._reconnect(generation))
+        # 没有调用方等待时也要取走异常，避免"exception was never retrieved"警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._reconnect_task = task
+        return task
+
+    def _is_replaced(self, generation: Optional[int]) -> bool:
+        """generation代的会话是否已被新会话替换"""
+        return generation is not None and generation != self.generation and self.session is not None
+
+    async def _reconnect(self, generation: Optional[int]):
+        async with self._connection_lock:
+            # 等待锁期间其他调用方可能已经通过connect()建立了新会话
+            if self._is_replaced(generation):
+                return
+            logger.warning(f"MCP服务器 {self.server_url} 会话（第 {self.generation} 代）已断开，正在重连...")
+            await self._connect_locked()
+
+    async def _start_session(self):
+        """启动会话持有任务并等待会话初始化完成"""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        self._session_closed = asyncio.Event()
+        self._session_lost = loop.create_future()
+        self._session_task = asyncio.create_task(self._session_owner(ready, self._session_closed, self._session_lost))
+        try:
+            self.session = await ready
+        except asyncio.CancelledError:
+            # 调用方被取消（如超过截止时间）时通知持有任务在建立完成后立即关闭
+            self._session_closed.set()
+            raise
+
+    async def _session_owner(self, ready: asyncio.Future, closed: asyncio.Event, lost: asyncio.Future):
+        """在独立任务中持有传输与会话上下文
+
+        传输基于anyio任务组，必须在进入它的同一个任务中退出，
+        由专门的任务持有上下文后，会话可以在任意任务（如连接池回收、保活）中关闭。
+        会话结束时完成lost，在该会话上进行中的调用随即失败，而不是等到各自超时。
+        """
+        session = None
+        try:
+            async with AsyncExitStack() as stack:
+                read, write = await stack.enter_async_context(
+                    open_transport(self.server_url, self.options, self.http_transport)
+                )
+                session = await stack.enter_async_context(
+                    ClientSession(read, write, message_handler=self._handle_message)
+                )
+                await session.initialize()
+                if not ready.done():
+                    ready.set_result(session)
+                await closed.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e if isinstance(e, Exception) else MCPConnectionError("会话任务被取消"))
+            elif not closed.is_set():
+                logger.warning(f"MCP服务器 {self.server_url} 会话异常结束: {str(e)}")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            # 会话意外结束时置空，下次调用会直接重连
+            if session is not None and self.session is session:
+                self.session = None
+            if not lost.done():
+                lost.set_result(None)
 
     async def _cleanup_session(self):
         """清理当前会话"""
         try:
-            if self.exit_stack:
-                await self.exit_stack.aclose()
-                # 重新创建exit_stack用于下次连接
-                self.exit_stack = AsyncExitStack()
-            self.session = None
-            self.available_tools = []
+            if self._session_task:
+                self._session_closed.set()
+                await self._session_task
         except Exception as e:
             logger.error(f"清理会话时出错: {str(e)}")
+        finally:
+            self._session_task = None
+            self._session_closed = None
+            self._session_lost = None
+            self.session = None
+            self._update_available_tools([])
+
+    def _update_available_tools(self, tools):
+        """更新可用工具缓存"""
+        self.available_tools = [tool.name for tool in tools]
+        self._available_tool_set = set(self.available_tools)
+
+    def _apply_tool_listing(self, tools):
+        """应用一次成功获取的工具列表，目录有变化时通知回调"""
+        self._update_available_tools(tools)
+        self._mark_activity()
+        if tools == self.tools:
+            return
+        self.tools = list(tools)
+        if self.on_tools_changed:
+            try:
+                self.on_tools_changed(self.server_url, self.tools)
+            except Exception as e:
+                logger.error(f"处理服务器 {self.server_url} 工具目录变化时出错: {str(e)}")
+
+    async def _handle_message(self, message):
+        """处理服务器推送的消息"""
+        if isinstance(message, types.ServerNotification) and \
+                isinstance(message.root, types.ToolListChangedNotification):
+            logger.info(f"MCP服务器 {self.server_url} 通知工具列表已变化，刷新工具目录")
+            # 不能在消息处理回调中直接等待请求响应，放到独立任务中刷新
+            if not self._refresh_task or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh_tools())
+
+    async def _refresh_tools(self):
+        """重新获取工具列表"""
+        try:
+            await self.list_tools()
+        except Exception as e:
+            logger.warning(f"刷新服务器 {self.server_url} 工具目录失败: {str(e)}")
+
+    def _mark_activity(self):
+        """记录一次成功的通信"""
+        self._last_activity = time.monotonic()
+
+    @property
+    def idle_seconds(self) -> float:
+        """距离最近一次成功通信的秒数"""
+        return time.monotonic() - self._last_activity
 
     async def _ensure_connected(self):
-        """确保连接可用，如果断开则重连"""
+        """确保连接可用，如果断开则重连
+
+        正在重连时等待重连完成；会话在空闲阈值内有过成功通信时直接视为存活，
+        只有空闲超过阈值才发送一次轻量的ping探测。
+        """
+        task = self._reconnect_task
+        if task is not None and not task.done():
+            await asyncio.shield(task)
+
+        if not self.session:
+            logger.warning("会话不存在，尝试连接...")
+            await self.reconnect(self.generation)
+            return
+
+        if self.idle_seconds < IDLE_PING_THRESHOLD:
+            return
+
+        generation = self.generation
         if not await self._check_connection_health():
             logger.warning("检测到连接断开，尝试重连...")
-            await self.connect()
+            await self.reconnect(generation)
 
     async def _check_connection_health(self) -> bool:
         """检查连接健康状态"""
@@ -74,54 +274,125 @@ class MCPClient:
             return False
         
         try:
-            # 尝试调用一个简单的方法来检查连接是否活跃
-            await asyncio.wait_for(self.session.list_tools(), timeout=CONNECTION_TIMEOUT)
+            # 使用MCP ping进行轻量探测，避免拉取完整工具列表
+            await asyncio.wait_for(self.session.send_ping(), timeout=CONNECTION_TIMEOUT)
+            self._mark_activity()
             return True
         except Exception as e:
             logger.warning(f"连接健康检查失败: {str(e)}")
             return False
 
-    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any]):
-        """调用MCP工具"""
+    def has_tool(self, tool_name: str) -> bool:
+        """检查工具是否在缓存的可用工具集合中"""
+        return tool_name in self._available_tool_set
+
+    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any], progress_callback: Optional[Callable] = None):
+        """调用MCP工具，progress_callback用于接收上游的进度通知
+
+        会话在调用过程中断开时触发一次（共享的）重连并抛出SessionLostError；
+        工具调用不一定幂等，只有请求确定没有发出时才在新会话上重试一次。
+        """
         # 确保连接可用
         await self._ensure_connected()
         
-        if tool_name not in self.available_tools:
+        if not self.has_tool(tool_name):
             raise ToolNotFoundError(tool_name)
         
+        session, lost, generation = self.session, self._session_lost, self.generation
         try:
-            result = await self.session.call_tool(tool_name, tool_args)
+            result = await self._send_call_tool(session, lost, tool_name, tool_args, progress_callback)
+            self._mark_activity()
             return result
         except Exception as e:
-            logger.error(f"调用工具 {tool_name} 失败: {str(e)}")
-            # 如果是连接相关错误，尝试重连后再次调用
-            if "connection" in str(e).lower() or "sse" in str(e).lower():
-                logger.warning("检测到可能的连接错误，尝试重连后重试...")
-                try:
-                    await self.connect()
-                    result = await self.session.call_tool(tool_name, tool_args)
-                    return result
-                except Exception as retry_e:
-                    logger.error(f"重连后重试仍然失败: {str(retry_e)}")
-                    raise APIError(f"调用工具失败: {str(retry_e)}")
-            else:
+            if not is_session_error(e):
+                logger.error(f"调用工具 {tool_name} 失败: {str(e)}")
                 raise APIError(f"调用工具失败: {str(e)}")
+            error = e
+        
+        if not isinstance(error, _NOT_SENT_ERRORS):
+            # 同一会话上其他进行中的调用也不会再收到响应，让它们立即失败；只由第一个发现断开的调用记录警告
+            if lost is not None and not lost.done():
+                lost.set_result(None)
+                logger.warning(f"调用工具 {tool_name} 时会话（第 {generation} 代）断开: {str(error) or type(error).__name__}")
+            self._start_reconnect(generation)
+            raise SessionLostError(f"服务器 {self.server_url} 会话在调用工具 {tool_name} 时断开，调用结果未知，可以重试")
+        
+        logger.warning(f"会话（第 {generation} 代）已关闭，调用工具 {tool_name} 的请求未发出，重连后重试...")
+        try:
+            await self.reconnect(generation)
+            result = await self._send_call_tool(self.session, self._session_lost, tool_name, tool_args,
+                                                progress_callback)
+            self._mark_activity()
+            return result
+        except Exception as retry_e:
+            logger.error(f"重连后重试仍然失败: {str(retry_e)}")
+            if is_session_error(retry_e):
+                raise SessionLostError(f"服务器 {self.server_url} 会话已断开，调用工具 {tool_name} 失败，可以重试")
+            raise APIError(f"调用工具失败: {str(retry_e)}")
+
+    async def _send_call_tool(self, session: ClientSession, lost: asyncio.Future, tool_name: str,
+                              tool_args: Dict[str, Any], progress_callback: Optional[Callable]):
+        """在指定会话上发送tools/call请求
+
+        会话在响应到达之前结束时抛出SessionLostError；
+        请求被取消（超时、客户端断开、对冲落败）时按配置通知上游取消执行。
+        """
+        if session is None:
+            raise anyio.ClosedResourceError()
+        request_id = None
+
+        async def send():
+            nonlocal request_id
+            # send_request在第一次await之前同步分配请求ID，此时读取到的就是本次请求的ID
+            request_id = session._request_id
+            return await session.call_tool(tool_name, tool_args, progress_callback=progress_callback)
+
+        call = asyncio.ensure_future(send())
+        try:
+            await asyncio.wait((call, lost), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            call.cancel()
+            if UPSTREAM_CANCEL_NOTIFY and request_id is not None:
+                task = asyncio.create_task(self._notify_cancelled(session, request_id))
+                self._cancel_tasks.add(task)
+                task.add_done_callback(self._cancel_tasks.discard)
+            raise
+        if not call.done():
+            call.cancel()
+            raise SessionLostError(f"服务器 {self.server_url} 会话已结束")
+        return call.result()
+
+    async def _notify_cancelled(self, session: ClientSession, request_id: int):
+        """向上游发送notifications/cancelled，失败时忽略"""
+        try:
+            await session.send_notification(types.ClientNotification(types.CancelledNotification(
+                method="notifications/cancelled",
+                params=types.CancelledNotificationParams(requestId=request_id, reason="请求已取消")
+            )))
+            logger.debug(f"已通知服务器 {self.server_url} 取消请求 {request_id}")
+        except Exception as e:
+            logger.debug(f"通知服务器 {self.server_url} 取消请求 {request_id} 失败: {str(e)}")
 
     async def list_tools(self):
         """获取工具列表"""
         # 确保连接可用
         await self._ensure_connected()
         
+        generation = self.generation
         try:
-            return await self.session.list_tools()
+            response = await self.session.list_tools()
+            self._apply_tool_listing(response.tools)
+            return response
         except Exception as e:
             logger.error(f"获取工具列表失败: {str(e)}")
-            # 如果是连接相关错误，尝试重连后再次调用
-            if "connection" in str(e).lower() or "sse" in str(e).lower():
+            # 如果是连接相关错误，等待（共享的）重连后再次获取，tools/list可以安全重试
+            if is_session_error(e):
                 logger.warning("检测到可能的连接错误，尝试重连后重试...")
                 try:
-                    await self.connect()
-                    return await self.session.list_tools()
+                    await self.reconnect(generation)
+                    response = await self.session.list_tools()
+                    self._apply_tool_listing(response.tools)
+                    return response
                 except Exception as retry_e:
                     logger.error(f"重连后重试仍然失败: {str(retry_e)}")
                     raise APIError(f"获取工具列表失败: {str(retry_e)}")
@@ -130,8 +401,14 @@ class MCPClient:
 
     async def cleanup(self):
         """清理资源"""
+        task = self._reconnect_task
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
         async with self._connection_lock:
             await self._cleanup_session()
+        if self._owns_http_transport:
+            await self.http_transport.close()
 
     @property
     def is_connected(self) -> bool:
@@ -4,31 +4,185 @@ MCP客户端管理器模块
 """
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import os
+import time
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Set, Union, Callable, Awaitable, Iterable
 from core.mcp_client import MCPClient
-from utils.exceptions import MCPConnectionError, ToolNotFoundError, APIError
+from core.mcp_client_pool import MCPClientPool
+from core.load_balancer import ServerStats, create_load_balancer
+from core.circuit_breaker import CircuitBreaker
+from core.tool_catalog import ToolCatalog, save_snapshot, load_snapshot
+from core.result_cache import ResultCache
+from core.single_flight import SingleFlight
+from core.hedging import HedgingPolicy
+from core.deadline import Deadline
+from core.admission import ConcurrencyLimiter
+from core.keepalive import KeepaliveScheduler
+from core.transports import resolve_transport
+from config import (
+    POOL_MAX_SIZE, LOAD_BALANCE_STRATEGY, SERVER_WEIGHTS, LATENCY_EWMA_ALPHA,
+    FANOUT_TIMEOUT, RECONNECT_TIMEOUT, IDLE_PING_THRESHOLD, COALESCE_TOOLS, TOOL_CALL_TIMEOUT, TOOL_TIMEOUTS, SERVER_TIMEOUTS,
+    ADMISSION_GLOBAL_LIMIT, ADMISSION_GLOBAL_QUEUE, ADMISSION_SERVER_LIMIT, ADMISSION_SERVER_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER, SERVER_CONCURRENCY_LIMITS, ADMISSION_ADAPTIVE,
+    ADMISSION_LATENCY_TARGET_MS, CONNECT_RETRY_INITIAL_DELAY, CONNECT_RETRY_MAX_DELAY, STARTUP_TIMEOUT,
+    TOOL_CATALOG_SNAPSHOT_FILE, MCP_SERVERS, MCP_SERVERS_FILE, MCP_SERVERS_FILE_WATCH_INTERVAL, DRAIN_TIMEOUT,
+    load_server_file, apply_server_options
+)
+from utils.exceptions import (
+    MCPConnectionError, ToolNotFoundError, APIError, DeadlineExceededError, OverloadedError, ValidationError
+)
+from utils.metrics import (
+    TOOL_CALL_DURATION, UPSTREAM_CALL_DURATION, UPSTREAM_IN_FLIGHT, BREAKER_OPEN, ADMISSION_QUEUE_DEPTH, FAILOVERS,
+    HEALTH_CHECKS, TOOL_CATALOG_TOOLS, TOOL_CATALOG_VERSION
+)
 
 logger = logging.getLogger(__name__)
 
+# 工具目录变化后延迟写入快照的秒数，期间的多次变化（如启动时各服务器相继连上）合并为一次写入
+SNAPSHOT_WRITE_DELAY = 1.0
+
+class ScatterResult:
+    """扇出调用中单个服务器的结果"""
+
+    __slots__ = ("value", "error", "timed_out")
+
+    def __init__(self, value: Any = None, error: Optional[BaseException] = None, timed_out: bool = False):
+        self.value = value
+        self.error = error
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        """是否在截止时间内成功返回"""
+        return self.error is None and not self.timed_out
+
+    @property
+    def error_message(self) -> Optional[str]:
+        """错误描述"""
+        if self.timed_out:
+            return "超时"
+        return str(self.error) if self.error is not None else None
+
 class MCPClientManager:
     """MCP客户端管理器，管理多个MCP服务器连接"""
     
-    def __init__(self, server_urls: List[str]):
-        """初始化MCP客户端管理器"""
-        self.server_urls = server_urls
-        self.clients: Dict[str, MCPClient] = {}
+    def __init__(self, server_urls: List[str], server_options: Optional[Dict[str, Dict[str, Any]]] = None):
+        """初始化MCP客户端管理器，server_options为服务器列表文件中的单服务器选项（默认取MCP_SERVERS）"""
+        self.server_urls = list(server_urls)
+        self.server_options = dict(MCP_SERVERS if server_options is None else server_options)
+        self.clients: Dict[str, Union[MCPClient, MCPClientPool]] = {}
         self.tool_registry: Dict[str, List[str]] = {}  # 工具名 -> 服务器URL列表
+        self._server_tool_index: Dict[str, Dict[str, Any]] = {}  # 服务器URL -> 已注册的工具（工具名 -> 定义）
+        self.server_tools: Dict[str, List[Any]] = {}  # 服务器URL -> 最近一次获取到的工具列表
+        self.tool_definitions: Dict[str, Any] = {}  # 工具名 -> 工具定义（取第一个提供该工具的服务器）
+        self.tool_catalog = ToolCatalog()
+        self.result_cache = ResultCache()
+        self.single_flight = SingleFlight(COALESCE_TOOLS)
+        self.hedging = HedgingPolicy()
+        self.server_stats: Dict[str, ServerStats] = {url: ServerStats(LATENCY_EWMA_ALPHA) for url in server_urls}
+        self.load_balancer = create_load_balancer(LOAD_BALANCE_STRATEGY, SERVER_WEIGHTS)
+        self.breakers: Dict[str, CircuitBreaker] = {url: CircuitBreaker(url) for url in server_urls}
+        self.global_limiter = ConcurrencyLimiter("代理", ADMISSION_GLOBAL_LIMIT, ADMISSION_GLOBAL_QUEUE,
+                                                 ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER, status_code=429)
+        self.server_limiters: Dict[str, ConcurrencyLimiter] = {}
+        self.health_state: Dict[str, Dict[str, Any]] = {}  # 服务器URL -> 最近一次检查结果（由保活调度维护）
+        self.keepalive = KeepaliveScheduler(self._keepalive_check)
+        self._starting: Set[str] = set()  # 启动阶段尚未连上的服务器，保留快照中的工具并参与就绪判断
+        self._connect_tasks: Dict[str, asyncio.Task] = {}  # 服务器URL -> 后台连接任务
+        self._startup_task: Optional[asyncio.Task] = None
         self._connection_lock = asyncio.Lock()
+        self._draining: Set[str] = set()  # 已摘除的服务器：不再接收新调用，在途调用继续完成
+        self._removing: Set[str] = set()  # 正在等待在途调用完成、即将移除的服务器
+        self._membership_lock = asyncio.Lock()
+        # 由服务器列表文件管理的服务器，文件变化时只增删这些服务器，不影响通过管理接口增加的服务器
+        self._file_servers: Set[str] = set(MCP_SERVERS) & set(self.server_urls) if MCP_SERVERS_FILE else set()
+        self._servers_file_mtime: Optional[float] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._snapshot_pending = False
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """注册导出时读取的指标，读取的都是已有的状态，热路径上没有额外开销"""
+        UPSTREAM_IN_FLIGHT.set_function(lambda: {(url,): stats.in_flight for url, stats in self.server_stats.items()})
+        BREAKER_OPEN.set_function(lambda: {
+            (url,): 0 if breaker.state == CircuitBreaker.CLOSED else 1 for url, breaker in self.breakers.items()
+        })
+        ADMISSION_QUEUE_DEPTH.set_function(lambda: {
+            ("global",): self.global_limiter.queue_depth,
+            **{(url,): limiter.queue_depth for url, limiter in self.server_limiters.items()}
+        })
+        TOOL_CATALOG_TOOLS.set_function(lambda: {(): self.tool_catalog.tools_count})
+        TOOL_CATALOG_VERSION.set_function(lambda: {(): self.tool_catalog.version})
+
+    async def start(self):
+        """非阻塞启动：加载工具目录快照，并在后台连接所有服务器
+
+        快照中的工具立即出现在工具目录中，调用只会路由到已连接的服务器；
+        启动阶段每个工具至少有一个已连接的服务器后才视为就绪。
+        """
+        if TOOL_CATALOG_SNAPSHOT_FILE:
+            snapshot = load_snapshot(TOOL_CATALOG_SNAPSHOT_FILE, self.server_urls)
+            if snapshot:
+                self.server_tools.update(snapshot)
+                logger.info(f"从快照 {TOOL_CATALOG_SNAPSHOT_FILE} 加载了 {len(snapshot)} 个服务器的工具定义")
+        self._starting = set(self.server_urls)
+        self._update_tool_registry(self.server_urls)
+        
+        for url in self.server_urls:
+            self._connect_tasks[url] = asyncio.create_task(self._connect_in_background(url))
+        self._startup_task = asyncio.create_task(self._end_startup_after(STARTUP_TIMEOUT))
+        logger.info(f"正在后台连接 {len(self.server_urls)} 个MCP服务器...")
+        if MCP_SERVERS_FILE and MCP_SERVERS_FILE_WATCH_INTERVAL > 0:
+            self._watch_task = asyncio.create_task(
+                self._watch_servers_file(MCP_SERVERS_FILE, MCP_SERVERS_FILE_WATCH_INTERVAL)
+            )
+
+    async def _connect_in_background(self, url: str):
+        """后台连接单个服务器，失败时按指数退避重试直到成功"""
+        client = self._create_client(url)
+        delay = CONNECT_RETRY_INITIAL_DELAY
+        while True:
+            try:
+                await client.connect()
+                break
+            except asyncio.CancelledError:
+                # 连接过程中服务器被移除或服务关闭
+                await client.cleanup()
+                raise
+            except Exception as e:
+                self._record_check(url, False, str(e))
+                logger.warning(f"连接到 {url} 失败，{delay:.3g} 秒后重试: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, CONNECT_RETRY_MAX_DELAY)
+        
+        self._record_check(url, True)
+        self.clients[url] = client
+        self._starting.discard(url)
+        self._connect_tasks.pop(url, None)
+        self.keepalive.add(url)
+        logger.info(f"成功连接到MCP服务器: {url}")
+        self._update_tool_registry([url])
+
+    async def _end_startup_after(self, timeout: float):
+        """启动超时后，仍未连上的服务器不再保留快照中的工具，也不再阻塞就绪"""
+        await asyncio.sleep(timeout)
+        if self._starting:
+            logger.warning(f"服务器 {sorted(self._starting)} 在 {timeout:g} 秒内未连接成功，不再阻塞就绪，后台继续重试")
+            starting = list(self._starting)
+            self._starting.clear()
+            self._update_tool_registry(starting)
 
     async def connect_all(self):
-        """连接到所有MCP服务器"""
+        """阻塞式连接到所有MCP服务器，全部连接失败时抛出异常（需要等待连接完成时使用）"""
         async with self._connection_lock:
             logger.info(f"正在连接到 {len(self.server_urls)} 个MCP服务器...")
             
             # 并行连接所有服务器
             tasks = []
             for url in self.server_urls:
-                client = MCPClient(url)
+                client = self._create_client(url)
                 self.clients[url] = client
                 tasks.append(self._connect_single_client(url, client))
             
@@ -39,13 +193,17 @@ class MCPClientManager:
             connected_count = 0
             for i, result in enumerate(results):
                 url = self.server_urls[i]
+                self._record_check(url, not isinstance(result, Exception),
+                                   str(result) if isinstance(result, Exception) else None)
                 if isinstance(result, Exception):
                     logger.error(f"连接到 {url} 失败: {str(result)}")
                     # 从客户端字典中移除失败的客户端
                     if url in self.clients:
                         del self.clients[url]
+                    self.server_tools.pop(url, None)
                 else:
                     connected_count += 1
+                    self.keepalive.add(url)
             
             if connected_count == 0:
                 raise MCPConnectionError("所有MCP服务器连接失败")
@@ -53,9 +211,16 @@ class MCPClientManager:
             logger.info(f"成功连接到 {connected_count}/{len(self.server_urls)} 个MCP服务器")
             
             # 构建工具注册表
-            await self._build_tool_registry()
+            self._update_tool_registry(self.server_urls)
 
-    async def _connect_single_client(self, url: str, client: MCPClient):
+    def _create_client(self, url: str) -> Union[MCPClient, MCPClientPool]:
+        """创建客户端，配置的最大会话数大于1时使用连接池"""
+        options = self.server_options.get(url)
+        if POOL_MAX_SIZE > 1:
+            return MCPClientPool(url, on_tools_changed=self._on_tools_changed, options=options)
+        return MCPClient(url, on_tools_changed=self._on_tools_changed, options=options)
+
+    async def _connect_single_client(self, url: str, client: Union[MCPClient, MCPClientPool]):
         """连接单个MCP客户端"""
         try:
             await client.connect()
@@ -64,61 +229,411 @@ class MCPClientManager:
             logger.error(f"连接到MCP服务器 {url} 失败: {str(e)}")
             raise
 
-    async def _build_tool_registry(self):
-        """构建工具注册表，记录每个工具可用的服务器"""
-        self.tool_registry = {}
+    def _on_tools_changed(self, url: str, tools: List[Any]):
+        """客户端工具目录变化回调（连接、重连或收到tools/list_changed通知）"""
+        self.server_tools[url] = tools
+        if url in self.clients:
+            self._update_tool_registry([url])
+
+    def _is_registered(self, url: str) -> bool:
+        """服务器的工具是否出现在工具注册表中：已连接，或启动阶段尚未连上、工具来自快照，并且没有被摘除"""
+        return (url in self.clients or url in self._starting) and url not in self._draining
+
+    def _update_tool_registry(self, urls: Iterable[str]):
+        """按服务器增量更新工具注册表，只有工具实际变化时才重建合并后的工具目录快照"""
+        changed: Set[str] = set()
+        for url in urls:
+            changed |= self._update_server_tools(url)
+        if not changed:
+            return
+        server_tools = {url: list(tools.values()) for url, tools in self._server_tool_index.items()}
+        if self.tool_catalog.rebuild(server_tools) and self.clients:
+            self._schedule_snapshot()
+        logger.info(f"工具注册表已更新，{len(changed)} 个工具变化，共注册 {len(self.tool_registry)} 个工具")
+
+    def _schedule_snapshot(self):
+        """在后台写入工具目录快照，写入在线程中进行，不阻塞事件循环"""
+        if not TOOL_CATALOG_SNAPSHOT_FILE:
+            return
+        self._snapshot_pending = True
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.create_task(self._write_snapshots())
+
+    async def _write_snapshots(self):
+        while self._snapshot_pending:
+            await asyncio.sleep(SNAPSHOT_WRITE_DELAY)
+            await self._flush_snapshot()
+
+    async def _flush_snapshot(self):
+        self._snapshot_pending = False
+        await asyncio.to_thread(save_snapshot, TOOL_CATALOG_SNAPSHOT_FILE, self._snapshot_tools())
+
+    def _snapshot_tools(self) -> Dict[str, List[Any]]:
+        """要写入快照的工具：已配置的服务器最近一次已知的工具列表
+
+        尚未连上（包括启动超时后仍未连上）的服务器不在工具注册表中，保留其来自快照或之前连接的工具，
+        下次冷启动时这些工具仍然可以从快照中恢复
+        """
+        return {url: list(self.server_tools[url]) for url in self.server_urls if url in self.server_tools}
+
+    def _update_server_tools(self, url: str) -> Set[str]:
+        """把单个服务器当前的工具同步到工具注册表，返回发生变化的工具名"""
+        new_tools: Dict[str, Any] = {}
+        if self._is_registered(url):
+            for tool in self.server_tools.get(url, []):
+                new_tools.setdefault(tool.name, tool)
+        old_tools = self._server_tool_index.get(url, {})
+        changed = {name for name in old_tools.keys() | new_tools.keys() if old_tools.get(name) != new_tools.get(name)}
+        if not changed:
+            return changed
         
-        for url, client in self.clients.items():
-            try:
-                for tool_name in client.available_tools:
-                    if tool_name not in self.tool_registry:
-                        self.tool_registry[tool_name] = []
-                    self.tool_registry[tool_name].append(url)
-            except Exception as e:
-                logger.error(f"获取服务器 {url} 工具列表失败: {str(e)}")
+        for name in changed:
+            # 写时复制：进行中的调用可能正在遍历旧的服务器列表
+            urls = self.tool_registry.get(name, [])
+            if name not in new_tools:
+                urls = [u for u in urls if u != url]
+            elif url not in urls:
+                urls = urls + [url]
+            if urls:
+                self.tool_registry[name] = urls
+            else:
+                self.tool_registry.pop(name, None)
+        if new_tools:
+            self._server_tool_index[url] = new_tools
+        else:
+            self._server_tool_index.pop(url, None)
         
-        logger.info(f"工具注册表构建完成，共注册 {len(self.tool_registry)} 个工具")
+        # 工具定义取第一个提供该工具的服务器；定义变化后，其缓存的结果不再可信
+        for name in changed:
+            urls = self.tool_registry.get(name)
+            definition = self._server_tool_index[urls[0]][name] if urls else None
+            if definition != self.tool_definitions.get(name):
+                self.result_cache.invalidate_tool(name)
+            if definition is None:
+                self.tool_definitions.pop(name, None)
+            else:
+                self.tool_definitions[name] = definition
+        return changed
+
+    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any], preferred_server: Optional[str] = None,
+                        read_cache: bool = True, write_cache: bool = True,
+                        progress_callback: Optional[Callable] = None, timeout: Optional[float] = None):
+        """调用MCP工具，可缓存的工具优先从结果缓存返回
 
-    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any], preferred_server: Optional[str] = None):
-        """调用MCP工具，支持指定优先服务器"""
+        Args:
+            tool_name: 工具名称
+            tool_args: 工具参数
+            preferred_server: 优先使用的服务器
+            read_cache: 是否允许直接返回缓存结果（对应 Cache-Control: no-cache）
+            write_cache: 是否允许缓存本次结果（对应 Cache-Control: no-store）
+            progress_callback: 接收上游进度通知的回调，设置后不参与请求合并
+            timeout: 调用方的时间预算（秒），只能缩短工具配置的截止时间
+
+        Raises:
+            DeadlineExceededError: 包含故障转移在内的整个调用超过截止时间
+        """
         if tool_name not in self.tool_registry:
             raise ToolNotFoundError(tool_name)
         
-        available_servers = self.tool_registry[tool_name]
+        started_at = time.perf_counter()
+        outcome = "error"
+        try:
+            cache_key = None
+            if (read_cache or write_cache) and self.result_cache.is_cacheable(tool_name, self.tool_definitions.get(tool_name)):
+                cache_key = self.result_cache.make_key(tool_name, tool_args)
+                if read_cache:
+                    cached = self.result_cache.get(cache_key)
+                    if cached is not None:
+                        logger.debug(f"工具 {tool_name} 命中结果缓存")
+                        outcome = "cache_hit"
+                        return cached
+        
+            tool_timeout = TOOL_TIMEOUTS.get(tool_name, TOOL_CALL_TIMEOUT)
+            deadline = Deadline(min(tool_timeout, timeout) if timeout is not None else tool_timeout)
+        
+            if progress_callback is None and self.single_flight.enabled_for(tool_name):
+                # 相同工具和参数的并发调用共享同一次上游调用；共享调用使用工具的截止时间，
+                # 每个等待者只按自己的截止时间等待，提前离开不影响其他等待者
+                flight_key = (cache_key or self.result_cache.make_key(tool_name, tool_args), preferred_server)
+                try:
+                    result = await asyncio.wait_for(self.single_flight.do(
+                        flight_key,
+                        lambda: self._call_tool_with_failover(tool_name, tool_args, preferred_server,
+                                                              deadline=Deadline(tool_timeout))
+                    ), deadline.remaining())
+                except asyncio.TimeoutError:
+                    raise DeadlineExceededError(f"调用工具 {tool_name} 超过截止时间 {deadline.timeout:.3g} 秒")
+            else:
+                result = await self._call_tool_with_failover(tool_name, tool_args, preferred_server, progress_callback,
+                                                             deadline)
+            if cache_key is not None and write_cache:
+                self.result_cache.put(cache_key, result)
+            outcome = "ok"
+            return result
+        except DeadlineExceededError:
+            outcome = "timeout"
+            raise
+        finally:
+            TOOL_CALL_DURATION.observe(time.perf_counter() - started_at, tool_name, outcome)
+
+    async def _call_tool_with_failover(self, tool_name: str, tool_args: Dict[str, Any],
+                                       preferred_server: Optional[str] = None,
+                                       progress_callback: Optional[Callable] = None,
+                                       deadline: Optional[Deadline] = None):
+        """按负载均衡策略选择服务器调用工具，失败时依次故障转移，支持指定优先服务器
+
+        所有尝试共享同一个截止时间，截止时间到达后不再故障转移。
+        """
+        if deadline is None:
+            deadline = Deadline(TOOL_TIMEOUTS.get(tool_name, TOOL_CALL_TIMEOUT))
+        
+        # 全局准入控制：超出代理整体并发上限的调用排队，队列已满或排队超时时返回429
+        await self.global_limiter.acquire(deadline.remaining())
+        try:
+            return await self._call_tool_on_candidates(tool_name, tool_args, preferred_server, progress_callback,
+                                                       deadline)
+        finally:
+            self.global_limiter.release()
+
+    async def _call_tool_on_candidates(self, tool_name: str, tool_args: Dict[str, Any],
+                                       preferred_server: Optional[str], progress_callback: Optional[Callable],
+                                       deadline: Deadline):
+        """按负载均衡顺序在候选服务器上尝试调用"""
+        available_servers = [url for url in self.tool_registry.get(tool_name, []) if url in self.clients]
+        if not available_servers:
+            # 启动阶段提供该工具的服务器都还在连接时，在截止时间内等待其中一个连上
+            connecting = [self._connect_tasks[url] for url in self.tool_registry.get(tool_name, [])
+                          if url in self._starting and url in self._connect_tasks]
+            if connecting:
+                await asyncio.wait(connecting, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED)
+                available_servers = [url for url in self.tool_registry.get(tool_name, []) if url in self.clients]
+        candidates = self.load_balancer.order(tool_name, available_servers, self.server_stats) if available_servers else []
+        # 并发已满的服务器排到后面（稳定排序，保持负载均衡给出的相对顺序）
+        candidates.sort(key=lambda url: self._get_limiter(url).saturated)
         
         # 如果指定了优先服务器且该服务器可用，优先使用
-        if preferred_server and preferred_server in available_servers:
-            try:
-                client = self.clients[preferred_server]
-                return await client.call_tool(tool_name, tool_args)
-            except Exception as e:
-                logger.warning(f"使用优先服务器 {preferred_server} 调用工具失败: {str(e)}")
-                # 失败后继续尝试其他服务器
+        if preferred_server and preferred_server in candidates:
+            candidates.remove(preferred_server)
+            candidates.insert(0, preferred_server)
+        
+        # 幂等工具有多个副本时可以对冲；需要转发进度通知的调用不对冲，避免重复的进度
+        if progress_callback is None and len(candidates) > 1:
+            hedge_delay = self.hedging.delay_for(tool_name, self.tool_definitions.get(tool_name))
+            if hedge_delay is not None:
+                return await self._call_tool_hedged(tool_name, tool_args, candidates, preferred_server, hedge_delay,
+                                                    deadline)
         
-        # 尝试所有可用的服务器
+        # 按顺序尝试可用的服务器，熔断中的服务器直接跳过
         last_error = None
-        for server_url in available_servers:
-            if server_url == preferred_server:
-                continue  # 已经尝试过了
-            
+        skipped_servers = 0
+        for server_url in candidates:
+            if server_url not in self.clients:
+                # 故障转移过程中服务器已被移除
+                continue
+            if not self._get_breaker(server_url).allow_request():
+                skipped_servers += 1
+                continue
+            if last_error is not None:
+                FAILOVERS.inc(tool_name)
             try:
-                client = self.clients[server_url]
-                result = await client.call_tool(tool_name, tool_args)
+                result = await self._call_server(server_url, tool_name, tool_args, deadline, progress_callback)
                 logger.info(f"成功使用服务器 {server_url} 调用工具 {tool_name}")
                 return result
+            except DeadlineExceededError:
+                raise
             except Exception as e:
-                logger.warning(f"服务器 {server_url} 调用工具 {tool_name} 失败: {str(e)}")
+                if server_url == preferred_server:
+                    logger.warning(f"使用优先服务器 {preferred_server} 调用工具失败: {str(e)}")
+                else:
+                    logger.warning(f"服务器 {server_url} 调用工具 {tool_name} 失败: {str(e)}")
                 last_error = e
                 continue
         
-        # 所有服务器都失败了
+        self._raise_all_failed(tool_name, last_error, skipped_servers)
+
+    async def _call_tool_hedged(self, tool_name: str, tool_args: Dict[str, Any], candidates: List[str],
+                                preferred_server: Optional[str], hedge_delay: float, deadline: Deadline):
+        """对冲调用：首个请求超过hedge_delay未返回时，在预算允许的情况下向下一个服务器再发一次
+
+        取最先成功的结果并取消其余请求；请求失败时和普通调用一样依次故障转移。
+        """
+        servers = iter(candidates)
+        attempts: Dict[asyncio.Task, str] = {}
+        hedge_task = None
+        hedge_decided = False
+        last_error = None
+        skipped_servers = 0
+        
+        def start_next() -> Optional[asyncio.Task]:
+            nonlocal skipped_servers
+            for server_url in servers:
+                if server_url not in self.clients:
+                    continue
+                if not self._get_breaker(server_url).allow_request():
+                    skipped_servers += 1
+                    continue
+                task = asyncio.create_task(self._call_server(server_url, tool_name, tool_args, deadline))
+                attempts[task] = server_url
+                return task
+            return None
+        
+        try:
+            start_next()
+            while attempts:
+                done, _ = await asyncio.wait(attempts, timeout=None if hedge_decided else hedge_delay,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超过对冲延迟仍未返回，每次调用最多对冲一次
+                    hedge_decided = True
+                    if self.hedging.try_acquire():
+                        hedge_task = start_next()
+                        if hedge_task is None:
+                            self.hedging.release()
+                        else:
+                            logger.info(f"工具 {tool_name} 超过 {hedge_delay * 1000:.0f}ms 未返回，"
+                                        f"向服务器 {attempts[hedge_task]} 发送对冲请求")
+                    continue
+                
+                for task in done:
+                    server_url = attempts.pop(task)
+                    try:
+                        result = task.result()
+                    except DeadlineExceededError:
+                        raise
+                    except Exception as e:
+                        if server_url == preferred_server:
+                            logger.warning(f"使用优先服务器 {preferred_server} 调用工具失败: {str(e)}")
+                        else:
+                            logger.warning(f"服务器 {server_url} 调用工具 {tool_name} 失败: {str(e)}")
+                        last_error = e
+                        continue
+                    if task is hedge_task:
+                        self.hedging.record_win()
+                    logger.info(f"成功使用服务器 {server_url} 调用工具 {tool_name}")
+                    return result
+                
+                if not attempts and start_next() is not None:
+                    FAILOVERS.inc(tool_name)
+        finally:
+            # 取消落败或尚未完成的请求
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.gather(*attempts, return_exceptions=True)
+        
+        self._raise_all_failed(tool_name, last_error, skipped_servers)
+
+    def _raise_all_failed(self, tool_name: str, last_error: Optional[Exception], skipped_servers: int):
+        """所有候选服务器都未能完成调用时抛出相应的错误"""
+        if isinstance(last_error, OverloadedError):
+            # 所有服务器的并发都已满，带上Retry-After快速失败
+            raise OverloadedError(f"调用工具 {tool_name} 失败，所有服务器均繁忙: {last_error.message}",
+                                  last_error.retry_after, last_error.status_code)
         if last_error:
             raise APIError(f"调用工具 {tool_name} 失败，所有服务器都不可用: {str(last_error)}")
+        elif skipped_servers:
+            raise MCPConnectionError(f"调用工具 {tool_name} 失败，所有可用服务器均处于熔断状态")
+        elif any(url in self._starting for url in self.tool_registry.get(tool_name, [])):
+            raise MCPConnectionError(f"调用工具 {tool_name} 失败，提供该工具的服务器正在连接")
         else:
             raise APIError(f"调用工具 {tool_name} 失败，没有可用的服务器")
 
+    async def _call_server(self, server_url: str, tool_name: str, tool_args: Dict[str, Any], deadline: Deadline,
+                           progress_callback: Optional[Callable] = None):
+        """在指定服务器上调用工具，并记录在途请求数和延迟
+
+        单次尝试的超时取剩余截止时间与SERVER_TIMEOUTS中该服务器配置的较小者，超时后取消上游请求。
+        """
+        server_timeout = SERVER_TIMEOUTS.get(server_url)
+        attempt_timeout = deadline.timeout_for(server_timeout)
+        if attempt_timeout <= 0:
+            self._get_breaker(server_url).release_probe()
+            raise DeadlineExceededError(f"调用工具 {tool_name} 超过截止时间 {deadline.timeout:.3g} 秒")
+        
+        breaker = self._get_breaker(server_url)
+        limiter = self._get_limiter(server_url)
+        try:
+            admitted_at = await limiter.acquire(deadline.remaining())
+        except BaseException:
+            # 未能进入服务器的调用不代表服务器故障
+            breaker.release_probe()
+            raise
+        client = self.clients.get(server_url)
+        if client is None:
+            # 排队期间服务器已被移除
+            limiter.release()
+            breaker.release_probe()
+            raise MCPConnectionError(f"服务器 {server_url} 已移除")
+        attempt_timeout = deadline.timeout_for(server_timeout)
+        
+        stats = self.server_stats.setdefault(server_url, ServerStats(LATENCY_EWMA_ALPHA))
+        started_at = stats.begin()
+        success = False
+        failed = False  # 服务器故障（计入熔断统计，也作为自适应并发上限的减小信号）
+        cancelled = False
+        outcome = "error"
+        try:
+            result = await asyncio.wait_for(
+                client.call_tool(tool_name, tool_args, progress_callback), attempt_timeout
+            )
+            success = True
+            outcome = "ok"
+            breaker.record_success()
+            if self.hedging.enabled and self.hedging.is_hedgeable(self.tool_definitions.get(tool_name)):
+                self.hedging.observe(tool_name, time.monotonic() - started_at)
+            return result
+        except ToolNotFoundError:
+            # 工具不存在不代表服务器故障，不计入熔断统计
+            breaker.release_probe()
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            if server_timeout is None or attempt_timeout < server_timeout:
+                # 调用方的截止时间到达，不代表服务器故障
+                breaker.release_probe()
+                raise DeadlineExceededError(f"调用工具 {tool_name} 超过截止时间 {deadline.timeout:.3g} 秒")
+            failed = True
+            breaker.record_failure()
+            raise APIError(f"服务器 {server_url} 调用工具 {tool_name} 超时（{server_timeout:g} 秒）", 504)
+        except Exception:
+            failed = True
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release_probe()
+            cancelled = True
+            outcome = "cancelled"
+            raise
+        finally:
+            UPSTREAM_CALL_DURATION.observe(time.monotonic() - started_at, server_url, tool_name, outcome)
+            if cancelled:
+                stats.cancel()
+                limiter.release()
+            else:
+                stats.end(started_at, success)
+                limiter.release(admitted_at, not failed)
+
+    def _get_limiter(self, server_url: str) -> ConcurrencyLimiter:
+        """获取服务器对应的并发限制器"""
+        if server_url not in self.server_limiters:
+            self.server_limiters[server_url] = ConcurrencyLimiter(
+                f"服务器 {server_url}", SERVER_CONCURRENCY_LIMITS.get(server_url, ADMISSION_SERVER_LIMIT),
+                ADMISSION_SERVER_QUEUE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER, status_code=503,
+                adaptive=ADMISSION_ADAPTIVE, latency_target=ADMISSION_LATENCY_TARGET_MS / 1000
+            )
+        return self.server_limiters[server_url]
+
+    def _get_breaker(self, server_url: str) -> CircuitBreaker:
+        """获取服务器对应的熔断器"""
+        if server_url not in self.breakers:
+            self.breakers[server_url] = CircuitBreaker(server_url)
+        return self.breakers[server_url]
+
     async def list_tools(self, server_url: Optional[str] = None):
-        """获取工具列表，可指定特定服务器"""
+        """获取工具列表，可指定特定服务器
+
+        指定服务器时实时查询该服务器；否则返回缓存的合并工具目录快照。
+        """
         if server_url:
             # 获取特定服务器的工具列表
             if server_url not in self.clients:
@@ -127,77 +642,312 @@ class MCPClientManager:
             client = self.clients[server_url]
             return await client.list_tools()
         else:
-            # 获取所有服务器的工具列表合并
-            all_tools = {}
-            tool_servers = {}  # 记录每个工具来自哪些服务器
-            
-            for url, client in self.clients.items():
-                try:
-                    response = await client.list_tools()
-                    for tool in response.tools:
-                        tool_name = tool.name
-                        if tool_name not in all_tools:
-                            all_tools[tool_name] = tool
-                            tool_servers[tool_name] = []
-                        tool_servers[tool_name].append(url)
-                except Exception as e:
-                    logger.error(f"获取服务器 {url} 工具列表失败: {str(e)}")
-            
-            # 创建响应对象
-            class ToolsResponse:
-                def __init__(self, tools):
-                    self.tools = tools
-            
-            # 为每个工具添加服务器信息
-            tools_with_servers = []
-            for tool_name, tool in all_tools.items():
-                tool_dict = tool.__dict__.copy() if hasattr(tool, '__dict__') else {}
-                tool_dict['available_servers'] = tool_servers.get(tool_name, [])
-                tool_dict['server_count'] = len(tool_dict['available_servers'])
-                
-                # 创建工具对象
-                class ToolWithServers:
-                    def __init__(self, **kwargs):
-                        for k, v in kwargs.items():
-                            setattr(self, k, v)
-                
-                tools_with_servers.append(ToolWithServers(**tool_dict))
-            
-            return ToolsResponse(tools_with_servers)
+            return self.tool_catalog
+
+    async def _scatter_gather(self, func: Callable[[str, Union[MCPClient, MCPClientPool]], Awaitable[Any]],
+                              timeout: float) -> Dict[str, ScatterResult]:
+        """并发地对所有服务器执行func，每个服务器最多等待timeout秒
+
+        超过截止时间仍未完成的调用会被取消并标记为超时，其余服务器的结果照常返回。
+        """
+        clients = list(self.clients.items())
+        if not clients:
+            return {}
+        
+        tasks = {asyncio.create_task(func(url, client)): url for url, client in clients}
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        results = {}
+        for task, url in tasks.items():
+            if task in pending:
+                results[url] = ScatterResult(timed_out=True)
+            elif task.exception() is not None:
+                results[url] = ScatterResult(error=task.exception())
+            else:
+                results[url] = ScatterResult(value=task.result())
+        return results
 
     async def get_server_status(self):
-        """获取所有服务器状态"""
+        """获取所有服务器状态，并发检查各服务器，超时的服务器带超时标记返回"""
+        async def check(url, client):
+            return await client._check_connection_health()
+        
+        results = await self._scatter_gather(check, FANOUT_TIMEOUT)
+        
         status = {}
-        for url, client in self.clients.items():
-            try:
-                is_healthy = await client._check_connection_health()
+        for url, result in results.items():
+            client = self.clients.get(url)
+            if client is None:
+                continue
+            self._record_check(url, result.ok and bool(result.value), result.error_message)
+            if result.ok:
                 status[url] = {
-                    "connected": is_healthy,
+                    "connected": result.value,
                     "tools_count": client.tools_count,
                     "available_tools": client.available_tools
                 }
-            except Exception as e:
+            else:
                 status[url] = {
                     "connected": False,
-                    "error": str(e),
+                    "error": result.error_message,
+                    "timed_out": result.timed_out,
                     "tools_count": 0,
                     "available_tools": []
                 }
+            if url in self.server_stats:
+                status[url]["stats"] = self.server_stats[url].snapshot()
+            status[url]["breaker"] = self._get_breaker(url).snapshot()
+            status[url]["admission"] = self._get_limiter(url).stats
+            status[url]["keepalive"] = self.keepalive.snapshot(url)
+            status[url]["draining"] = url in self._draining
+            if isinstance(client, MCPClientPool):
+                status[url]["pool"] = client.stats
         
         return status
 
-    async def _ensure_all_connected(self):
-        """确保所有客户端连接可用，断开的会重连"""
-        for url, client in list(self.clients.items()):
+    async def _keepalive_check(self, url: str):
+        """保活检查单个服务器：探测失败时重连，失败时抛出异常由调度器退避重试"""
+        client = self.clients.get(url)
+        if client is None:
+            return
+        try:
+            await asyncio.wait_for(self._ensure_client_connected(url, client), RECONNECT_TIMEOUT)
+        except Exception as e:
+            self._record_check(url, False, str(e) or type(e).__name__)
+            raise
+        self._record_check(url, True)
+
+    def _record_check(self, url: str, healthy: bool, error: Optional[str] = None):
+        """记录一次检查结果，供廉价的健康检查端点直接读取"""
+        state = self.health_state.setdefault(url, {"last_error": None, "last_error_time": None})
+        now = datetime.now(timezone.utc).isoformat()
+        state["healthy"] = healthy
+        state["last_check_time"] = now
+        HEALTH_CHECKS.inc(url, "healthy" if healthy else "unhealthy")
+        if error:
+            state["last_error"] = error
+            state["last_error_time"] = now
+
+    def get_cached_status(self) -> Dict[str, Dict[str, Any]]:
+        """根据缓存状态返回所有服务器状态，不访问上游服务器"""
+        status = {}
+        for url in dict.fromkeys(list(self.server_urls) + list(self.clients)):
+            client = self.clients.get(url)
+            state = self.health_state.get(url, {})
+            status[url] = {
+                "connected": client.is_connected if client else False,
+                "healthy": state.get("healthy", False),
+                "tools_count": client.tools_count if client else 0,
+                "last_check_time": state.get("last_check_time"),
+                "last_error": state.get("last_error"),
+                "last_error_time": state.get("last_error_time"),
+                "connecting": url in self._connect_tasks,
+                "draining": url in self._draining,
+                "breaker": self._get_breaker(url).state
+            }
+        return status
+
+    @property
+    def breaker_states(self) -> Dict[str, str]:
+        """各服务器熔断器的当前状态"""
+        return {url: breaker.state for url, breaker in self.breakers.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """结果缓存、请求合并、对冲和准入控制的统计信息"""
+        return {
+            "result_cache": self.result_cache.stats,
+            "coalescing": self.single_flight.stats,
+            "hedging": self.hedging.stats,
+            "admission": self.global_limiter.stats
+        }
+
+    @property
+    def is_ready(self) -> bool:
+        """是否可以接收流量：至少有一个已连接且未熔断的服务器
+
+        启动阶段（仍有服务器未连上且未超过STARTUP_TIMEOUT）还要求每个工具都至少有一个已连接的服务器；
+        启动结束后不再按工具判断，避免某个工具唯一的服务器故障时所有副本同时被摘除流量
+        """
+        connected = {url for url, client in self.clients.items() if client.is_connected}
+        if not any(self._get_breaker(url).state != CircuitBreaker.OPEN for url in connected):
+            return False
+        if not self._starting:
+            return True
+        return all(any(url in connected for url in urls) for urls in self.tool_registry.values())
+
+    async def _ensure_client_connected(self, url: str, client: Union[MCPClient, MCPClientPool]):
+        """确保单个客户端连接可用"""
+        if isinstance(client, MCPClientPool):
+            await client.maintain()
+            if not await client._check_connection_health():
+                logger.warning(f"检测到服务器 {url} 连接断开，尝试重连...")
+                await client.connect()
+            return
+        if client.is_connected and client.idle_seconds < IDLE_PING_THRESHOLD:
+            # 最近有过成功通信，无需额外探测
+            return
+        generation = client.generation
+        if not await client._check_connection_health():
+            logger.warning(f"检测到服务器 {url} 连接断开，尝试重连...")
+            # 与调用路径发现的断开共享同一次重连
+            await client.reconnect(generation)
+
+    async def add_server(self, url: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """运行时增加服务器，在后台连接，连上后其工具加入工具注册表；对已摘除的服务器表示恢复接收调用"""
+        async with self._membership_lock:
+            if url in self._removing:
+                raise APIError(f"服务器 {url} 正在移除", 409)
+            if url in self._draining:
+                self._draining.discard(url)
+                self._update_tool_registry([url])
+                logger.info(f"服务器 {url} 已恢复接收调用")
+                return self.get_membership()[url]
+            if url in self.server_urls:
+                raise APIError(f"服务器 {url} 已存在", 409)
+            options = dict(options or {})
+            try:
+                resolve_transport(url, options)
+            except ValueError as e:
+                raise ValidationError(str(e))
+            self.server_urls.append(url)
+            self.server_options[url] = options
+            apply_server_options(url, options)
+            # 负载均衡在第一次调用前就会读取统计信息
+            self.server_stats[url] = ServerStats(LATENCY_EWMA_ALPHA)
+            self._get_breaker(url)
+            self._connect_tasks[url] = asyncio.create_task(self._connect_in_background(url))
+            logger.info(f"已增加服务器 {url}，正在后台连接")
+            return self.get_membership()[url]
+
+    async def drain_server(self, url: str) -> Dict[str, Any]:
+        """摘除服务器：其工具从工具注册表中移除，不再接收新调用，在途调用继续完成，连接保持"""
+        async with self._membership_lock:
+            self._require_server(url)
+            self._drain(url)
+            return self.get_membership()[url]
+
+    async def remove_server(self, url: str, timeout: float = DRAIN_TIMEOUT) -> Dict[str, Any]:
+        """移除服务器：先摘除，等待在途调用完成（最多timeout秒）后断开连接并清除该服务器的所有状态"""
+        async with self._membership_lock:
+            self._require_server(url)
+            if url in self._removing:
+                raise APIError(f"服务器 {url} 正在移除", 409)
+            self._removing.add(url)
+            self._drain(url)
+        
+        deadline = time.monotonic() + timeout
+        stats = self.server_stats.get(url)
+        while stats is not None and stats.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        in_flight = stats.in_flight if stats is not None else 0
+        if in_flight:
+            logger.warning(f"服务器 {url} 在 {timeout:g} 秒内仍有 {in_flight} 个在途调用，强制断开")
+        
+        async with self._membership_lock:
+            task = self._connect_tasks.pop(url, None)
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            await self.keepalive.remove(url)
+            client = self.clients.pop(url, None)
+            self.server_urls.remove(url)
+            self.server_options.pop(url, None)
+            apply_server_options(url, {})
+            self.server_tools.pop(url, None)
+            for state in (self._starting, self._draining, self._removing, self._file_servers):
+                state.discard(url)
+            for state in (self.health_state, self.server_stats, self.breakers, self.server_limiters):
+                state.pop(url, None)
+        if client is not None:
+            await self._cleanup_single_client(url, client)
+        self._schedule_snapshot()
+        logger.info(f"已移除服务器 {url}")
+        return {"server": url, "state": "removed", "in_flight_aborted": in_flight}
+
+    def _require_server(self, url: str):
+        if url not in self.server_urls:
+            raise APIError(f"服务器 {url} 不存在", 404)
+
+    def _drain(self, url: str):
+        if url not in self._draining:
+            self._draining.add(url)
+            self._update_tool_registry([url])
+            logger.info(f"服务器 {url} 已摘除，不再接收新调用")
+
+    def get_membership(self) -> Dict[str, Dict[str, Any]]:
+        """当前配置的服务器及其状态（active/connecting/draining/removing）和来源（file/api/env）"""
+        membership = {}
+        for url in self.server_urls:
+            if url in self._removing:
+                state = "removing"
+            elif url in self._draining:
+                state = "draining"
+            elif url in self.clients:
+                state = "active"
+            else:
+                state = "connecting"
+            options = self.server_options.get(url, {})
+            membership[url] = {
+                "state": state,
+                "transport": resolve_transport(url, options),
+                "source": "file" if url in self._file_servers else ("api" if url in self.server_options else "env"),
+                "in_flight": self.server_stats[url].in_flight if url in self.server_stats else 0
+            }
+        return membership
+
+    async def _watch_servers_file(self, path: str, interval: float):
+        """定期检查服务器列表文件，修改后增加、移除或重建（选项变化时）由文件管理的服务器"""
+        try:
+            self._servers_file_mtime = os.stat(path).st_mtime
+        except OSError:
+            pass
+        while True:
+            await asyncio.sleep(interval)
             try:
-                if not await client._check_connection_health():
-                    logger.warning(f"检测到服务器 {url} 连接断开，尝试重连...")
-                    await client.connect()
+                mtime = os.stat(path).st_mtime
+                if mtime == self._servers_file_mtime:
+                    continue
+                self._servers_file_mtime = mtime
+                await self.sync_servers_file(load_server_file(path))
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"重连服务器 {url} 失败: {str(e)}")
+                logger.error(f"应用服务器列表文件 {path} 失败: {str(e)}")
+
+    async def sync_servers_file(self, servers: Dict[str, Dict[str, Any]]):
+        """按服务器列表文件的新内容增删服务器，选项变化的服务器先移除再重新增加"""
+        removed = [url for url in self._file_servers if url not in servers
+                   or servers[url] != self.server_options.get(url)]
+        await asyncio.gather(*(self.remove_server(url) for url in removed if url not in self._removing))
+        added = [url for url in servers if url not in self.server_urls]
+        for url in added:
+            await self.add_server(url, servers[url])
+            self._file_servers.add(url)
+        if removed or added:
+            logger.info(f"服务器列表文件已变化，增加 {len(added)} 个，移除 {len(removed)} 个服务器")
 
     async def cleanup(self):
         """清理所有客户端连接"""
+        await self.keepalive.stop()
+        background_tasks = [task for task in [self._startup_task, self._watch_task, *self._connect_tasks.values()]
+                            if task is not None]
+        for task in background_tasks:
+            task.cancel()
+        if background_tasks:
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+        self._connect_tasks.clear()
+        self._starting.clear()
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            await asyncio.gather(self._snapshot_task, return_exceptions=True)
+            if self._snapshot_pending:
+                await self._flush_snapshot()
+        
         async with self._connection_lock:
             logger.info("正在清理所有MCP客户端连接...")
             cleanup_tasks = []
@@ -210,9 +960,11 @@ class MCPClientManager:
             
             self.clients.clear()
             self.tool_registry.clear()
+            self._server_tool_index.clear()
+            self.server_tools.clear()
             logger.info("所有MCP客户端连接已清理")
 
-    async def _cleanup_single_client(self, url: str, client: MCPClient):
+    async def _cleanup_single_client(self, url: str, client: Union[MCPClient, MCPClientPool]):
         """清理单个客户端连接"""
         try:
             await client.cleanup()
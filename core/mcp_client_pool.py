@@ -0,0 +1,271 @@
+"""
+MCP客户端连接池模块
+为单个MCP服务器维护多个会话，按租借/归还方式分配给并发调用
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Set, Deque, Optional, Callable
+
+from core.mcp_client import MCPClient
+from core.transports import SharedHTTPTransport
+from utils.exceptions import MCPConnectionError
+from config import POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_IDLE_TIMEOUT, POOL_PREWARM
+
+logger = logging.getLogger(__name__)
+
+class MCPClientPool:
+    """MCP客户端连接池，对外提供与MCPClient相同的调用接口"""
+
+    def __init__(self, server_url: str, on_tools_changed: Optional[Callable[[str, List[Any]], None]] = None,
+                 min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT, prewarm: int = POOL_PREWARM,
+                 options: Optional[Dict[str, Any]] = None):
+        """初始化连接池，池中所有会话共享同一个HTTP连接池"""
+        self.server_url = server_url
+        self.on_tools_changed = on_tools_changed
+        self.options = options or {}
+        self.http_transport = SharedHTTPTransport()
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.idle_timeout = idle_timeout
+        self.prewarm = min(prewarm, self.max_size)
+        self.tools: List[Any] = []
+        self.available_tools: List[str] = []
+        self._available_tool_set: Set[str] = set()
+        self._idle: Deque[MCPClient] = deque()
+        self._leased: Set[MCPClient] = set()
+        self._returned_at: Dict[MCPClient, float] = {}
+        self._opening = 0  # 正在建立中的会话数
+        self._cond = asyncio.Condition()
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    @property
+    def size(self) -> int:
+        """连接池中会话总数（含正在建立的）"""
+        return len(self._idle) + len(self._leased) + self._opening
+
+    async def connect(self):
+        """建立最小数量的会话，已有会话会被全部关闭"""
+        await self.cleanup()
+        logger.info(f"正在为 {self.server_url} 建立连接池，最小会话数: {self.min_size}")
+
+        async with self._cond:
+            self._opening += self.min_size
+        results = await asyncio.gather(
+            *(self._open_client() for _ in range(self.min_size)), return_exceptions=True
+        )
+
+        errors = []
+        async with self._cond:
+            self._opening -= self.min_size
+            for result in results:
+                if isinstance(result, Exception):
+                    errors.append(result)
+                else:
+                    self._put_idle(result)
+            self._cond.notify_all()
+
+        if len(errors) == len(results):
+            raise MCPConnectionError(f"连接池初始化失败: {str(errors[0])}")
+
+        logger.info(f"连接池 {self.server_url} 已建立 {len(results) - len(errors)}/{self.min_size} 个会话")
+        self._schedule_prewarm()
+
+    async def _open_client(self) -> MCPClient:
+        """创建并连接一个新会话"""
+        client = MCPClient(self.server_url, on_tools_changed=self._on_member_tools_changed, options=self.options,
+                           http_transport=self.http_transport)
+        await client.connect()
+        return client
+
+    def _on_member_tools_changed(self, server_url: str, tools: List[Any]):
+        """同步可用工具缓存，同一服务器的所有会话共享同一份工具目录"""
+        self.available_tools = [tool.name for tool in tools]
+        self._available_tool_set = set(self.available_tools)
+        if tools == self.tools:
+            return
+        self.tools = list(tools)
+        if self.on_tools_changed:
+            self.on_tools_changed(self.server_url, self.tools)
+
+    def _put_idle(self, client: MCPClient):
+        """将会话放回空闲队列（调用方需持有锁）"""
+        self._idle.append(client)
+        self._returned_at[client] = time.monotonic()
+
+    async def _acquire(self) -> MCPClient:
+        """租借一个会话，池满时等待其他调用归还"""
+        async with self._cond:
+            while True:
+                while self._idle:
+                    # 后进先出，让长期不用的会话自然老化并被回收
+                    client = self._idle.pop()
+                    self._returned_at.pop(client, None)
+                    if client.is_connected:
+                        self._leased.add(client)
+                        break
+                    self._close_in_background(client)
+                else:
+                    client = None
+
+                if client:
+                    break
+                if self.size < self.max_size:
+                    self._opening += 1
+                    break
+                await self._cond.wait()
+
+        if client is None:
+            try:
+                client = await self._open_client()
+            except Exception:
+                async with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            async with self._cond:
+                self._opening -= 1
+                self._leased.add(client)
+
+        self._schedule_prewarm()
+        return client
+
+    async def _release(self, client: MCPClient):
+        """归还会话，已断开的会话直接丢弃"""
+        async with self._cond:
+            self._leased.discard(client)
+            if client.is_connected:
+                self._put_idle(client)
+            else:
+                self._close_in_background(client)
+            self._evict_idle()
+            self._cond.notify()
+
+    @asynccontextmanager
+    async def lease(self):
+        """以上下文管理器方式租借会话"""
+        client = await self._acquire()
+        try:
+            yield client
+        finally:
+            await self._release(client)
+
+    def _evict_idle(self):
+        """回收空闲超时的会话，保留最小会话数（调用方需持有锁）"""
+        now = time.monotonic()
+        while self._idle and self.size > self.min_size:
+            oldest = self._idle[0]
+            if now - self._returned_at.get(oldest, now) < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._returned_at.pop(oldest, None)
+            logger.debug(f"回收连接池 {self.server_url} 中的空闲会话")
+            self._close_in_background(oldest)
+
+    def _schedule_prewarm(self):
+        """空闲会话不足时在后台预热备用会话"""
+        missing = min(self.prewarm - len(self._idle) - self._opening, self.max_size - self.size)
+        for _ in range(max(0, missing)):
+            self._opening += 1
+            self._spawn(self._prewarm_one())
+
+    async def _prewarm_one(self):
+        """预热单个备用会话"""
+        try:
+            client = await self._open_client()
+        except Exception as e:
+            logger.warning(f"连接池 {self.server_url} 预热会话失败: {str(e)}")
+            async with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            return
+        async with self._cond:
+            self._opening -= 1
+            self._put_idle(client)
+            self._cond.notify()
+
+    def _close_in_background(self, client: MCPClient):
+        """在后台关闭会话，避免阻塞调用方"""
+        self._returned_at.pop(client, None)
+        self._spawn(client.cleanup())
+
+    def _spawn(self, coro):
+        """创建受连接池追踪的后台任务"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def maintain(self):
+        """保活维护：回收空闲会话并补足最小会话数与预热会话"""
+        async with self._cond:
+            self._evict_idle()
+            missing = self.min_size - self.size
+            self._opening += max(0, missing)
+        for _ in range(max(0, missing)):
+            await self._prewarm_one()
+        async with self._cond:
+            self._schedule_prewarm()
+
+    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any], progress_callback: Optional[Callable] = None):
+        """租借会话调用MCP工具"""
+        async with self.lease() as client:
+            return await client.call_tool(tool_name, tool_args, progress_callback)
+
+    async def list_tools(self):
+        """租借会话获取工具列表"""
+        async with self.lease() as client:
+            return await client.list_tools()
+
+    async def _check_connection_health(self) -> bool:
+        """检查连接池健康状态：租借一个会话进行探测"""
+        try:
+            async with self.lease() as client:
+                return await client._check_connection_health()
+        except Exception as e:
+            logger.warning(f"连接池 {self.server_url} 健康检查失败: {str(e)}")
+            return False
+
+    def has_tool(self, tool_name: str) -> bool:
+        """检查工具是否在缓存的可用工具集合中"""
+        return tool_name in self._available_tool_set
+
+    async def cleanup(self):
+        """关闭连接池中的所有会话"""
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+        async with self._cond:
+            clients = list(self._idle) + list(self._leased)
+            self._idle.clear()
+            self._leased.clear()
+            self._returned_at.clear()
+        if clients:
+            await asyncio.gather(*(client.cleanup() for client in clients), return_exceptions=True)
+        await self.http_transport.close()
+
+    @property
+    def is_connected(self) -> bool:
+        """检查是否至少有一个会话已连接（基础检查）"""
+        return any(client.is_connected for client in list(self._idle) + list(self._leased))
+
+    @property
+    def tools_count(self) -> int:
+        """获取可用工具数量"""
+        return len(self.available_tools)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """连接池统计信息"""
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "opening": self._opening,
+            "min_size": self.min_size,
+            "max_size": self.max_size
+        }
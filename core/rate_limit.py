@@ -0,0 +1,199 @@
+"""
+限流模块
+按用户（JWT中的可配置声明）进行令牌桶限流，支持按路由和按工具配置速率与突发量
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_KEY_CLAIM, RATE_LIMIT_CLAIM, RATE_LIMIT_RATE, RATE_LIMIT_BURST,
+    RATE_LIMIT_ROUTES, RATE_LIMIT_TOOLS, RATE_LIMIT_IDLE_TTL, RATE_LIMIT_MAX_BUCKETS
+)
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """令牌桶，令牌按rate（个/秒）匀速补充，最多存burst个"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def refill(self, now: float):
+        """按经过的时间补充令牌"""
+        if now > self.updated_at:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def is_full_at(self, now: float) -> bool:
+        """到now时令牌是否已补满（补满的桶被淘汰后重新创建，限流效果不变）"""
+        return self.tokens + max(0.0, now - self.updated_at) * self.rate >= self.burst
+
+    def reset_after(self) -> float:
+        """令牌补满还需要的秒数"""
+        return (self.burst - self.tokens) / self.rate if self.rate > 0 else 0.0
+
+class RateLimitResult:
+    """一次限流检查的结果，headers()生成对应的响应头"""
+
+    __slots__ = ("allowed", "limit", "remaining", "reset", "retry_after")
+
+    def __init__(self, allowed: bool, limit: float, remaining: float, reset: float, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        """RateLimit-*响应头，被拒绝时附带Retry-After"""
+        headers = {
+            "RateLimit-Limit": str(int(self.limit)),
+            "RateLimit-Remaining": str(max(0, int(self.remaining))),
+            "RateLimit-Reset": str(math.ceil(self.reset))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+class RateLimiter:
+    """按用户的令牌桶限流器
+
+    - 用户由JWT中key_claim声明（默认user_id）标识
+    - 每个用户在每个路由上有一个桶（路由未单独配置时使用默认速率）；
+      在tools中配置了限额的工具，每个用户另有一个按工具的桶
+    - JWT中limit_claim声明（默认rate_limit）可以覆盖默认值，格式：
+      {"rate": 50, "burst": 100, "routes": {"/tools": [5, 10]}, "tools": {"tool_a": [1, 5]}}
+    - 空闲超过idle_ttl秒且令牌已补满的桶按最久未使用顺序淘汰，补充慢于idle_ttl的桶会保留到补满为止，
+      淘汰后重新创建的满桶与保留的桶相同，不会放宽限流；总数超过max_buckets时淘汰最久未使用的桶
+    """
+
+    def __init__(self, enabled: bool = RATE_LIMIT_ENABLED, key_claim: str = RATE_LIMIT_KEY_CLAIM,
+                 limit_claim: str = RATE_LIMIT_CLAIM, rate: float = RATE_LIMIT_RATE, burst: float = RATE_LIMIT_BURST,
+                 routes: Optional[Dict[str, Tuple[float, float]]] = None,
+                 tools: Optional[Dict[str, Tuple[float, float]]] = None,
+                 idle_ttl: float = RATE_LIMIT_IDLE_TTL, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        """初始化限流器"""
+        self.enabled = enabled
+        self.key_claim = key_claim
+        self.limit_claim = limit_claim
+        self.rate = rate
+        self.burst = burst
+        self.routes = routes if routes is not None else RATE_LIMIT_ROUTES
+        self.tools = tools if tools is not None else RATE_LIMIT_TOOLS
+        self.idle_ttl = idle_ttl
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def _user_key(self, payload: Dict[str, Any]) -> str:
+        """限流键：key_claim声明，缺失时依次回退到sub和anonymous"""
+        value = payload.get(self.key_claim)
+        if value is None:
+            value = payload.get('sub', 'anonymous')
+        return str(value)
+
+    def _limits_for(self, payload: Dict[str, Any], scope: str, name: str) -> Optional[Tuple[float, float]]:
+        """获取(速率, 突发量)，JWT声明优先于配置；scope为routes或tools"""
+        claim = payload.get(self.limit_claim)
+        if isinstance(claim, dict):
+            try:
+                scoped = claim.get(scope)
+                if isinstance(scoped, dict) and name in scoped:
+                    rate, burst = scoped[name]
+                    return float(rate), float(burst)
+                if scope == 'routes' and name not in self.routes and 'rate' in claim:
+                    rate = float(claim['rate'])
+                    return rate, float(claim.get('burst', rate))
+            except (TypeError, ValueError):
+                logger.warning(f"JWT中的 {self.limit_claim} 声明格式无效，使用默认限额")
+        configured = getattr(self, scope).get(name)
+        if configured is not None:
+            return configured
+        if scope == 'routes':
+            return self.rate, self.burst
+        return None
+
+    def check(self, payload: Dict[str, Any], route: str, tool_name: Optional[str] = None) -> Optional[RateLimitResult]:
+        """消耗一个令牌；路由桶和工具桶都有令牌时才放行，返回剩余额度最少的桶的结果"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        self._evict(now)
+        user = self._user_key(payload)
+
+        buckets = [self._get_bucket((user, f"route:{route}"), self._limits_for(payload, 'routes', route), now)]
+        if tool_name is not None:
+            tool_limits = self._limits_for(payload, 'tools', tool_name)
+            if tool_limits is not None:
+                buckets.append(self._get_bucket((user, f"tool:{tool_name}"), tool_limits, now))
+
+        for bucket in buckets:
+            bucket.refill(now)
+        blocked = [bucket for bucket in buckets if bucket.tokens < 1]
+        if blocked:
+            self.limited += 1
+            bucket = max(blocked, key=lambda b: (1 - b.tokens) / b.rate if b.rate > 0 else math.inf)
+            retry_after = (1 - bucket.tokens) / bucket.rate if bucket.rate > 0 else self.idle_ttl
+            return RateLimitResult(False, bucket.burst, bucket.tokens, bucket.reset_after(), retry_after)
+
+        for bucket in buckets:
+            bucket.tokens -= 1
+        self.allowed += 1
+        bucket = min(buckets, key=lambda b: b.tokens)
+        return RateLimitResult(True, bucket.burst, bucket.tokens, bucket.reset_after())
+
+    def _get_bucket(self, key: Tuple[str, str], limits: Tuple[float, float], now: float) -> TokenBucket:
+        """获取或创建桶；JWT中的限额变化时按新限额更新"""
+        rate, burst = limits
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._buckets.move_to_end(key)
+            if bucket.rate != rate or bucket.burst != burst:
+                bucket.refill(now)
+                bucket.rate = rate
+                bucket.burst = burst
+                bucket.tokens = min(bucket.tokens, burst)
+        return bucket
+
+    def _evict(self, now: float, max_checks: int = 8):
+        """从最久未使用的一端淘汰空闲且已补满的桶，每次最多检查max_checks个以分摊开销"""
+        idle = []
+        for key, bucket in self._buckets.items():
+            if len(idle) >= max_checks or now - bucket.updated_at < self.idle_ttl:
+                break
+            idle.append((key, bucket))
+        for key, bucket in idle:
+            if bucket.is_full_at(now):
+                del self._buckets[key]
+                self.evictions += 1
+            else:
+                # 尚未补满，移到队尾等待之后再检查，不阻塞其后空闲桶的淘汰
+                self._buckets.move_to_end(key)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """限流统计信息"""
+        return {
+            "enabled": self.enabled,
+            "buckets": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions
+        }
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,155 @@
+"""
+工具结果缓存模块
+为只读/幂等工具缓存调用结果，按工具配置TTL和条目上限，整体受字节预算约束
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    RESULT_CACHE_ENABLED, RESULT_CACHE_DEFAULT_TTL, RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_MAX_ENTRY_BYTES, RESULT_CACHE_TOOL_POLICIES
+)
+
+logger = logging.getLogger(__name__)
+
+def canonical_args(tool_args: Dict[str, Any]) -> str:
+    """将工具参数规范化为稳定的字符串（键排序、无多余空白）"""
+    return json.dumps(tool_args, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+# 每个内容项除正文外的字段（type、mimeType、uri等）的估计大小
+_ITEM_OVERHEAD = 64
+
+def _estimate_size(result: Any) -> int:
+    """按内容项正文（text、data、blob）的长度估算结果占用的字节数，不序列化整个结果"""
+    content = getattr(result, 'content', None)
+    if content is None:
+        return len(json.dumps(result, ensure_ascii=False, default=str))
+    size = _ITEM_OVERHEAD
+    for item in content:
+        resource = getattr(item, 'resource', None)
+        body = resource if resource is not None else item
+        size += _ITEM_OVERHEAD
+        for field in ('text', 'data', 'blob'):
+            value = getattr(body, field, None)
+            if value:
+                size += len(value)
+    return size
+
+class ResultCache:
+    """工具结果的TTL + LRU缓存
+
+    默认只缓存annotations声明了readOnlyHint或idempotentHint的工具，
+    RESULT_CACHE_TOOL_POLICIES可以按工具覆盖是否启用、TTL和最大条目数。
+    """
+
+    def __init__(self, enabled: bool = RESULT_CACHE_ENABLED, default_ttl: float = RESULT_CACHE_DEFAULT_TTL,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES, max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES,
+                 policies: Optional[Dict[str, Dict[str, Any]]] = None):
+        """初始化缓存"""
+        self.enabled = enabled
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.policies = policies if policies is not None else RESULT_CACHE_TOOL_POLICIES
+        # key -> (工具名, 结果, 过期时间, 字节数)，按最近使用排序
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, Any, float, int]]" = OrderedDict()
+        # 工具名 -> 该工具的缓存键，同样按最近使用排序，按工具淘汰时直接从LRU端弹出
+        self._tool_keys: "Dict[str, OrderedDict[Tuple[str, str], None]]" = {}
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_cacheable(self, tool_name: str, tool: Any = None) -> bool:
+        """判断工具结果是否可以缓存"""
+        if not self.enabled:
+            return False
+        policy = self.policies.get(tool_name, {})
+        if 'enabled' in policy:
+            return bool(policy['enabled'])
+        annotations = getattr(tool, 'annotations', None)
+        if annotations is None:
+            return False
+        return bool(getattr(annotations, 'readOnlyHint', False) or getattr(annotations, 'idempotentHint', False))
+
+    def make_key(self, tool_name: str, tool_args: Dict[str, Any]) -> Tuple[str, str]:
+        """生成缓存键"""
+        return tool_name, canonical_args(tool_args)
+
+    def get(self, key: Tuple[str, str]) -> Optional[Any]:
+        """获取缓存结果，过期或不存在时返回None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        tool_name, result, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._tool_keys[tool_name].move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: Tuple[str, str], result: Any):
+        """缓存调用结果，错误结果和超过单条上限的结果不缓存"""
+        if getattr(result, 'isError', False):
+            return
+        tool_name = key[0]
+        policy = self.policies.get(tool_name, {})
+        ttl = policy.get('ttl', self.default_ttl)
+        if ttl <= 0:
+            return
+        size = _estimate_size(result)
+        if size > self.max_entry_bytes or size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (tool_name, result, time.monotonic() + ttl, size)
+        tool_keys = self._tool_keys.setdefault(tool_name, OrderedDict())
+        tool_keys[key] = None
+        self.bytes_held += size
+
+        max_entries = policy.get('max_entries')
+        if max_entries is not None:
+            while len(tool_keys) > max_entries:
+                self._remove(next(iter(tool_keys)))
+                self.evictions += 1
+
+        while self.bytes_held > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]):
+        tool_name, _, _, size = self._entries.pop(key)
+        self.bytes_held -= size
+        tool_keys = self._tool_keys[tool_name]
+        del tool_keys[key]
+        if not tool_keys:
+            del self._tool_keys[tool_name]
+
+    def invalidate_tool(self, tool_name: str):
+        """清除某个工具的全部缓存（如工具定义发生变化）"""
+        for key in list(self._tool_keys.get(tool_name, ())):
+            self._remove(key)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes_held": self.bytes_held,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,74 @@
+"""
+请求合并模块
+相同键的并发调用共享同一次上游调用和同一个结果
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    """一次正在进行的上游调用"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """single-flight请求合并
+
+    - 第一个调用方发起真实调用，其余相同键的调用方等待同一个结果
+    - 真实调用的异常会原样传给所有等待者
+    - 某个等待者被取消（如客户端断开）不影响其他等待者；最后一个等待者离开时取消上游调用
+    """
+
+    def __init__(self, tools: Iterable[str] = ()):
+        """初始化，tools为启用合并的工具名，'*'表示所有工具"""
+        self.tools = set(tools)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def enabled_for(self, tool_name: str) -> bool:
+        """判断工具是否启用了请求合并"""
+        return '*' in self.tools or tool_name in self.tools
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行或加入键对应的调用"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task, k=key, f=flight: self._finish(k, f))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                logger.debug(f"请求合并的所有等待者均已离开，取消上游调用: {key}")
+                self.cancelled += 1
+                flight.task.cancel()
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        """调用结束后移除记录"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # 标记异常已被读取，避免无人等待时产生未处理异常的警告
+            flight.task.exception()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """请求合并统计信息"""
+        return {
+            "in_flight": len(self._flights),
+            "coalesced_requests": self.coalesced,
+            "cancelled_flights": self.cancelled
+        }
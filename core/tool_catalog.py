@@ -0,0 +1,141 @@
+"""
+工具目录模块
+维护合并后的工具目录快照，预先序列化并带有版本号和ETag
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+from mcp import types
+
+from utils.helpers import serialize_tool
+
+logger = logging.getLogger(__name__)
+
+def _json_default(obj):
+    """序列化pydantic等对象"""
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump(mode='json', exclude_none=True)
+    return str(obj)
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+def save_snapshot(path: str, server_tools: Dict[str, List[Any]]):
+    """把各服务器的工具定义写入快照文件（先写临时文件再替换，避免读到不完整的文件）"""
+    data = {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "servers": {
+            url: [tool.model_dump(mode='json', by_alias=True, exclude_none=True) for tool in tools]
+            for url, tools in server_tools.items()
+        }
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"写入工具目录快照 {path} 失败: {str(e)}")
+
+def load_snapshot(path: str, server_urls: List[str]) -> Dict[str, List[Any]]:
+    """读取快照文件中当前仍在配置里的服务器的工具定义，文件不存在或无效时返回空字典"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取工具目录快照 {path} 失败: {str(e)}")
+        return {}
+    if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT_VERSION:
+        logger.warning(f"工具目录快照 {path} 格式不兼容，已忽略")
+        return {}
+
+    server_tools = {}
+    for url, tools in data.get("servers", {}).items():
+        if url not in server_urls:
+            continue
+        try:
+            server_tools[url] = [types.Tool.model_validate(tool) for tool in tools]
+        except Exception as e:
+            logger.warning(f"工具目录快照中服务器 {url} 的工具定义无效: {str(e)}")
+    return server_tools
+
+class ToolCatalog:
+    """合并后的工具目录快照
+
+    只在服务器连接、重连或收到工具列表变化通知时重建，
+    请求方直接使用预先序列化好的body，无需访问上游服务器。
+    """
+
+    def __init__(self):
+        """初始化空目录"""
+        self.version = 0
+        self.etag = '"empty"'
+        self.tools: List[Dict[str, Any]] = []
+        self.body: bytes = b'{"tools": []}'
+        self._serialized: Dict[str, Tuple[Any, Dict[str, Any]]] = {}  # 工具名 -> (工具定义, 序列化结果)
+
+    def rebuild(self, server_tools: Dict[str, List[Any]]) -> bool:
+        """根据各服务器的工具列表重建目录，内容有变化时返回True
+
+        定义没有变化（同一个对象）的工具复用上次的序列化结果，只有变化的工具重新序列化。
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        serialized: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+        for url, tools in server_tools.items():
+            for tool in tools:
+                entry = merged.get(tool.name)
+                if entry is None:
+                    cached = self._serialized.get(tool.name)
+                    if cached is not None and cached[0] is tool:
+                        base = cached[1]
+                    else:
+                        try:
+                            base = serialize_tool(tool)
+                        except Exception as e:
+                            logger.error(f"序列化工具 {tool.name} 时出错: {str(e)}")
+                            base = {"name": tool.name, "description": f"序列化失败: {str(e)}", "error": True}
+                    serialized[tool.name] = (tool, base)
+                    entry = dict(base)
+                    entry['available_servers'] = []
+                    merged[tool.name] = entry
+                entry['available_servers'].append(url)
+        self._serialized = serialized
+
+        tools_data = list(merged.values())
+        for entry in tools_data:
+            entry['server_count'] = len(entry['available_servers'])
+
+        body = json.dumps({"tools": tools_data}, ensure_ascii=False, default=_json_default).encode('utf-8')
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        if etag == self.etag:
+            return False
+
+        self.tools = tools_data
+        self.body = body
+        self.etag = etag
+        self.version += 1
+        logger.info(f"工具目录已更新到版本 {self.version}，共 {len(tools_data)} 个工具")
+        return True
+
+    def load(self, version: int, etag: str, body: bytes):
+        """加载另一个进程中构建好的目录快照（broker模式下worker使用）"""
+        self.tools = json.loads(body)["tools"]
+        self.body = body
+        self.etag = etag
+        self.version = version
+
+    def matches(self, if_none_match: str) -> bool:
+        """判断If-None-Match请求头是否命中当前版本"""
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or self.etag in candidates or f'W/{self.etag}' in candidates
+
+    @property
+    def tools_count(self) -> int:
+        """目录中的工具数量"""
+        return len(self.tools)
@@ -0,0 +1,97 @@
+"""
+上游传输模块
+按服务器配置选择SSE、Streamable HTTP或stdio子进程传输
+"""
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+import httpx
+from mcp.client.sse import sse_client
+from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared._httpx_utils import create_mcp_http_client
+
+from config import MCP_DEFAULT_TRANSPORT
+
+SSE = 'sse'
+STREAMABLE_HTTP = 'streamable_http'
+STDIO = 'stdio'
+TRANSPORTS = (SSE, STREAMABLE_HTTP, STDIO)
+
+def resolve_transport(server_url: str, options: Dict[str, Any]) -> str:
+    """确定服务器使用的传输方式：优先使用配置的transport，否则stdio://为stdio，其余为MCP_DEFAULT_TRANSPORT（默认SSE）
+
+    不按URL路径推断传输方式，已有的SSE服务器不会因为路径恰好以/mcp结尾而被切换到Streamable HTTP
+    """
+    transport = options.get('transport')
+    if transport is None:
+        if server_url.startswith('stdio://'):
+            return STDIO
+        if MCP_DEFAULT_TRANSPORT not in (SSE, STREAMABLE_HTTP):
+            raise ValueError(f"MCP_DEFAULT_TRANSPORT {MCP_DEFAULT_TRANSPORT} 无效，可选: {SSE}, {STREAMABLE_HTTP}")
+        return MCP_DEFAULT_TRANSPORT
+    if transport not in TRANSPORTS:
+        raise ValueError(f"服务器 {server_url} 的传输方式 {transport} 无效，可选: {', '.join(TRANSPORTS)}")
+    return transport
+
+class SharedHTTPTransport(httpx.AsyncBaseTransport):
+    """同一服务器的多个会话共享的HTTP连接池
+
+    每个会话的httpx客户端关闭时不会关闭共享的连接池，由所有者（连接池）调用close()关闭；
+    关闭后再次使用时重新创建。SSE的长连接各占一个连接，因此不限制总连接数。
+    """
+
+    def __init__(self, max_keepalive_connections: int = 20):
+        self._limits = httpx.Limits(max_connections=None, max_keepalive_connections=max_keepalive_connections)
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._transport is None:
+            self._transport = httpx.AsyncHTTPTransport(limits=self._limits)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        # 会话关闭各自的httpx客户端时调用，保留共享的连接
+        pass
+
+    async def close(self):
+        """关闭共享的连接池"""
+        transport, self._transport = self._transport, None
+        if transport is not None:
+            await transport.aclose()
+
+    def client_factory(self):
+        """创建使用共享连接池的httpx客户端工厂，参数与mcp的create_mcp_http_client一致"""
+        def factory(headers: Optional[Dict[str, str]] = None, timeout: Optional[httpx.Timeout] = None,
+                    auth: Optional[httpx.Auth] = None) -> httpx.AsyncClient:
+            return httpx.AsyncClient(headers=headers, timeout=timeout or httpx.Timeout(30.0), auth=auth,
+                                     follow_redirects=True, transport=self)
+        return factory
+
+@asynccontextmanager
+async def open_transport(server_url: str, options: Dict[str, Any], http_transport: Optional[SharedHTTPTransport] = None):
+    """打开到服务器的传输，返回(read_stream, write_stream)
+
+    与sse_client一样基于anyio任务组，必须在进入它的同一个任务中退出。
+    """
+    transport = resolve_transport(server_url, options)
+    if transport == STDIO:
+        params = StdioServerParameters(
+            command=options['command'], args=list(options.get('args', [])),
+            env=options.get('env'), cwd=options.get('cwd')
+        )
+        async with stdio_client(params) as (read, write):
+            yield read, write
+        return
+
+    http_options: Dict[str, Any] = {
+        'headers': options.get('headers'),
+        'httpx_client_factory': http_transport.client_factory() if http_transport else create_mcp_http_client
+    }
+    if 'sse_read_timeout' in options:
+        http_options['sse_read_timeout'] = float(options['sse_read_timeout'])
+    if transport == STREAMABLE_HTTP:
+        async with streamablehttp_client(server_url, **http_options) as (read, write, _):
+            yield read, write
+    else:
+        async with sse_client(server_url, **http_options) as (read, write):
+            yield read, write
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+工具调用基准测试脚本
+在本地启动一个替身SSE MCP服务器，对比每次调用前执行list_tools健康检查（旧行为）
+与被动存活检测（新行为）下的每秒调用次数
+
+运行: python -m scripts.benchmark_call_tool --calls 500 --concurrency 1
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+
+from config import CONNECTION_TIMEOUT
+from core.mcp_client import MCPClient
+
+def build_stand_in_server(tool_count: int) -> FastMCP:
+    """构建替身MCP服务器，额外注册若干工具以模拟真实的工具目录大小"""
+    server = FastMCP("benchmark-stand-in")
+
+    @server.tool()
+    def echo(text: str) -> str:
+        """原样返回输入文本"""
+        return text
+
+    for i in range(tool_count):
+        def make_filler(index: int):
+            def filler(value: str = "") -> str:
+                return f"{index}:{value}"
+            filler.__name__ = f"filler_{index}"
+            filler.__doc__ = f"填充工具 {index}，用于扩大工具目录体积"
+            return filler
+        server.add_tool(make_filler(i))
+
+    return server
+
+class LegacyMCPClient(MCPClient):
+    """复刻旧行为：每次调用前都通过list_tools检查连接"""
+
+    async def _ensure_connected(self):
+        if not self.session:
+            await self.connect()
+            return
+        try:
+            await asyncio.wait_for(self.session.list_tools(), timeout=CONNECTION_TIMEOUT)
+        except Exception:
+            await self.connect()
+
+async def run_calls(client: MCPClient, calls: int, concurrency: int) -> float:
+    """执行指定次数的工具调用，返回每秒调用次数"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_call(i: int):
+        async with semaphore:
+            await client.call_tool("echo", {"text": f"ping-{i}"})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_call(i) for i in range(calls)))
+    elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+async def benchmark(args):
+    """启动替身服务器并分别测量新旧两种客户端"""
+    server = build_stand_in_server(args.tools)
+    # FastMCP会安装自己的日志处理器，这里统一压低日志级别避免干扰输出
+    logging.getLogger().setLevel(logging.WARNING)
+    config = uvicorn.Config(server.sse_app(), host="127.0.0.1", port=args.port, log_level="warning")
+    uvicorn_server = uvicorn.Server(config)
+    server_task = asyncio.create_task(uvicorn_server.serve())
+    while not uvicorn_server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}/sse"
+    results = {}
+    try:
+        for label, client_cls in (("before (list_tools)", LegacyMCPClient), ("after (passive)", MCPClient)):
+            client = client_cls(url)
+            await client.connect()
+            try:
+                # 预热
+                await run_calls(client, min(args.calls, 20), args.concurrency)
+                results[label] = await run_calls(client, args.calls, args.concurrency)
+            finally:
+                await client.cleanup()
+    finally:
+        uvicorn_server.should_exit = True
+        await server_task
+
+    print(f"替身服务器工具数: {args.tools + 1}, 调用次数: {args.calls}, 并发: {args.concurrency}")
+    for label, rate in results.items():
+        print(f"{label:<22} {rate:10.1f} calls/s")
+    before, after = results["before (list_tools)"], results["after (passive)"]
+    print(f"{'speedup':<22} {after / before:10.2f}x")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="MCPClient.call_tool 基准测试")
+    parser.add_argument("--calls", type=int, default=500, help="每轮调用次数")
+    parser.add_argument("--concurrency", type=int, default=1, help="并发调用数")
+    parser.add_argument("--tools", type=int, default=50, help="替身服务器额外注册的工具数量")
+    parser.add_argument("--port", type=int, default=18765, help="替身服务器监听端口")
+    asyncio.run(benchmark(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
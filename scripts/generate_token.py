@@ -18,12 +18,13 @@ except ImportError:
 # 加载环境变量
 load_dotenv()
 
-def generate_token(user_id: str = "test_user", expires_in_hours: int = 24):
+def generate_token(user_id: str = "test_user", expires_in_hours: int = 24, claims: dict = None):
     """生成JWT令牌
     
     Args:
         user_id: 用户ID
         expires_in_hours: 令牌有效期（小时）
+        claims: 额外的声明，如管理员令牌的 {"role": "admin"}
     
     Returns:
         str: JWT令牌
@@ -33,6 +34,16 @@ def generate_token(user_id: str = "test_user", expires_in_hours: int = 24):
     """
     secret = os.getenv('JWT_SECRET', 'default-secret-key')
     algorithm = os.getenv('JWT_ALGORITHM', 'HS256')
+    headers = None
+    
+    # 非对称算法使用私钥签名，kid需要与JWKS文件中的公钥对应
+    private_key_file = os.getenv('JWT_PRIVATE_KEY_FILE')
+    if private_key_file:
+        with open(private_key_file, 'r', encoding='utf-8') as f:
+            secret = f.read()
+        key_id = os.getenv('JWT_KEY_ID')
+        if key_id:
+            headers = {'kid': key_id}
     
     # 构建payload - exp字段是必须的
     now = datetime.now(timezone.utc)
@@ -41,10 +52,11 @@ def generate_token(user_id: str = "test_user", expires_in_hours: int = 24):
         'iat': now,  # 签发时间
         'exp': now + timedelta(hours=expires_in_hours),  # 过期时间（必须）
         'iss': 'mcp-proxy',  # 签发者
+        **(claims or {})
     }
     
     # 生成令牌
-    token = jwt.encode(payload, secret, algorithm=algorithm)
+    token = jwt.encode(payload, secret, algorithm=algorithm, headers=headers)
     return token
 
 def main():
@@ -63,9 +75,13 @@ def main():
     except ValueError:
         hours = 24
     
+    # 管理员令牌可以调用 /admin/servers 管理接口
+    admin = input("是否生成管理员令牌 (y/N): ").strip().lower() == 'y'
+    claims = {os.getenv('ADMIN_CLAIM', 'role'): os.getenv('ADMIN_ROLE', 'admin')} if admin else None
+    
     # 生成令牌
     try:
-        token = generate_token(user_id, hours)
+        token = generate_token(user_id, hours, claims)
         
         print(f"\n生成成功！")
         print(f"用户ID: {user_id}")
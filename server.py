@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+MCP Proxy API 生产环境入口点
+使用Hypercorn运行，支持多个worker进程和uvloop事件循环；
+启用BROKER_ENABLED时先启动持有所有上游连接的broker进程，worker通过Unix socket转发调用
+
+运行:
+    python server.py            # 启动服务（broker模式下同时启动broker进程）
+    python server.py broker     # 只启动broker进程（worker由其他方式启动时使用）
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+from hypercorn.config import Config
+from hypercorn.run import run
+
+from config import (
+    PORT, LOG_LEVEL, MCP_URLS, WORKERS, WORKER_CLASS, GRACEFUL_TIMEOUT, BROKER_ENABLED, BROKER_SOCKET
+)
+
+logging.basicConfig(level=getattr(logging, LOG_LEVEL))
+logger = logging.getLogger(__name__)
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+def resolve_worker_class() -> str:
+    """确定事件循环实现，请求uvloop但未安装时回退到asyncio"""
+    if WORKER_CLASS == 'uvloop':
+        try:
+            import uvloop  # noqa: F401
+        except ImportError:
+            logger.warning("未安装uvloop，回退到asyncio事件循环（pip install 'mcp-proxy-to-api[uvloop]'）")
+            return 'asyncio'
+    return WORKER_CLASS
+
+def run_event_loop(coro, worker_class: str):
+    """在指定的事件循环实现上运行协程"""
+    if worker_class == 'uvloop':
+        import uvloop
+        return asyncio.run(coro, loop_factory=uvloop.new_event_loop)
+    return asyncio.run(coro)
+
+async def run_broker(handle_sigint: bool = True):
+    """broker主循环：连接所有MCP服务器，在Unix socket上为worker提供服务，收到SIGTERM时退出"""
+    from core.broker import BrokerServer
+    from core.mcp_client_manager import MCPClientManager
+
+    logger.info(f"broker正在连接MCP服务器: {MCP_URLS}")
+    manager = MCPClientManager(MCP_URLS)
+    await manager.start()
+    broker = BrokerServer(manager, BROKER_SOCKET)
+    await broker.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    if handle_sigint:
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        logger.info("broker正在关闭...")
+        await broker.close()
+        await manager.cleanup()
+
+def _broker_process_main(worker_class: str):
+    """broker子进程入口；Ctrl+C由父进程处理，worker退出后父进程再用SIGTERM结束broker"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    run_event_loop(run_broker(handle_sigint=False), worker_class)
+
+def start_broker_process(worker_class: str) -> multiprocessing.Process:
+    """启动broker子进程"""
+    process = multiprocessing.get_context('spawn').Process(
+        target=_broker_process_main, args=(worker_class,), name='mcp-proxy-broker'
+    )
+    process.start()
+    logger.info(f"broker进程已启动，PID: {process.pid}")
+    return process
+
+def stop_broker_process(process: multiprocessing.Process):
+    """结束broker子进程，超时未退出时强制结束"""
+    if process.is_alive():
+        process.terminate()
+        process.join(GRACEFUL_TIMEOUT)
+        if process.is_alive():
+            logger.warning("broker进程未在超时时间内退出，强制结束")
+            process.kill()
+            process.join()
+
+def build_config(worker_class: str) -> Config:
+    """构建Hypercorn配置，每个worker进程各自调用create_app()创建应用"""
+    config = Config()
+    config.bind = [f"0.0.0.0:{PORT}"]
+    config.workers = WORKERS
+    config.worker_class = worker_class
+    config.graceful_timeout = GRACEFUL_TIMEOUT
+    config.application_path = f"{APP_PATH}:create_app()"
+    config.loglevel = LOG_LEVEL
+    return config
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="MCP Proxy API 生产环境入口")
+    parser.add_argument('mode', nargs='?', choices=['serve', 'broker'], default='serve',
+                        help="serve: 启动服务（默认）；broker: 只启动broker进程")
+    args = parser.parse_args()
+    worker_class = resolve_worker_class()
+
+    if args.mode == 'broker':
+        run_event_loop(run_broker(), worker_class)
+        return
+
+    broker_process = None
+    if BROKER_ENABLED:
+        broker_process = start_broker_process(worker_class)
+    elif WORKERS > 1:
+        logger.warning(f"未启用broker模式，{WORKERS} 个worker将各自连接所有MCP服务器")
+
+    logger.info(f"启动MCP Proxy API服务器，端口: {PORT}，worker数: {WORKERS}，事件循环: {worker_class}")
+    try:
+        exit_code = run(build_config(worker_class))
+    finally:
+        if broker_process is not None:
+            stop_broker_process(broker_process)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+测试公共配置
+异步测试使用anyio的pytest插件（mcp依赖anyio，无需额外安装），只在asyncio后端上运行
+"""
+import os
+
+# 测试不读写工具目录快照，不连接真实的MCP服务器
+os.environ.setdefault('TOOL_CATALOG_SNAPSHOT_FILE', '')
+os.environ.setdefault('MCP_URLS', 'http://127.0.0.1:1/sse')
+
+import pytest
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
@@ -0,0 +1,79 @@
+"""
+测试用的MCP客户端替身
+"""
+import asyncio
+
+from mcp.types import CallToolResult, TextContent, Tool
+
+from core.mcp_client_manager import MCPClientManager
+
+A = "http://127.0.0.1:18801/sse"
+B = "http://127.0.0.1:18802/sse"
+C = "http://127.0.0.1:18803/sse"
+
+SERVER_TOOLS = {
+    A: ["echo"],
+    B: ["echo", "only_b", "hang"],
+    C: ["echo", "only_c"],
+}
+
+# 连接总是失败的服务器
+UNREACHABLE = {C}
+
+class FakeClient:
+    """代替MCPClient的已连接客户端，hang工具等待release事件后才返回"""
+
+    def __init__(self, url, on_tools_changed):
+        self.server_url = url
+        self.on_tools_changed = on_tools_changed
+        self.tools = [Tool(name=name, inputSchema={"type": "object"}) for name in SERVER_TOOLS[url]]
+        self.is_connected = False
+        self.generation = 0
+        self.idle_seconds = 0.0
+        self.release = asyncio.Event()
+        self.cleaned_up = False
+
+    @property
+    def tools_count(self):
+        return len(self.tools)
+
+    @property
+    def available_tools(self):
+        return [tool.name for tool in self.tools]
+
+    async def connect(self):
+        if self.server_url in UNREACHABLE:
+            raise ConnectionError(f"无法连接到 {self.server_url}")
+        self.is_connected = True
+        self.generation += 1
+        self.on_tools_changed(self.server_url, self.tools)
+
+    async def call_tool(self, tool_name, tool_args, progress_callback=None):
+        if tool_name == "hang":
+            await self.release.wait()
+        return CallToolResult(content=[TextContent(type="text", text=f"{tool_name}@{self.server_url}")])
+
+    async def _check_connection_health(self):
+        return True
+
+    async def cleanup(self):
+        self.is_connected = False
+        self.cleaned_up = True
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "等待条件超时"
+        await asyncio.sleep(0.01)
+
+def make_manager(server_urls):
+    """创建使用FakeClient的管理器，manager.fakes保存创建的客户端"""
+    manager = MCPClientManager(server_urls, server_options={})
+    manager.fakes = {}
+
+    def create_client(url):
+        manager.fakes[url] = FakeClient(url, manager._on_tools_changed)
+        return manager.fakes[url]
+
+    manager._create_client = create_client
+    return manager
@@ -0,0 +1,161 @@
+"""准入控制和AIMD自适应并发上限测试"""
+import asyncio
+
+import pytest
+
+import core.admission as admission
+from core.admission import ConcurrencyLimiter
+from fakes import wait_for
+from utils.exceptions import OverloadedError
+
+def make_limiter(limit=2, max_queue=2, queue_timeout=1.0, **kwargs):
+    return ConcurrencyLimiter("测试", limit, max_queue, queue_timeout, retry_after=3, status_code=503, **kwargs)
+
+@pytest.mark.anyio
+async def test_unlimited_limiter_always_admits():
+    limiter = make_limiter(limit=0)
+    for _ in range(10):
+        await limiter.acquire()
+    assert not limiter.saturated
+    assert limiter.in_flight == 0
+
+@pytest.mark.anyio
+async def test_queued_calls_are_admitted_in_order():
+    limiter = make_limiter()
+    await limiter.acquire()
+    await limiter.acquire()
+    assert limiter.saturated
+    order = []
+
+    async def waiter(name):
+        await limiter.acquire()
+        order.append(name)
+
+    tasks = [asyncio.create_task(waiter(name)) for name in ("first", "second")]
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 2
+    limiter.release()
+    await wait_for(lambda: order)
+    assert order == ["first"]
+    limiter.release()
+    await asyncio.gather(*tasks)
+    assert order == ["first", "second"]
+    assert limiter.in_flight == 2
+    assert limiter.queued_total == 2
+
+@pytest.mark.anyio
+async def test_full_queue_rejects_immediately():
+    limiter = make_limiter(limit=1, max_queue=1)
+    await limiter.acquire()
+    queued = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(OverloadedError) as exc_info:
+        await limiter.acquire()
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.retry_after == 3
+    assert limiter.rejected == 1
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+
+@pytest.mark.anyio
+async def test_queue_timeout_fails_fast_and_leaves_queue():
+    limiter = make_limiter(limit=1, queue_timeout=0.05)
+    await limiter.acquire()
+    with pytest.raises(OverloadedError):
+        await limiter.acquire()
+    assert limiter.timed_out == 1
+    assert limiter.queue_depth == 0
+    limiter.release()
+    assert limiter.in_flight == 0
+
+@pytest.mark.anyio
+async def test_caller_deadline_shortens_queue_wait():
+    limiter = make_limiter(limit=1, queue_timeout=10)
+    await limiter.acquire()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    with pytest.raises(OverloadedError):
+        await limiter.acquire(timeout=0.05)
+    assert loop.time() - started < 1
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_does_not_leak_slot():
+    limiter = make_limiter(limit=1)
+    await limiter.acquire()
+    queued = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    # 名额分给等待者后、等待者恢复运行前被取消，名额要归还
+    limiter.release()
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+    assert limiter.in_flight == 0
+    assert limiter.queue_depth == 0
+    await limiter.acquire()
+    assert limiter.in_flight == 1
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 只用于不运行事件循环的同步测试
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+def finish(limiter, clock, latency, success=True, started_at=None):
+    limiter.in_flight += 1
+    started_at = clock.now if started_at is None else started_at
+    clock.now += latency
+    limiter.release(started_at, success)
+
+def test_failure_decreases_limit_multiplicatively(clock):
+    limiter = make_limiter(limit=10, adaptive=True, latency_target=1.0)
+    finish(limiter, clock, 0.1, success=False)
+    assert limiter.limit == 9
+    assert limiter.stats["limit"] == 9
+
+def test_only_one_decrease_per_round_of_in_flight_calls(clock):
+    limiter = make_limiter(limit=10, adaptive=True, latency_target=1.0)
+    round_started = clock.now
+    finish(limiter, clock, 0.1, success=False, started_at=round_started)
+    # 同一轮发出的调用在第一次减小之后才失败，不再重复减小
+    finish(limiter, clock, 0.1, success=False, started_at=round_started)
+    assert limiter.limit == 9
+    finish(limiter, clock, 0.1, success=False)
+    assert limiter.limit == 8
+
+def test_slow_calls_decrease_limit(clock):
+    limiter = make_limiter(limit=10, adaptive=True, latency_target=0.5)
+    finish(limiter, clock, 0.6)
+    assert limiter.limit == 9
+
+def test_fast_successes_grow_limit_additively_up_to_max(clock):
+    limiter = make_limiter(limit=10, adaptive=True, latency_target=1.0, min_limit=1)
+    for _ in range(3):
+        finish(limiter, clock, 0.1, success=False)
+    reduced = limiter._limit
+    for _ in range(int(reduced) + 1):
+        finish(limiter, clock, 0.1)
+    assert limiter._limit == pytest.approx(reduced + 1, abs=0.2)
+    for _ in range(200):
+        finish(limiter, clock, 0.1)
+    assert limiter.limit == 10
+
+def test_limit_never_drops_below_min(clock):
+    limiter = make_limiter(limit=4, adaptive=True, latency_target=1.0, min_limit=2)
+    for _ in range(50):
+        finish(limiter, clock, 0.1, success=False)
+    assert limiter.limit == 2
+
+def test_baseline_latency_is_default_target(clock):
+    limiter = make_limiter(limit=10, adaptive=True, tolerance=2.0)
+    for _ in range(5):
+        finish(limiter, clock, 0.1)
+    assert limiter.limit == 10
+    finish(limiter, clock, 0.5)
+    assert limiter.limit == 9
@@ -0,0 +1,94 @@
+"""熔断器状态转换测试"""
+import pytest
+
+import core.circuit_breaker as circuit_breaker
+from core.circuit_breaker import CircuitBreaker
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+def make_breaker(**kwargs):
+    options = dict(failure_threshold=3, error_rate_threshold=0.5, window_size=10, min_requests=4, open_seconds=30)
+    options.update(kwargs)
+    return CircuitBreaker("http://a/sse", **options)
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.times_opened == 1
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = make_breaker(min_requests=100)
+    for _ in range(5):
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_opens_on_error_rate_once_window_has_min_requests(clock):
+    breaker = make_breaker(failure_threshold=100)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    # 只在失败时判断是否熔断，窗口内已有足够的调用后错误率达到阈值即打开
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_half_open_allows_single_probe_after_cooldown(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+def test_successful_probe_closes(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+    assert breaker.snapshot()["error_rate"] == 0.0
+
+def test_failed_probe_reopens_for_another_cooldown(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+    clock.now += 29
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.allow_request()
+
+def test_released_probe_can_be_retried(clock):
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
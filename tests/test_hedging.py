@@ -0,0 +1,71 @@
+"""对冲请求测试"""
+import asyncio
+
+import pytest
+from mcp.types import Tool, ToolAnnotations
+
+from core.hedging import HedgingPolicy
+from fakes import A, B, make_manager, wait_for
+
+READ_ONLY = Tool(name="echo", inputSchema={"type": "object"}, annotations=ToolAnnotations(readOnlyHint=True))
+PLAIN = Tool(name="write", inputSchema={"type": "object"})
+
+def make_policy(**kwargs):
+    options = dict(enabled=True, delay_ms=0, percentile=95, min_delay_ms=0, budget_ratio=1.0, tool_delays={})
+    options.update(kwargs)
+    return HedgingPolicy(**options)
+
+def test_only_idempotent_tools_are_hedged():
+    policy = make_policy(delay_ms=50)
+    assert policy.delay_for("echo", READ_ONLY) == 0.05
+    assert policy.delay_for("write", PLAIN) is None
+    assert make_policy(enabled=False, delay_ms=50).delay_for("echo", READ_ONLY) is None
+
+def test_tool_delay_overrides_global_and_respects_minimum():
+    policy = make_policy(delay_ms=50, min_delay_ms=20, tool_delays={"echo": 5})
+    assert policy.delay_for("echo", READ_ONLY) == 0.02
+
+def test_delay_derived_from_latency_percentile():
+    policy = make_policy(min_samples=20)
+    assert policy.delay_for("echo", READ_ONLY) is None
+    for i in range(1, 101):
+        policy.observe("echo", i / 1000)
+    assert policy.delay_for("echo", READ_ONLY) == pytest.approx(0.095)
+
+def test_budget_limits_extra_load():
+    policy = make_policy(delay_ms=10, budget_ratio=0.25)
+    sent = 0
+    for _ in range(100):
+        policy.delay_for("echo", READ_ONLY)
+        sent += policy.try_acquire()
+    assert sent == 25
+    assert policy.budget_exhausted == 75
+
+def test_release_returns_token():
+    policy = make_policy(delay_ms=10)
+    policy.delay_for("echo", READ_ONLY)
+    assert policy.try_acquire()
+    policy.release()
+    assert policy.hedges_sent == 0
+    assert policy.try_acquire()
+
+@pytest.mark.anyio
+async def test_slow_primary_is_hedged_to_replica():
+    manager = make_manager([A, B])
+    await manager.start()
+    try:
+        await wait_for(lambda: A in manager.clients and B in manager.clients)
+        manager.hedging = make_policy(delay_ms=20)
+        manager.tool_definitions["echo"] = READ_ONLY
+        stuck = asyncio.Event()
+
+        async def slow_call(tool_name, tool_args, progress_callback=None):
+            await stuck.wait()
+
+        manager.fakes[A].call_tool = slow_call
+        result = await manager.call_tool("echo", {}, preferred_server=A, read_cache=False, write_cache=False)
+        assert result.content[0].text == f"echo@{B}"
+        assert manager.hedging.stats["hedges_sent"] == 1
+        assert manager.hedging.stats["hedge_wins"] == 1
+    finally:
+        await manager.cleanup()
@@ -0,0 +1,36 @@
+"""JSON编解码和原样透传测试"""
+import json
+
+import pytest
+from mcp.types import CallToolResult, TextContent
+
+from utils import json_codec
+from utils.helpers import get_passthrough_body
+
+def test_dumps_is_compact_utf8():
+    assert json_codec.dumps({"名": [1, 2]}) == '{"名":[1,2]}'.encode('utf-8')
+
+def test_dumps_falls_back_for_integers_beyond_64_bits():
+    value = 2 ** 70
+    assert json.loads(json_codec.dumps({"n": value})) == {"n": value}
+
+def test_dumps_converts_unknown_objects_to_strings():
+    assert json.loads(json_codec.dumps({"x": object})) == {"x": str(object)}
+
+def result_of(text, is_error=False):
+    return CallToolResult(content=[TextContent(type="text", text=text)], isError=is_error)
+
+@pytest.mark.parametrize("text, mimetype", [
+    ('{"a": 1}', 'application/json'),
+    ('  [1, 2]', 'application/json'),
+    ('{not json', 'text/plain'),
+    ('[1, 2', 'text/plain'),
+    ('hello', 'text/plain'),
+])
+def test_passthrough_mimetype(text, mimetype):
+    assert get_passthrough_body(result_of(text)) == (text, mimetype)
+
+def test_passthrough_skips_errors_and_multiple_items():
+    assert get_passthrough_body(result_of('{"a": 1}', is_error=True)) is None
+    result = CallToolResult(content=[TextContent(type="text", text="a"), TextContent(type="text", text="b")])
+    assert get_passthrough_body(result) is None
@@ -0,0 +1,72 @@
+"""负载均衡策略测试"""
+import pytest
+
+from core.load_balancer import LOAD_BALANCERS, ServerStats, WeightedLoadBalancer, create_load_balancer
+
+SERVERS = ["http://a/sse", "http://b/sse", "http://c/sse"]
+
+def make_stats(**in_flight):
+    stats = {}
+    for url in SERVERS:
+        stats[url] = ServerStats()
+        stats[url].in_flight = in_flight.get(url.split('/')[2], 0)
+    return stats
+
+@pytest.mark.parametrize("strategy", sorted(LOAD_BALANCERS))
+def test_order_is_permutation_of_servers(strategy):
+    balancer = create_load_balancer(strategy)
+    for _ in range(10):
+        assert sorted(balancer.order("echo", SERVERS, make_stats())) == sorted(SERVERS)
+
+@pytest.mark.parametrize("strategy", sorted(LOAD_BALANCERS))
+def test_servers_without_stats_do_not_break_routing(strategy):
+    # 运行时增加的服务器在第一次调用前可能还没有统计信息
+    stats = make_stats()
+    del stats[SERVERS[2]]
+    balancer = create_load_balancer(strategy)
+    for _ in range(10):
+        assert sorted(balancer.order("echo", SERVERS, stats)) == sorted(SERVERS)
+
+def test_ordered_keeps_registration_order():
+    assert create_load_balancer("ordered").order("echo", SERVERS, make_stats()) == SERVERS
+
+def test_round_robin_rotates_per_tool():
+    balancer = create_load_balancer("round_robin")
+    firsts = [balancer.order("echo", SERVERS, {})[0] for _ in range(3)]
+    assert firsts == SERVERS
+    assert balancer.order("other", SERVERS, {})[0] == SERVERS[0]
+
+def test_weighted_follows_weights():
+    balancer = WeightedLoadBalancer({SERVERS[0]: 3})
+    firsts = [balancer.order("echo", SERVERS[:2], {})[0] for _ in range(8)]
+    assert firsts.count(SERVERS[0]) == 6
+    assert firsts.count(SERVERS[1]) == 2
+
+def test_weighted_sees_weights_added_later():
+    weights = {}
+    balancer = create_load_balancer("weighted", weights)
+    weights[SERVERS[1]] = 4
+    firsts = [balancer.order("echo", SERVERS[:2], {})[0] for _ in range(5)]
+    assert firsts.count(SERVERS[1]) == 4
+
+def test_least_outstanding_prefers_idle_server():
+    stats = make_stats(a=5, b=0, c=2)
+    assert create_load_balancer("least_outstanding").order("echo", SERVERS, stats) == [
+        SERVERS[1], SERVERS[2], SERVERS[0]
+    ]
+
+def test_ewma_explores_servers_without_latency_first():
+    stats = make_stats()
+    stats[SERVERS[0]].ewma_latency = 0.01
+    stats[SERVERS[1]].ewma_latency = 0.5
+    order = create_load_balancer("ewma").order("echo", SERVERS, stats)
+    assert order == [SERVERS[2], SERVERS[0], SERVERS[1]]
+
+def test_p2c_picks_less_loaded_of_two():
+    stats = make_stats(a=3, b=1)
+    for _ in range(10):
+        order = create_load_balancer("p2c").order("echo", SERVERS[:2], stats)
+        assert order == [SERVERS[1], SERVERS[0]]
+
+def test_unknown_strategy_falls_back_to_round_robin():
+    assert create_load_balancer("nope").name == "round_robin"
@@ -0,0 +1,108 @@
+"""运行时增加、摘除和移除服务器的测试"""
+import asyncio
+
+import pytest
+
+from core.load_balancer import LOAD_BALANCERS, create_load_balancer
+from fakes import A, B, make_manager, wait_for
+
+@pytest.fixture
+async def manager():
+    manager = make_manager([A])
+    await manager.start()
+    await wait_for(lambda: A in manager.clients)
+    yield manager
+    await manager.cleanup()
+
+def text_of(result):
+    return result.content[0].text
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("strategy", sorted(LOAD_BALANCERS))
+async def test_server_added_at_runtime_is_routable(manager, strategy):
+    manager.load_balancer = create_load_balancer(strategy, {})
+    state = await manager.add_server(B)
+    assert state["state"] == "connecting"
+    await wait_for(lambda: "only_b" in manager.tool_registry)
+
+    assert text_of(await manager.call_tool("only_b", {})) == f"only_b@{B}"
+    for i in range(10):
+        assert text_of(await manager.call_tool("echo", {"i": i})).startswith("echo@")
+    assert set(manager.tool_registry["echo"]) == {A, B}
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("strategy", sorted(LOAD_BALANCERS))
+async def test_server_re_added_after_removal_is_routable(manager, strategy):
+    manager.load_balancer = create_load_balancer(strategy, {})
+    await manager.add_server(B)
+    await wait_for(lambda: "only_b" in manager.tool_registry)
+    await manager.remove_server(B)
+    assert B not in manager.server_stats
+
+    await manager.add_server(B)
+    await wait_for(lambda: "only_b" in manager.tool_registry)
+    assert text_of(await manager.call_tool("only_b", {})) == f"only_b@{B}"
+
+@pytest.mark.anyio
+async def test_add_existing_server_conflicts(manager):
+    with pytest.raises(Exception) as exc_info:
+        await manager.add_server(A)
+    assert exc_info.value.status_code == 409
+
+@pytest.mark.anyio
+async def test_drain_removes_tools_and_add_restores_them(manager):
+    await manager.add_server(B)
+    await wait_for(lambda: "only_b" in manager.tool_registry)
+
+    state = await manager.drain_server(B)
+    assert state["state"] == "draining"
+    assert "only_b" not in manager.tool_registry
+    assert manager.tool_registry["echo"] == [A]
+    assert manager.get_cached_status()[B]["draining"]
+
+    state = await manager.add_server(B)
+    assert state["state"] == "active"
+    assert "only_b" in manager.tool_registry
+    assert set(manager.tool_registry["echo"]) == {A, B}
+
+@pytest.mark.anyio
+async def test_remove_waits_for_in_flight_calls(manager):
+    await manager.add_server(B)
+    await wait_for(lambda: "hang" in manager.tool_registry)
+    fake = manager.fakes[B]
+
+    call = asyncio.create_task(manager.call_tool("hang", {}))
+    await wait_for(lambda: manager.server_stats[B].in_flight == 1)
+    removal = asyncio.create_task(manager.remove_server(B, timeout=5))
+    await asyncio.sleep(0.1)
+    # 摘除后不再接收新调用，但在途调用继续进行，连接保持
+    assert not removal.done()
+    assert "hang" not in manager.tool_registry
+    assert not fake.cleaned_up
+
+    fake.release.set()
+    assert text_of(await call) == f"hang@{B}"
+    result = await removal
+    assert result == {"server": B, "state": "removed", "in_flight_aborted": 0}
+    assert fake.cleaned_up
+    assert B not in manager.clients
+    assert B not in manager.server_urls
+    assert B not in manager.get_membership()
+
+@pytest.mark.anyio
+async def test_remove_reports_calls_aborted_after_timeout(manager):
+    await manager.add_server(B)
+    await wait_for(lambda: "hang" in manager.tool_registry)
+
+    call = asyncio.create_task(manager.call_tool("hang", {}))
+    await wait_for(lambda: manager.server_stats[B].in_flight == 1)
+    result = await manager.remove_server(B, timeout=0.1)
+    assert result["in_flight_aborted"] == 1
+    call.cancel()
+    await asyncio.gather(call, return_exceptions=True)
+
+@pytest.mark.anyio
+async def test_remove_unknown_server_is_not_found(manager):
+    with pytest.raises(Exception) as exc_info:
+        await manager.remove_server(B)
+    assert exc_info.value.status_code == 404
@@ -0,0 +1,99 @@
+"""令牌桶限流测试"""
+import pytest
+
+import core.rate_limit as rate_limit
+from core.rate_limit import RateLimiter, TokenBucket
+
+USER = {"user_id": "alice"}
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+def make_limiter(**kwargs):
+    options = dict(enabled=True, rate=1.0, burst=2.0, routes={}, tools={}, idle_ttl=60.0, max_buckets=1000)
+    options.update(kwargs)
+    return RateLimiter(**options)
+
+def test_token_bucket_refills_up_to_burst():
+    bucket = TokenBucket(rate=2.0, burst=4.0, now=0.0)
+    bucket.tokens = 0.0
+    bucket.refill(1.0)
+    assert bucket.tokens == 2.0
+    bucket.refill(10.0)
+    assert bucket.tokens == 4.0
+    assert bucket.reset_after() == 0.0
+
+def test_disabled_limiter_returns_none():
+    assert make_limiter(enabled=False).check(USER, "/tools") is None
+
+def test_burst_then_limited_with_retry_after(clock):
+    limiter = make_limiter()
+    assert limiter.check(USER, "/tools").allowed
+    assert limiter.check(USER, "/tools").allowed
+    result = limiter.check(USER, "/tools")
+    assert not result.allowed
+    assert result.headers()["Retry-After"] == "1"
+    clock.now += 1.0
+    assert limiter.check(USER, "/tools").allowed
+
+def test_users_and_routes_have_separate_buckets(clock):
+    limiter = make_limiter(burst=1.0)
+    assert limiter.check(USER, "/tools").allowed
+    assert not limiter.check(USER, "/tools").allowed
+    assert limiter.check({"user_id": "bob"}, "/tools").allowed
+    assert limiter.check(USER, "/servers").allowed
+
+def test_tool_bucket_applies_on_top_of_route_bucket(clock):
+    limiter = make_limiter(burst=10.0, tools={"search": (1.0, 1.0)})
+    assert limiter.check(USER, "/tools", "search").allowed
+    assert not limiter.check(USER, "/tools", "search").allowed
+    assert limiter.check(USER, "/tools", "echo").allowed
+
+def test_claim_overrides_configured_limits(clock):
+    limiter = make_limiter(burst=1.0)
+    payload = {"user_id": "vip", "rate_limit": {"rate": 5, "burst": 3}}
+    assert [limiter.check(payload, "/tools").allowed for _ in range(4)] == [True, True, True, False]
+
+def test_idle_bucket_is_kept_until_refilled(clock):
+    # 每100秒补充一个令牌，比idle_ttl慢：空闲淘汰不能把空桶换成满桶
+    limiter = make_limiter(rate=0.01, burst=2.0, idle_ttl=60.0)
+    assert limiter.check(USER, "/tools").allowed
+    assert limiter.check(USER, "/tools").allowed
+    clock.now += 61.0
+    assert not limiter.check(USER, "/tools").allowed
+    assert limiter.evictions == 0
+
+def test_idle_bucket_is_evicted_once_full(clock):
+    limiter = make_limiter(rate=1.0, burst=2.0, idle_ttl=60.0)
+    limiter.check(USER, "/tools")
+    clock.now += 61.0
+    limiter.check({"user_id": "bob"}, "/tools")
+    assert limiter.evictions == 1
+    assert limiter.stats["buckets"] == 1
+
+def test_unfilled_idle_bucket_does_not_block_eviction_of_others(clock):
+    limiter = make_limiter(rate=1.0, burst=2.0, idle_ttl=60.0, tools={"slow": (0.001, 1.0)})
+    limiter.check(USER, "/tools", "slow")
+    limiter.check({"user_id": "bob"}, "/tools")
+    clock.now += 61.0
+    limiter.check({"user_id": "carol"}, "/tools")
+    # alice的路由桶和bob的桶已补满被淘汰，alice的工具桶尚未补满而保留
+    assert limiter.evictions == 2
+    assert limiter.stats["buckets"] == 2
+
+def test_max_buckets_evicts_least_recently_used(clock):
+    limiter = make_limiter(max_buckets=2)
+    for user in ("a", "b", "c"):
+        limiter.check({"user_id": user}, "/tools")
+    assert limiter.stats["buckets"] == 2
+    assert limiter.evictions == 1
@@ -0,0 +1,65 @@
+"""按会话代数重连的测试"""
+import asyncio
+
+import pytest
+
+from core.mcp_client import MCPClient
+from fakes import A
+
+@pytest.fixture
+def client():
+    client = MCPClient(A)
+    client.connects = 0
+    client.connected = asyncio.Event()
+
+    async def fake_connect_locked():
+        client.connects += 1
+        await client.connected.wait()
+        client.session = object()
+        client.generation += 1
+
+    client._connect_locked = fake_connect_locked
+    return client
+
+@pytest.mark.anyio
+async def test_concurrent_callers_share_one_reconnect(client):
+    client.session = object()
+    client.generation = 1
+    callers = [asyncio.create_task(client.reconnect(1)) for _ in range(5)]
+    await asyncio.sleep(0)
+    client.connected.set()
+    await asyncio.gather(*callers)
+    assert client.connects == 1
+    assert client.generation == 2
+
+@pytest.mark.anyio
+async def test_stale_generation_does_not_reconnect(client):
+    client.connected.set()
+    client.session = object()
+    client.generation = 3
+    await client.reconnect(2)
+    assert client.connects == 0
+    await client.reconnect(3)
+    assert client.connects == 1
+    assert client.generation == 4
+
+@pytest.mark.anyio
+async def test_reconnect_without_session_always_connects(client):
+    client.connected.set()
+    client.generation = 3
+    await client.reconnect(2)
+    assert client.connects == 1
+
+@pytest.mark.anyio
+async def test_cancelled_caller_does_not_abort_reconnect(client):
+    client.generation = 1
+    first = asyncio.create_task(client.reconnect(1))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    second = asyncio.create_task(client.reconnect(1))
+    await asyncio.sleep(0)
+    client.connected.set()
+    await second
+    assert client.connects == 1
+    assert client.generation == 2
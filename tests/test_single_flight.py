@@ -0,0 +1,93 @@
+"""请求合并测试"""
+import asyncio
+
+import pytest
+
+from core.single_flight import SingleFlight
+
+@pytest.mark.anyio
+async def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight(["*"])
+    calls = 0
+    release = asyncio.Event()
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "结果"
+
+    tasks = [asyncio.create_task(flight.do("key", upstream)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == ["结果"] * 3
+    assert calls == 1
+    assert flight.stats == {"in_flight": 0, "coalesced_requests": 2, "cancelled_flights": 0}
+
+@pytest.mark.anyio
+async def test_different_keys_are_not_coalesced():
+    flight = SingleFlight(["*"])
+
+    async def upstream(value):
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(flight.do("a", lambda: upstream(1)), flight.do("b", lambda: upstream(2)))
+    assert results == [1, 2]
+    assert flight.coalesced == 0
+
+@pytest.mark.anyio
+async def test_upstream_error_reaches_every_waiter():
+    flight = SingleFlight(["*"])
+
+    async def upstream():
+        await asyncio.sleep(0)
+        raise RuntimeError("上游失败")
+
+    results = await asyncio.gather(*(flight.do("key", upstream) for _ in range(2)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats["in_flight"] == 0
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_does_not_cancel_others():
+    flight = SingleFlight(["*"])
+    release = asyncio.Event()
+
+    async def upstream():
+        await release.wait()
+        return "结果"
+
+    first = asyncio.create_task(flight.do("key", upstream))
+    second = asyncio.create_task(flight.do("key", upstream))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    release.set()
+    assert await second == "结果"
+    assert flight.cancelled == 0
+
+@pytest.mark.anyio
+async def test_last_waiter_leaving_cancels_upstream():
+    flight = SingleFlight(["*"])
+    cancelled = asyncio.Event()
+
+    async def upstream():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.create_task(flight.do("key", upstream))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flight.cancelled == 1
+    assert flight.stats["in_flight"] == 0
+
+def test_enabled_for():
+    assert SingleFlight(["*"]).enabled_for("任意工具")
+    flight = SingleFlight(["search"])
+    assert flight.enabled_for("search")
+    assert not flight.enabled_for("write")
@@ -0,0 +1,67 @@
+"""工具目录快照测试"""
+import json
+
+import pytest
+
+import core.mcp_client_manager as manager_module
+from core.tool_catalog import load_snapshot, save_snapshot
+from fakes import A, C, SERVER_TOOLS, FakeClient, make_manager, wait_for
+
+@pytest.fixture
+def snapshot_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot.json")
+    monkeypatch.setattr(manager_module, "TOOL_CATALOG_SNAPSHOT_FILE", path)
+    monkeypatch.setattr(manager_module, "SNAPSHOT_WRITE_DELAY", 0.01)
+    return path
+
+def snapshot_servers(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {url: sorted(tool["name"] for tool in tools) for url, tools in data["servers"].items()}
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    save_snapshot(path, {A: FakeClient(A, None).tools, C: FakeClient(C, None).tools})
+    loaded = load_snapshot(path, [A])
+    assert list(loaded) == [A]
+    assert [tool.name for tool in loaded[A]] == SERVER_TOOLS[A]
+
+@pytest.mark.anyio
+async def test_snapshot_keeps_tools_of_servers_not_yet_connected(snapshot_file, monkeypatch):
+    # 上次运行时两个服务器都连上过，这次C连不上
+    save_snapshot(snapshot_file, {A: FakeClient(A, None).tools, C: FakeClient(C, None).tools})
+    monkeypatch.setattr(manager_module, "STARTUP_TIMEOUT", 0.05)
+    manager = make_manager([A, C])
+    await manager.start()
+    try:
+        assert "only_c" in manager.tool_registry
+        # 启动超时后C的工具从注册表中移除，但快照仍保留C最近一次已知的工具
+        await wait_for(lambda: "only_c" not in manager.tool_registry)
+        await wait_for(lambda: manager._snapshot_task is not None and manager._snapshot_task.done())
+        assert snapshot_servers(snapshot_file) == {A: ["echo"], C: ["echo", "only_c"]}
+    finally:
+        await manager.cleanup()
+
+@pytest.mark.anyio
+async def test_snapshot_written_after_changes_are_debounced(snapshot_file):
+    manager = make_manager([A])
+    await manager.start()
+    try:
+        await wait_for(lambda: A in manager.clients)
+        await wait_for(lambda: manager._snapshot_task is not None and manager._snapshot_task.done())
+        assert snapshot_servers(snapshot_file) == {A: ["echo"]}
+    finally:
+        await manager.cleanup()
+
+@pytest.mark.anyio
+async def test_snapshot_disabled_without_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(manager_module, "TOOL_CATALOG_SNAPSHOT_FILE", "")
+    monkeypatch.chdir(tmp_path)
+    manager = make_manager([A])
+    await manager.start()
+    try:
+        await wait_for(lambda: A in manager.clients)
+        assert manager._snapshot_task is None
+    finally:
+        await manager.cleanup()
+    assert list(tmp_path.iterdir()) == []
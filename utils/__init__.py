@@ -3,13 +3,17 @@
 """
 
 from .exceptions import (
-    APIError, AuthenticationError, ToolNotFoundError, 
-    ValidationError, MCPConnectionError, JWTValidationError
+    APIError, AuthenticationError, PermissionDeniedError, ToolNotFoundError, 
+    ValidationError, MCPConnectionError, SessionLostError, JWTValidationError, DeadlineExceededError,
+    OverloadedError, RateLimitExceededError
+)
+from .helpers import (
+    serialize_mcp_content, serialize_tool, get_passthrough_body, log_request_response, access_log_writer
 )
-from .helpers import serialize_mcp_content, serialize_tool, log_request_response
 
 __all__ = [
-    'APIError', 'AuthenticationError', 'ToolNotFoundError',
-    'ValidationError', 'MCPConnectionError', 'JWTValidationError',
-    'serialize_mcp_content', 'serialize_tool', 'log_request_response'
+    'APIError', 'AuthenticationError', 'PermissionDeniedError', 'ToolNotFoundError',
+    'ValidationError', 'MCPConnectionError', 'SessionLostError', 'JWTValidationError', 'DeadlineExceededError',
+    'OverloadedError', 'RateLimitExceededError',
+    'serialize_mcp_content', 'serialize_tool', 'get_passthrough_body', 'log_request_response', 'access_log_writer'
 ] 
\ No newline at end of file
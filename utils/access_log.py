@@ -0,0 +1,178 @@
+"""
+访问日志模块
+请求日志先放入有界队列，由后台线程负责序列化和写出，避免阻塞事件循环；
+请求体和响应体在入队前按长度上限裁剪，队列占用的内存和后台线程的序列化开销都有上限
+"""
+import json
+import logging
+import queue
+import random
+import threading
+from typing import Any, Dict, Optional
+
+from config import ACCESS_LOG_QUEUE_SIZE, ACCESS_LOG_MAX_PAYLOAD_CHARS, ACCESS_LOG_SAMPLE_RATES
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+class _CappedPayload:
+    """入队前裁剪过的负载，只包含前若干个字符的内容"""
+
+    __slots__ = ("value", "truncated")
+
+    def __init__(self, value: Any, truncated: bool):
+        self.value = value
+        self.truncated = truncated
+
+class _PayloadCapper:
+    """在不完整序列化的前提下把负载裁剪到大约limit个字符
+
+    按字符串长度估算序列化后的大小，超出预算后不再遍历剩余的元素，
+    因此开销只与limit有关，与负载的实际大小无关。
+    """
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self.truncated = False
+
+    def cap(self, obj: Any) -> Any:
+        if self.remaining <= 0:
+            self.truncated = True
+            return "..."
+        if isinstance(obj, str):
+            if len(obj) > self.remaining:
+                self.truncated = True
+                obj = obj[:self.remaining]
+            self.remaining -= len(obj) + 2
+            return obj
+        if isinstance(obj, dict):
+            capped = {}
+            for key, value in obj.items():
+                if self.remaining <= 0:
+                    self.truncated = True
+                    break
+                key = str(key)
+                self.remaining -= len(key) + 4
+                capped[key] = self.cap(value)
+            return capped
+        if isinstance(obj, (list, tuple)):
+            capped = []
+            for value in obj:
+                if self.remaining <= 0:
+                    self.truncated = True
+                    break
+                capped.append(self.cap(value))
+                self.remaining -= 2
+            return capped
+        if obj is None or isinstance(obj, (bool, int, float)):
+            self.remaining -= len(repr(obj))
+            return obj
+        if isinstance(obj, (bytes, bytearray)):
+            return self.cap(f"<{len(obj)} bytes>")
+        return self.cap(str(obj))
+
+class AccessLogWriter:
+    """后台访问日志写入器
+
+    - 按状态码类别（2xx/4xx/5xx等）采样
+    - 队列满时直接丢弃并计数，不阻塞请求
+    - 请求体和响应体在入队前裁剪到长度上限，超出时记录为截断预览
+    """
+
+    def __init__(self, logger: logging.Logger, queue_size: int = ACCESS_LOG_QUEUE_SIZE,
+                 max_payload_chars: int = ACCESS_LOG_MAX_PAYLOAD_CHARS,
+                 sample_rates: Optional[Dict[str, float]] = None):
+        """初始化写入器"""
+        self.logger = logger
+        self.max_payload_chars = max_payload_chars
+        self.sample_rates = sample_rates if sample_rates is not None else ACCESS_LOG_SAMPLE_RATES
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def start(self):
+        """启动后台写入线程"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="access-log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """写完队列中剩余的日志后停止后台线程"""
+        if not self._thread or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, entry: Dict[str, Any], status_code: int) -> bool:
+        """提交一条日志，被采样丢弃或队列已满时返回False"""
+        rate = self.sample_rates.get(f"{status_code // 100}xx", 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            self.sampled_out += 1
+            return False
+
+        if not self._thread:
+            self.start()
+        if self._queue.full():
+            self.dropped += 1
+            return False
+        entry["request"] = self._cap(entry.get("request"))
+        entry["response"] = self._cap(entry.get("response"))
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _cap(self, payload: Any) -> Any:
+        """在事件循环中把负载裁剪到长度上限附近，避免队列持有完整的大负载"""
+        if self.max_payload_chars <= 0:
+            return payload
+        capper = _PayloadCapper(self.max_payload_chars)
+        value = capper.cap(payload)
+        return _CappedPayload(value, capper.truncated)
+
+    def _truncate(self, payload: Any) -> Any:
+        """序列化后超过长度上限的负载替换为截断预览，裁剪后的负载序列化开销有上限"""
+        if not isinstance(payload, _CappedPayload):
+            return payload
+        text = _dumps(payload.value)
+        if not payload.truncated and len(text) <= self.max_payload_chars:
+            return payload.value
+        return {
+            "truncated": True,
+            "preview": text[:self.max_payload_chars]
+        }
+
+    def _run(self):
+        """后台线程主循环"""
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            try:
+                entry["request"] = self._truncate(entry.get("request"))
+                entry["response"] = self._truncate(entry.get("response"))
+                self.logger.info(_dumps(entry))
+                self.written += 1
+            except Exception as e:
+                self.logger.error(f"写入访问日志失败: {str(e)}")
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """写入器统计信息"""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out
+        }
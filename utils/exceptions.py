@@ -14,6 +14,11 @@ class AuthenticationError(APIError):
     def __init__(self, message: str = "认证失败"):
         super().__init__(message, 401)
 
+class PermissionDeniedError(APIError):
+    """权限不足"""
+    def __init__(self, message: str = "权限不足"):
+        super().__init__(message, 403)
+
 class ToolNotFoundError(APIError):
     """工具未找到错误"""
     def __init__(self, tool_name: str):
@@ -29,7 +34,28 @@ class MCPConnectionError(APIError):
     def __init__(self, message: str = "MCP服务器连接失败"):
         super().__init__(message, 503)
 
+class SessionLostError(MCPConnectionError):
+    """调用进行中会话断开，调用结果未知，客户端可以重试"""
+    def __init__(self, message: str = "MCP会话已断开，请重试"):
+        super().__init__(message)
+
 class JWTValidationError(APIError):
     """JWT验证错误"""
     def __init__(self, message: str = "JWT令牌验证失败"):
-        super().__init__(message, 401) 
\ No newline at end of file
+        super().__init__(message, 401)
+
+class DeadlineExceededError(APIError):
+    """请求超过截止时间"""
+    def __init__(self, message: str = "请求已超过截止时间"):
+        super().__init__(message, 504)
+
+class OverloadedError(APIError):
+    """服务过载，调用被拒绝，客户端应在retry_after秒后重试"""
+    def __init__(self, message: str = "服务繁忙，请稍后重试", retry_after: int = 1, status_code: int = 503):
+        self.retry_after = retry_after
+        super().__init__(message, status_code)
+
+class RateLimitExceededError(OverloadedError):
+    """超过限流额度"""
+    def __init__(self, message: str = "请求过于频繁，请稍后重试", retry_after: int = 1):
+        super().__init__(message, retry_after, 429)
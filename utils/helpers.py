@@ -4,10 +4,16 @@
 import json
 import logging
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
+
+from utils import json_codec
+from utils.access_log import AccessLogWriter
 
 logger = logging.getLogger(__name__)
 
+# 访问日志后台写入器
+access_log_writer = AccessLogWriter(logger)
+
 def serialize_mcp_content(obj) -> Any:
     """
     序列化MCP响应内容，确保可以JSON序列化
@@ -24,7 +30,7 @@ def serialize_mcp_content(obj) -> Any:
             # 如果列表只有一个元素且是JSON字符串，尝试解析它
             if len(serialized_list) == 1 and isinstance(serialized_list[0], str):
                 try:
-                    return json.loads(serialized_list[0])
+                    return json_codec.loads(serialized_list[0])
                 except (json.JSONDecodeError, ValueError):
                     return serialized_list[0]
             return serialized_list
@@ -32,7 +38,7 @@ def serialize_mcp_content(obj) -> Any:
             text = obj.content.text
             # 尝试解析JSON字符串
             try:
-                return json.loads(text)
+                return json_codec.loads(text)
             except (json.JSONDecodeError, ValueError):
                 return text
         elif hasattr(obj.content, 'to_dict'):
@@ -43,7 +49,7 @@ def serialize_mcp_content(obj) -> Any:
         text = obj.text
         # 尝试解析JSON字符串
         try:
-            return json.loads(text)
+            return json_codec.loads(text)
         except (json.JSONDecodeError, ValueError):
             return text
     elif hasattr(obj, 'to_dict'):
@@ -53,6 +59,33 @@ def serialize_mcp_content(obj) -> Any:
     else:
         return str(obj)
 
+def get_passthrough_body(result) -> Optional[Tuple[str, str]]:
+    """
+    获取可以原样透传的上游文本，不重新编码（看起来像JSON时只校验能否解析，以决定MIME类型）
+    
+    Args:
+        result: MCP工具调用结果
+        
+    Returns:
+        (文本, MIME类型)，结果不是单个文本内容项或是错误结果时返回None
+    """
+    content = getattr(result, 'content', None)
+    if getattr(result, 'isError', False) or not isinstance(content, list) or len(content) != 1:
+        return None
+    text = getattr(content[0], 'text', None)
+    if not isinstance(text, str):
+        return None
+    # 首个非空白字符是{或[且能解析为JSON时按JSON返回，否则按纯文本返回
+    head = text[:64].lstrip()[:1]
+    mimetype = 'text/plain'
+    if head in ('{', '['):
+        try:
+            json_codec.loads(text)
+            mimetype = 'application/json'
+        except ValueError:
+            pass
+    return text, mimetype
+
 def serialize_tool(tool) -> Dict[str, Any]:
     """
     序列化MCP工具对象
@@ -118,6 +151,9 @@ def log_request_response(request_data: dict, response_data: dict, status_code: i
     """
     记录请求和响应日志
     
+    日志只在此处入队，序列化、截断和写出都在后台线程中完成，
+    队列满时直接丢弃，不会阻塞事件循环。
+    
     Args:
         request_data: 请求数据
         response_data: 响应数据  
@@ -135,4 +171,4 @@ def log_request_response(request_data: dict, response_data: dict, status_code: i
         "remote_addr": remote_addr,
         "user_agent": user_agent
     }
-    logger.info(json.dumps(log_entry, ensure_ascii=False)) 
\ No newline at end of file
+    access_log_writer.submit(log_entry, status_code) 
\ No newline at end of file
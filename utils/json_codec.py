@@ -0,0 +1,41 @@
+"""
+JSON编解码模块
+安装了orjson时使用orjson，否则回退到标准库json，输出均为紧凑的UTF-8字节
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """将对象编码为JSON字节，无法直接编码的对象转换为字符串
+
+        orjson无法编码的值（如超过64位的整数）回退到标准库json
+        """
+        try:
+            return orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return _stdlib_dumps(obj)
+
+    def loads(data) -> Any:
+        """解析JSON字符串或字节，失败时抛出json.JSONDecodeError"""
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> bytes:
+        """将对象编码为JSON字节，无法直接编码的对象转换为字符串"""
+        return _stdlib_dumps(obj)
+
+    def loads(data) -> Any:
+        """解析JSON字符串或字节，失败时抛出json.JSONDecodeError"""
+        return json.loads(data)
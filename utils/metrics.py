@@ -0,0 +1,192 @@
+"""
+指标模块
+进程内的计数器、仪表盘和直方图，按Prometheus文本格式导出
+
+热路径上的记录只做字典查找和二分查找，不加锁（所有记录都发生在事件循环线程中）。
+"""
+import bisect
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# 默认延迟分桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# JWT验证等微秒级操作的分桶（秒）
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    """指标基类"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """单调递增的计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        """增加计数，labelvalues按labelnames的顺序给出"""
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labelvalues, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Gauge(_Metric):
+    """可增可减的仪表盘；设置了回调时在导出时调用回调获取当前值"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, *labelvalues: str):
+        self._values[labelvalues] = value
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) - amount
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]):
+        """设置导出时调用的回调，返回 {标签值元组: 值}"""
+        self._function = function
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        values = self._function() if self._function is not None else self._values
+        for labelvalues, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    """直方图，记录时只累加所在分桶，导出时再计算累计值"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数..., +Inf分桶计数, 总和]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        """记录一个观测值"""
+        counts = self._values.get(labelvalues)
+        if counts is None:
+            counts = self._values[labelvalues] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labelvalues, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """导出Prometheus文本格式（0.0.4）
+
+        没有样本的指标不输出，broker模式下worker和broker的指标可以直接拼接而不会重复。
+        """
+        lines = []
+        for metric in self._metrics.values():
+            metric_lines = metric.render()
+            if len(metric_lines) > 2:
+                lines.extend(metric_lines)
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# HTTP层
+HTTP_REQUEST_DURATION = registry.histogram(
+    "mcp_proxy_http_request_duration_seconds", "HTTP请求处理时间（流式响应为返回响应头的时间）",
+    ("route", "method", "status"))
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge("mcp_proxy_http_requests_in_flight", "正在处理的HTTP请求数")
+
+# 工具调用
+TOOL_CALL_DURATION = registry.histogram(
+    "mcp_proxy_tool_call_duration_seconds", "工具调用的端到端时间（含缓存、合并、故障转移）", ("tool", "outcome"))
+UPSTREAM_CALL_DURATION = registry.histogram(
+    "mcp_proxy_upstream_call_duration_seconds", "单次上游调用时间", ("server", "tool", "outcome"))
+UPSTREAM_IN_FLIGHT = registry.gauge("mcp_proxy_upstream_in_flight", "每个服务器的在途上游调用数", ("server",))
+BREAKER_OPEN = registry.gauge("mcp_proxy_breaker_open", "服务器熔断器是否处于非closed状态（1为熔断或半开）", ("server",))
+ADMISSION_QUEUE_DEPTH = registry.gauge("mcp_proxy_admission_queue_depth", "准入控制等待队列深度", ("scope",))
+FAILOVERS = registry.counter("mcp_proxy_failovers_total", "上一个服务器失败后转向下一个服务器的次数", ("tool",))
+
+# 连接与健康检查
+RECONNECTS = registry.counter("mcp_proxy_upstream_reconnects_total", "与上游服务器重新建立会话的次数", ("server", "result"))
+HEALTH_CHECKS = registry.counter("mcp_proxy_health_checks_total", "服务器健康检查次数", ("server", "result"))
+
+# 工具目录与认证
+TOOL_CATALOG_TOOLS = registry.gauge("mcp_proxy_tool_catalog_tools", "合并工具目录中的工具数")
+TOOL_CATALOG_VERSION = registry.gauge("mcp_proxy_tool_catalog_version", "合并工具目录的版本号")
+JWT_VERIFICATION_DURATION = registry.histogram(
+    "mcp_proxy_jwt_verification_duration_seconds", "JWT令牌验证时间", ("result",), FAST_BUCKETS)